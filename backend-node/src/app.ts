@@ -7,7 +7,8 @@ const createApp = (): express.Express => {
     const app = express();
 
     app.use(cors());
-    app.use(express.json());
+    // Webhooks do worker trazem a transcrição completa (gzip é descomprimido pelo express.json)
+    app.use(express.json({ limit: '50mb' }));
     app.use(express.urlencoded({ extended: true }));
 
     app.get('/health', (req, res) => {
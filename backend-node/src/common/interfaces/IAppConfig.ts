@@ -5,6 +5,8 @@ export interface IAppConfig {
   WHISPERX_MODEL: 'large-v3' | 'large-v2' | 'base' | 'small' | 'medium';
   DIAR_DEVICE: 'cuda' | 'cpu';
   ALIGN_DEVICE: 'cuda' | 'cpu';
+  MIN_SPEAKERS: string;
+  MAX_SPEAKERS: string;
   
   SMTP_HOST: string;
   SMTP_PORT: string;
@@ -145,10 +145,21 @@ export const getTaskPdf = async (req: Request, res: Response) => {
 export const analyzeTask = async (req: Request, res: Response) => {
   const { id } = req.params;
   try {
-    const task = await taskService.requestAnalysis(id);
+    const task = await taskService.requestAnalysis(id, req.body?.forceRefresh === true);
     res.status(202).json({ message: 'Solicitação de análise recebida.', task });
   } catch (error: any) {
     const statusCode = error.statusCode || 500;
     res.status(statusCode).json({ error: error.message || 'Falha ao solicitar a análise da tarefa.' });
   }
-};
\ No newline at end of file
+};
+
+export const retryTask = async (req: Request, res: Response) => {
+  const { id } = req.params;
+  try {
+    const task = await taskService.retryTranscription(id);
+    res.status(202).json({ message: 'Nova tentativa de transcrição enfileirada.', task });
+  } catch (error: any) {
+    const statusCode = error.statusCode || 500;
+    res.status(statusCode).json({ error: error.message || 'Falha ao repetir a transcrição da tarefa.' });
+  }
+};
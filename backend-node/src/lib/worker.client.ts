@@ -1,10 +1,34 @@
 import axios from 'axios';
+import crypto from 'crypto';
+import fs from 'fs';
+import path from 'path';
+import zlib from 'zlib';
 import { IAppConfig } from '../common/interfaces/IAppConfig';
 import { getAllConfigs } from '../services/config.service';
 
 const WORKER_URL = process.env.PYTHON_WORKER_URL || 'http://localhost:8000';
+// Diretório no volume de uploads onde o worker grava as transcrições (endereçadas pelo SHA-256)
+const TRANSCRIPT_STORE_DIR = process.env.TRANSCRIPT_STORE_DIR || '/app/uploads/transcripts';
+// Corpos a partir deste tamanho (bytes) vão comprimidos com gzip
+const WORKER_GZIP_MIN_BYTES = Number(process.env.WORKER_GZIP_MIN_BYTES || 16384);
 
-export const notifyWorkerToProcessTask = async (taskId: string, filePath: string, config: Partial<IAppConfig>) => {
+// Referência da transcrição no volume compartilhado, se o worker já a tiver gravado
+const transcriptRefFor = (transcription: string): string | null => {
+  const ref = crypto.createHash('sha256').update(transcription, 'utf8').digest('hex');
+  return fs.existsSync(path.join(TRANSCRIPT_STORE_DIR, `${ref}.vtt.gz`)) ? ref : null;
+};
+
+const postJson = async <T = unknown>(url: string, body: unknown) => {
+  const json = Buffer.from(JSON.stringify(body), 'utf8');
+  if (json.length < WORKER_GZIP_MIN_BYTES) {
+    return axios.post<T>(url, json, { headers: { 'Content-Type': 'application/json' } });
+  }
+  return axios.post<T>(url, zlib.gzipSync(json), {
+    headers: { 'Content-Type': 'application/json', 'Content-Encoding': 'gzip' },
+  });
+};
+
+export const notifyWorkerToProcessTask = async (taskId: string, filePath: string, config: Partial<IAppConfig>, saleswomanId?: string) => {
   try {
     const workerEndpoint = `${WORKER_URL}/process-task`;
     console.log(`[Node Backend] Notificando worker em ${workerEndpoint} para a tarefa ${taskId}`);
@@ -13,6 +37,8 @@ export const notifyWorkerToProcessTask = async (taskId: string, filePath: string
       task_id: taskId,
       file_path: filePath,
       config: config,
+      // Usado pelo worker para dividir a fila de forma justa entre as vendedoras
+      saleswoman_id: saleswomanId,
     });
 
   } catch (err: any) {
@@ -21,6 +47,25 @@ export const notifyWorkerToProcessTask = async (taskId: string, filePath: string
   }
 };
 
+export const notifyWorkerToRetryTask = async (taskId: string, filePath: string, config: Partial<IAppConfig>, saleswomanId?: string) => {
+  try {
+    const workerEndpoint = `${WORKER_URL}/retry-task`;
+    console.log(`[Node Backend] Solicitando nova tentativa da tarefa ${taskId} em ${workerEndpoint}`);
+
+    const response = await axios.post<{ resumable_stages?: string[] }>(workerEndpoint, {
+      task_id: taskId,
+      file_path: filePath,
+      config: config,
+      saleswoman_id: saleswomanId,
+    });
+    return response.data.resumable_stages ?? [];
+
+  } catch (err: any) {
+    console.error(`[Node Backend] ERRO ao solicitar nova tentativa da tarefa ${taskId}:`, err.message);
+    throw new Error(`Falha ao comunicar com o worker Python: ${err.message}`);
+  }
+};
+
 export const generateConsolidatedSummary = async (name: string, transcriptions: string[]): Promise<string> => {
   try {
     const workerEndpoint = `${WORKER_URL}/generate-summary`;
@@ -33,29 +78,40 @@ export const generateConsolidatedSummary = async (name: string, transcriptions:
       throw new Error('A chave da API da OpenAI não está configurada no backend.');
     }
 
-    const response = await axios.post<{ summary: string }>(workerEndpoint, {
+    // Transcrições já presentes no volume compartilhado vão só pela referência
+    const transcriptionRefs: string[] = [];
+    const inlineTranscriptions: string[] = [];
+    for (const transcription of transcriptions) {
+      const ref = transcriptRefFor(transcription);
+      if (ref) transcriptionRefs.push(ref);
+      else inlineTranscriptions.push(transcription);
+    }
+
+    const response = await postJson<{ summary: string }>(workerEndpoint, {
       name,
-      transcriptions,
+      transcriptions: inlineTranscriptions,
+      transcription_refs: transcriptionRefs,
       openai_api_key: openaiApiKey,
     });
 
     return response.data.summary;
   } catch (err: any) {
-    console.error(`[Node Backend] ERRO ao gerar resumo consolidado para ${name}:`, err.message);
-    throw new Error(`Falha ao gerar resumo no worker: ${err.message}`);
+    // O worker explica no `detail` quando recusa o pedido (ex.: nenhuma ligação de vendas válida)
+    const detail = err.response?.data?.detail ?? err.message;
+    console.error(`[Node Backend] ERRO ao gerar resumo consolidado para ${name}:`, detail);
+    throw new Error(`Falha ao gerar resumo no worker: ${detail}`);
   }
 };
 
-export const notifyWorkerToAnalyzeTask = async (taskId: string, transcription: string, config: Partial<IAppConfig>) => {
+export const notifyWorkerToAnalyzeTask = async (taskId: string, transcription: string, config: Partial<IAppConfig>, forceRefresh = false) => {
   try {
     const workerEndpoint = `${WORKER_URL}/analyze-task`;
     console.log(`[Node Backend] Notificando worker em ${workerEndpoint} para analisar a tarefa ${taskId}`);
     
-    await axios.post(workerEndpoint, {
-      task_id: taskId,
-      transcription: transcription,
-      config: config,
-    });
+    const transcriptionRef = transcriptRefFor(transcription);
+    await postJson(workerEndpoint, transcriptionRef
+      ? { task_id: taskId, transcription_ref: transcriptionRef, config: config, force_refresh: forceRefresh }
+      : { task_id: taskId, transcription: transcription, config: config, force_refresh: forceRefresh });
 
   } catch (err: any) {
     console.error(`[Node Backend] ERRO ao notificar o worker para analisar a tarefa ${taskId}:`, err.message);
@@ -36,4 +36,7 @@ router.delete('/failed', authenticateToken, authorizeAdmin, taskController.delet
 // Rota para solicitar a análise de uma tarefa já transcrita
 router.post('/:id/analyze', authenticateToken, taskController.analyzeTask);
 
+// Rota para repetir uma transcrição que falhou, retomando das etapas já concluídas
+router.post('/:id/retry', authenticateToken, taskController.retryTask);
+
 export { router as tasksRouter };
\ No newline at end of file
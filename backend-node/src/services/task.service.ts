@@ -1,6 +1,6 @@
 import { Prisma, Task, Saleswoman, TaskStatus } from '@prisma/client';
 import { prisma } from '../lib/prisma';
-import { notifyWorkerToProcessTask, notifyWorkerToAnalyzeTask } from '../lib/worker.client';
+import { notifyWorkerToProcessTask, notifyWorkerToAnalyzeTask, notifyWorkerToRetryTask } from '../lib/worker.client';
 import { sendSseEvent } from './sse.service';
 import { getAllConfigs } from './config.service';
 import fs from 'node:fs';
@@ -27,12 +27,14 @@ export const createTask = async (clientName: string, saleswomanId: string, fileP
       OPENAI_ASSISTANT_ID: allConfigs.OPENAI_ASSISTANT_ID,
       WHISPERX_MODEL: allConfigs.WHISPERX_MODEL,
       DIAR_DEVICE: allConfigs.DIAR_DEVICE,
-      ALIGN_DEVICE: allConfigs.ALIGN_DEVICE
+      ALIGN_DEVICE: allConfigs.ALIGN_DEVICE,
+      MIN_SPEAKERS: allConfigs.MIN_SPEAKERS,
+      MAX_SPEAKERS: allConfigs.MAX_SPEAKERS
     };
 
     console.log(`[TaskService] Enviando para o worker. Task ID: ${newTask.id}, FilePath: ${filePath}`);
     
-    await notifyWorkerToProcessTask(newTask.id, filePath, workerConfig);
+    await notifyWorkerToProcessTask(newTask.id, filePath, workerConfig, saleswomanId);
 
   } catch (error) {
     console.error(`[TaskService] Falha ao notificar worker, atualizando status da tarefa ${newTask.id} para FAILED.`);
@@ -123,7 +125,7 @@ export const getTasksBySaleswoman = async (saleswomanId: string): Promise<Task[]
     where: {
       saleswomanId,
       status: {
-        in: ['TRANSCRIBED', 'ANALYZING', 'COMPLETED', 'FAILED']
+        in: ['TRANSCRIBED', 'NO_SPEECH', 'ANALYZING', 'COMPLETED', 'FAILED']
       }
     },
     orderBy: { createdAt: 'desc' },
@@ -141,7 +143,7 @@ export const getActiveTasks = async (): Promise<Task[]> => {
   return prisma.task.findMany({
     where: {
       status: {
-        notIn: ['COMPLETED', 'FAILED', 'TRANSCRIBED'],
+        notIn: ['COMPLETED', 'FAILED', 'TRANSCRIBED', 'NO_SPEECH'],
       },
     },
     include: { saleswoman: true },
@@ -186,7 +188,8 @@ export const failStaleTasks = async (timeoutMinutes: number = 60): Promise<void>
   }
 };
 
-export const requestAnalysis = async (taskId: string): Promise<Task> => {
+// forceRefresh ignora o cache de análises do worker e roda o Assistant de novo
+export const requestAnalysis = async (taskId: string, forceRefresh = false): Promise<Task> => {
   const task = await prisma.task.findUnique({ where: { id: taskId } });
 
   if (!task) {
@@ -223,7 +226,7 @@ export const requestAnalysis = async (taskId: string): Promise<Task> => {
     };
     
     // Passa a transcrição existente para o worker
-    await notifyWorkerToAnalyzeTask(taskId, task.transcription, workerConfig);
+    await notifyWorkerToAnalyzeTask(taskId, task.transcription, workerConfig, forceRefresh);
   } catch (error) {
     console.error(`[TaskService] Falha ao notificar worker para análise, revertendo status para FAILED.`);
     const failedTask = await prisma.task.update({
@@ -235,4 +238,56 @@ export const requestAnalysis = async (taskId: string): Promise<Task> => {
   }
 
   return updatedTask;
-};
\ No newline at end of file
+};
+
+// Nova tentativa de uma transcrição que falhou; o worker reaproveita as etapas já concluídas
+export const retryTranscription = async (taskId: string): Promise<Task> => {
+  const task = await prisma.task.findUnique({ where: { id: taskId } });
+
+  if (!task) {
+    const err = new Error('Tarefa não encontrada.');
+    (err as any).statusCode = 404;
+    throw err;
+  }
+
+  if (task.status !== TaskStatus.FAILED || task.transcription) {
+    const err = new Error('Só é possível repetir transcrições que falharam. O status atual é: ' + task.status);
+    (err as any).statusCode = 409;
+    throw err;
+  }
+
+  const updatedTask = await prisma.task.update({
+    where: { id: taskId },
+    data: { status: 'PENDING', analysis: Prisma.DbNull },
+    include: { saleswoman: true },
+  });
+  sendSseEvent(updatedTask);
+
+  try {
+    const allConfigs = await getAllConfigs();
+    const workerConfig = {
+      OPENAI_API_KEY: allConfigs.OPENAI_API_KEY,
+      HF_TOKEN: allConfigs.HF_TOKEN,
+      OPENAI_ASSISTANT_ID: allConfigs.OPENAI_ASSISTANT_ID,
+      WHISPERX_MODEL: allConfigs.WHISPERX_MODEL,
+      DIAR_DEVICE: allConfigs.DIAR_DEVICE,
+      ALIGN_DEVICE: allConfigs.ALIGN_DEVICE,
+      MIN_SPEAKERS: allConfigs.MIN_SPEAKERS,
+      MAX_SPEAKERS: allConfigs.MAX_SPEAKERS
+    };
+
+    const resumableStages = await notifyWorkerToRetryTask(taskId, task.audioFilePath, workerConfig, task.saleswomanId);
+    console.log(`[TaskService] Nova tentativa da tarefa ${taskId}. Etapas reaproveitadas: ${resumableStages.join(', ') || 'nenhuma'}`);
+  } catch (error) {
+    console.error(`[TaskService] Falha ao solicitar nova tentativa da tarefa ${taskId}, revertendo status para FAILED.`);
+    const failedTask = await prisma.task.update({
+      where: { id: taskId },
+      data: { status: 'FAILED' },
+      include: { saleswoman: true },
+    });
+    sendSseEvent(failedTask);
+    throw error;
+  }
+
+  return updatedTask;
+};
@@ -17,6 +17,8 @@ export const TaskProgressItem: React.FC<TaskProgressItemProps> = ({ task }) => {
                 return { icon: <ProcessingSpinner />, label: 'Identificando', progress: '75%', bgColor: 'bg-sky-500' };
             case 'TRANSCRIBED':
                 return { icon: <CheckCircleIcon className="w-5 h-5 text-emerald-500" />, label: 'Concluído', progress: '100%', bgColor: 'bg-emerald-500' };
+            case 'NO_SPEECH':
+                return { icon: <ExclamationTriangleIcon className="w-5 h-5 text-amber-500" />, label: 'Sem fala', progress: '100%', bgColor: 'bg-amber-500' };
             case 'ANALYZING':
                 return { icon: <ProcessingSpinner />, label: 'Análise com IA', progress: '90%', bgColor: 'bg-indigo-500' };
             case 'COMPLETED':
@@ -32,6 +34,7 @@ export const TaskProgressItem: React.FC<TaskProgressItemProps> = ({ task }) => {
     
     const statusColor = ['COMPLETED', 'TRANSCRIBED'].includes(task.status) ? 'text-emerald-600 dark:text-emerald-400' :
                         task.status === 'FAILED' ? 'text-rose-600 dark:text-rose-400' :
+                        task.status === 'NO_SPEECH' ? 'text-amber-600 dark:text-amber-400' :
                         'text-slate-500 dark:text-slate-400';
 
     return (
@@ -52,7 +55,7 @@ export const TaskProgressItem: React.FC<TaskProgressItemProps> = ({ task }) => {
             </div>
             <div className="mt-2 w-full bg-slate-200 dark:bg-slate-700 rounded-full h-1.5">
                 <div 
-                    className={`h-1.5 rounded-full ${bgColor} transition-all duration-500 ease-out ${!['COMPLETED', 'FAILED', 'TRANSCRIBED'].includes(task.status) ? 'animate-pulse' : ''}`} 
+                    className={`h-1.5 rounded-full ${bgColor} transition-all duration-500 ease-out ${!['COMPLETED', 'FAILED', 'TRANSCRIBED', 'NO_SPEECH'].includes(task.status) ? 'animate-pulse' : ''}`} 
                     style={{ width: progress }}
                 ></div>
             </div>
@@ -1,6 +1,6 @@
 import React from 'react';
 import { Task, StatusIndicatorProps } from '../../types/types';
-import { CalendarIcon, CheckCircleIcon, XCircleIcon, ClockIcon, BeakerIcon } from '../../components/icons';
+import { CalendarIcon, CheckCircleIcon, XCircleIcon, ClockIcon, BeakerIcon, ExclamationTriangleIcon } from '../../components/icons';
 
 const StatusIndicator: React.FC<StatusIndicatorProps> = ({ status, hasAnalysis }) => {
   if (status === 'COMPLETED' && hasAnalysis) {
@@ -21,6 +21,15 @@ const StatusIndicator: React.FC<StatusIndicatorProps> = ({ status, hasAnalysis }
     );
   }
 
+  if (status === 'NO_SPEECH') {
+    return (
+      <div className="flex items-center gap-1.5 mt-2 text-xs font-medium text-amber-600 dark:text-amber-400">
+        <ExclamationTriangleIcon className="w-4 h-4" />
+        <span>Sem conversa detectada</span>
+      </div>
+    );
+  }
+
   if (status === 'FAILED') {
     return (
       <div className="flex items-center gap-1.5 mt-2 text-xs font-medium text-rose-600 dark:text-rose-400">
@@ -38,7 +38,7 @@ export const useTaskStream = (isAuthenticated: boolean) => {
                     });
 
                     // Agenda a remoção da tarefa da lista após um tempo se ela estiver concluída
-                    if (updatedTask.status === 'COMPLETED' || updatedTask.status === 'TRANSCRIBED') {
+                    if (['COMPLETED', 'TRANSCRIBED', 'NO_SPEECH'].includes(updatedTask.status)) {
                         const timerId = window.setTimeout(() => {
                             setTasks(currentTasks => currentTasks.filter(t => t.id !== updatedTask.id));
                             removalTimers.current.delete(updatedTask.id);
@@ -235,6 +235,7 @@ export const AnalysisDetailPage: React.FC<AnalysisDetailPageProps> = ({ callId,
                                                 <button onClick={handleRequestAnalysis} className="inline-flex items-center gap-2 text-sm font-medium px-4 py-2 rounded-lg bg-primary-600 text-white hover:bg-primary-700"><LightbulbIcon className="w-5 h-5" />{call.status === 'FAILED' ? 'Tentar Análise Novamente' : 'Analisar com IA'}</button>
                                             </>
                                         )}
+                                        {call.status === 'NO_SPEECH' && (<p className="text-sm text-amber-600 dark:text-amber-400">Quase nenhuma fala foi detectada nesta gravação (caixa postal, ligação caída ou áudio mudo), então ela não foi transcrita nem analisada.</p>)}
                                         {isAnalyzing && (<div className="flex items-center gap-3 text-sm text-indigo-600 dark:text-indigo-400"><Spinner /><span>A IA está analisando. A página será atualizada automaticamente.</span></div>)}
                                         {showAnalysis && analysisData && (<div><p className="text-sm leading-relaxed text-slate-700 dark:text-slate-300 pr-2">{analysisData.summary}</p></div>)}
                                         {error && <p className="text-sm text-red-500 mt-2">{error}</p>}
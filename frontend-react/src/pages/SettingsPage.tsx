@@ -209,6 +209,14 @@ export const SettingsPage: React.FC = () => {
                                 <option value="base">base</option>
                             </select>
                         </div>
+                        <div>
+                            <label htmlFor="MIN_SPEAKERS" className="block text-sm font-medium mb-1">Locutores por ligação</label>
+                            <div className="flex items-center gap-2">
+                                <input type="number" id="MIN_SPEAKERS" name="MIN_SPEAKERS" value={config.MIN_SPEAKERS || ''} onChange={handleChange} min={1} placeholder="Mín. (2)" className="w-full px-4 py-2 bg-slate-50 dark:bg-slate-700/80 border border-slate-300 dark:border-slate-600 rounded-md" />
+                                <input type="number" id="MAX_SPEAKERS" name="MAX_SPEAKERS" value={config.MAX_SPEAKERS || ''} onChange={handleChange} min={1} placeholder="Máx. (4)" className="w-full px-4 py-2 bg-slate-50 dark:bg-slate-700/80 border border-slate-300 dark:border-slate-600 rounded-md" />
+                            </div>
+                            <p className="text-xs text-slate-500 dark:text-slate-400 mt-1">Limites usados pela diarização (vendedora + clientes). Em branco, usa o padrão do worker.</p>
+                        </div>
                     </div>
                 </div>
 
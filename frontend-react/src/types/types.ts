@@ -1,4 +1,4 @@
-export type TaskStatus = 'PENDING' | 'TRANSCRIBING' | 'ALIGNING' | 'DIARIZING' | 'TRANSCRIBED' | 'ANALYZING' | 'COMPLETED' | 'FAILED';
+export type TaskStatus = 'PENDING' | 'TRANSCRIBING' | 'ALIGNING' | 'DIARIZING' | 'TRANSCRIBED' | 'NO_SPEECH' | 'ANALYZING' | 'COMPLETED' | 'FAILED';
 export type StageKey = 'opening' | 'discovery' | 'qualification' | 'closing';
 
 export interface StageAnalysis {
@@ -81,6 +81,8 @@ export type ConfigFormData = {
   WHISPERX_MODEL: 'large-v3' | 'large-v2' | 'base' | 'small' | 'medium';
   DIAR_DEVICE: 'cuda' | 'cpu';
   ALIGN_DEVICE: 'cuda' | 'cpu';
+  MIN_SPEAKERS: string;
+  MAX_SPEAKERS: string;
   SMTP_HOST: string;
   SMTP_PORT: string;
   SMTP_USER: string;
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional
+
+from celery_app import celery_app
+from assistant_runner import ANALYSIS_PROMPT_VERSION, run_openai_assistant
+from disk_cache import DiskCache, make_key
+from metrics import METRICS, record_peak_memory
+from transcript_store import load_transcript
+from worker_common import logger, notify_backend, notify_failure, webhook_url_for
+
+# --- Cache de Análises (transcrição normalizada + assistente + versão do prompt) ---
+# Reanálises e webhooks repetidos da mesma transcrição não pagam outro run do Assistant
+ANALYSIS_CACHE = DiskCache(
+    "analyses",
+    int(os.getenv("ANALYSIS_CACHE_MAX_MB", "256")) * 1024 * 1024,
+    ttl_s=float(os.getenv("ANALYSIS_CACHE_TTL_HOURS", "720")) * 3600,
+)
+
+
+def analysis_cache_key(transcription: str, assistant_id: str) -> str:
+    # Quebras de linha e espaços nas bordas não mudam a análise
+    normalized = "\n".join(line.strip() for line in transcription.replace("\r\n", "\n").split("\n") if line.strip())
+    transcript_hash = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+    return make_key(transcript_hash, assistant_id, ANALYSIS_PROMPT_VERSION)
+
+
+def is_cacheable(analysis: Any) -> bool:
+    # Só guarda análises válidas; a resposta de erro pedida no prompt ({"erro": ...}) não entra
+    return isinstance(analysis, dict) and bool(analysis) and "erro" not in analysis
+
+
+@celery_app.task(name="analyze_task")
+def analyze_task(
+    task_id: str,
+    transcription: Optional[str],
+    config: Dict[str, Any],
+    transcription_ref: Optional[str] = None,
+    force_refresh: bool = False,
+):
+    """
+    Recebe uma transcrição (ou a referência dela no volume compartilhado) e realiza apenas a análise com IA.
+    Uma análise já feita para a mesma transcrição e o mesmo assistente é devolvida do cache,
+    a menos que `force_refresh` seja pedido.
+    """
+    logger.info(f"[Worker Celery] Iniciando ANÁLISE DE IA | task_id={task_id}")
+    webhook_url = webhook_url_for(task_id)
+    
+    openai_api_key = config.get("OPENAI_API_KEY")
+    openai_assistant_id = config.get("OPENAI_ASSISTANT_ID")
+
+    if not all([openai_api_key, openai_assistant_id]):
+        error_message = "Configuração incompleta para análise: Chave da API OpenAI ou ID do assistente ausentes."
+        logger.error(error_message)
+        notify_backend(webhook_url, {"status": "FAILED", "analysis": {"error": error_message}})
+        return
+    
+    try:
+        if transcription is None:
+            logger.info(f"Lendo transcrição por referência: {transcription_ref}")
+            transcription = load_transcript(transcription_ref)
+
+        cache_key = analysis_cache_key(transcription, openai_assistant_id)
+        cached = None if force_refresh else ANALYSIS_CACHE.get(cache_key)
+        if cached is not None:
+            logger.info(f"Análise encontrada no cache ({cache_key[:12]}). Pulando o OpenAI Assistant.")
+            notify_backend(webhook_url, {"status": "COMPLETED", "analysis": json.dumps(cached, ensure_ascii=False)})
+            METRICS.inc("worker_tasks_total", task="analysis", result="cached")
+            return
+
+        logger.info("Etapa 1: Enviando transcrição ao OpenAI Assistant...")
+        analysis_result_json = run_openai_assistant(transcription, openai_api_key, openai_assistant_id)
+        if is_cacheable(analysis_result_json):
+            ANALYSIS_CACHE.set(cache_key, analysis_result_json)
+
+        payload = {
+            "status": "COMPLETED",
+            "analysis": json.dumps(analysis_result_json, ensure_ascii=False),
+        }
+        logger.info(f"Enviando webhook de ANÁLISE concluída para: {webhook_url}")
+        notify_backend(webhook_url, payload)
+        METRICS.inc("worker_tasks_total", task="analysis", result="completed")
+
+    except Exception as e:
+        METRICS.inc("worker_tasks_total", task="analysis", result="failed")
+        notify_failure(webhook_url, f"Erro ao analisar a tarefa {task_id}: {e}")
+    finally:
+        record_peak_memory("analysis")
+        logger.info(f"[Worker Celery] Finalizado processamento de análise | task_id={task_id}")
@@ -0,0 +1,179 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from openai import AsyncOpenAI
+
+from metrics import METRICS
+from worker_common import logger
+
+ASSISTANT_MAX_WAIT_S = int(os.getenv("ASSISTANT_MAX_WAIT_S", "300"))
+# Quantas execuções do Assistant podem estar em andamento ao mesmo tempo neste processo
+ASSISTANT_MAX_CONCURRENCY = int(os.getenv("ASSISTANT_MAX_CONCURRENCY", "20"))
+
+_TERMINAL_EVENTS = {
+    "thread.run.completed",
+    "thread.run.failed",
+    "thread.run.cancelled",
+    "thread.run.expired",
+    "thread.run.incomplete",
+}
+
+
+def extract_json_from_text(text: str) -> Dict[str, Any]:
+    try:
+        return json.loads(text)
+    except Exception:
+        pass
+    code_block = re.search(r"```(?:json)?\s*([\s\S]*?)\s*```", text, re.IGNORECASE)
+    if code_block:
+        candidate = code_block.group(1).strip()
+        try:
+            return json.loads(candidate)
+        except Exception:
+            pass
+    first = text.find("{")
+    last = text.rfind("}")
+    if first != -1 and last != -1 and last > first:
+        candidate = text[first : last + 1].strip()
+        try:
+            return json.loads(candidate)
+        except Exception:
+            pass
+    raise ValueError("Não foi possível extrair um JSON válido da resposta do Assistant.")
+
+
+# Incrementar sempre que build_prompt mudar, para invalidar o cache de análises
+ANALYSIS_PROMPT_VERSION = "1"
+
+
+def build_prompt(vtt_content: str) -> str:
+    return (
+        "Analise a seguinte transcrição de chamada (formato VTT) e RETORNE EXCLUSIVAMENTE um JSON válido, "
+        "sem qualquer texto adicional. Se não puder analisar, retorne um JSON como "
+        '{"erro": "<motivo>"}.\n\n---\n\n'
+        f"{vtt_content}"
+    )
+
+
+class AssistantRunner:
+    """
+    Executa runs do OpenAI Assistant num event loop asyncio dedicado (uma thread por processo).
+    Os clientes `AsyncOpenAI` são reutilizados por chave de API, mantendo o pool de conexões
+    HTTP aberto, e o resultado chega pelos eventos de streaming do run, sem polling com sleep.
+    Várias análises ficam em andamento ao mesmo tempo, limitadas por um semáforo.
+    """
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max_concurrency
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._clients: Dict[str, AsyncOpenAI] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            # Após um fork (prefork do Celery) a thread do loop não existe no processo filho
+            if self._loop is None or self._pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="assistant-loop", daemon=True).start()
+                self._loop, self._pid, self._clients = loop, os.getpid(), {}
+                self._semaphore = None
+            return self._loop
+
+    def client(self, api_key: str) -> AsyncOpenAI:
+        # Chamado sempre de dentro do loop, então não há concorrência entre threads aqui
+        client = self._clients.get(api_key)
+        if client is None:
+            client = AsyncOpenAI(api_key=api_key)
+            self._clients[api_key] = client
+        return client
+
+    async def run(self, vtt_content: str, api_key: str, assistant_id: str, max_wait_s: int = ASSISTANT_MAX_WAIT_S) -> Dict[str, Any]:
+        if not api_key or not assistant_id:
+            raise RuntimeError("Chave da API OpenAI ou ID do Assistente ausentes.")
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        queued_at = time.monotonic()
+        async with self._semaphore:
+            METRICS.observe("worker_analysis_wait_seconds", time.monotonic() - queued_at, phase="queue")
+            client = self.client(api_key)
+            state: Dict[str, Any] = {"thread_id": None, "run_id": None, "run": None, "text": ""}
+            start = time.monotonic()
+            try:
+                await asyncio.wait_for(self._stream_run(client, vtt_content, assistant_id, state), timeout=max_wait_s)
+            except asyncio.TimeoutError:
+                if state["thread_id"] and state["run_id"]:
+                    try:
+                        await client.beta.threads.runs.cancel(thread_id=state["thread_id"], run_id=state["run_id"])
+                    except Exception: pass
+                raise TimeoutError(f"Tempo máximo de espera ({max_wait_s}s) excedido para execução do Assistant.")
+            finally:
+                METRICS.observe("worker_analysis_wait_seconds", time.monotonic() - start, phase="run")
+            logger.info(f"Run {state['run_id']} finalizado em {time.monotonic() - start:.1f}s.")
+
+            run = state["run"]
+            if run is None or run.status != "completed":
+                last_error = getattr(run, "last_error", None)
+                status = getattr(run, "status", "desconhecido")
+                reason = getattr(last_error, "message", f"Status final foi '{status}'")
+                raise RuntimeError(f"A execução do Assistant falhou. Causa: {reason}")
+
+            assistant_text = state["text"]
+            if not assistant_text:
+                messages = await client.beta.threads.messages.list(thread_id=state["thread_id"])
+                assistant_text = next(
+                    (part.text.value for m in messages.data if m.role == "assistant" for part in m.content if part.type == "text" and part.text), ""
+                )
+            if not assistant_text:
+                raise RuntimeError("Não foi possível localizar a mensagem do Assistant com conteúdo de texto.")
+
+        analysis_json = extract_json_from_text(assistant_text)
+        logger.info("Análise JSON da IA obtida com sucesso.")
+        return analysis_json
+
+    async def _stream_run(self, client: AsyncOpenAI, vtt_content: str, assistant_id: str, state: Dict[str, Any]) -> None:
+        # Thread, mensagem e run são criados numa única chamada
+        stream = await client.beta.threads.create_and_run(
+            assistant_id=assistant_id,
+            thread={"messages": [{"role": "user", "content": build_prompt(vtt_content)}]},
+            tool_choice="none",
+            stream=True,
+        )
+        async with stream:
+            async for event in stream:
+                if event.event == "thread.created":
+                    state["thread_id"] = event.data.id
+                    logger.info(f"Thread criada: {event.data.id}")
+                elif event.event == "thread.run.created":
+                    state["run_id"] = event.data.id
+                    logger.info(f"Run iniciada: {event.data.id} (aguardando eventos)")
+                elif event.event == "thread.message.completed" and event.data.role == "assistant":
+                    state["text"] = "".join(
+                        part.text.value for part in event.data.content if part.type == "text" and part.text
+                    )
+                elif event.event in _TERMINAL_EVENTS:
+                    state["run"] = event.data
+                    logger.info(f"Status final do run: {event.data.status}")
+                    return
+                elif event.event == "error":
+                    raise RuntimeError(f"Erro no streaming do Assistant: {getattr(event.data, 'message', event.data)}")
+
+    def run_sync(self, vtt_content: str, api_key: str, assistant_id: str, max_wait_s: int = ASSISTANT_MAX_WAIT_S) -> Dict[str, Any]:
+        """Versão bloqueante para as tarefas do Celery: a thread espera enquanto o loop atende as demais."""
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(self.run(vtt_content, api_key, assistant_id, max_wait_s), loop)
+        return future.result()
+
+
+ASSISTANT_RUNNER = AssistantRunner(ASSISTANT_MAX_CONCURRENCY)
+
+
+def run_openai_assistant(vtt_content: str, api_key: str, assistant_id: str, max_wait_s: int = ASSISTANT_MAX_WAIT_S) -> Dict[str, Any]:
+    return ASSISTANT_RUNNER.run_sync(vtt_content, api_key, assistant_id, max_wait_s)
@@ -0,0 +1,166 @@
+import json
+import logging
+import os
+import subprocess
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger("ai_worker")
+
+# "priority" ordena a fila de áudio por custo estimado; "fifo" volta ao envio direto para o Celery
+AUDIO_SCHEDULING = os.getenv("AUDIO_SCHEDULING", "priority").strip().lower()
+SCHEDULER_PREFIX = os.getenv("SCHEDULER_PREFIX", "audio_scheduler")
+# Segundos de atraso na fila por segundo de áudio (0.5 = uma gravação de 1h "chega" 30 min depois)
+SCHED_DURATION_WEIGHT = float(os.getenv("SCHED_DURATION_WEIGHT", "0.5"))
+# Teto do atraso por duração: nenhuma tarefa espera mais que isso além da ordem de chegada
+SCHED_MAX_DELAY_S = float(os.getenv("SCHED_MAX_DELAY_S", "1800"))
+# Atraso extra por tarefa que a mesma vendedora já tem na fila ou em execução
+SCHED_FAIRNESS_S = float(os.getenv("SCHED_FAIRNESS_S", "120"))
+# Duração assumida quando o ffprobe não consegue ler o arquivo
+SCHED_DEFAULT_DURATION_S = float(os.getenv("SCHED_DEFAULT_DURATION_S", "600"))
+
+
+def probe_duration(audio_path: str) -> Optional[float]:
+    """Duração (s) lida do contêiner pelo ffprobe, sem decodificar o áudio. None se não for possível."""
+    cmd = [
+        "ffprobe", "-v", "error", "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1", audio_path,
+    ]
+    try:
+        output = subprocess.run(cmd, capture_output=True, check=True, timeout=30).stdout.decode().strip()
+        return float(output) if output and output != "N/A" else None
+    except (OSError, ValueError, subprocess.SubprocessError) as e:
+        logger.warning(f"Não foi possível obter a duração de {audio_path}: {e}")
+        return None
+
+
+def cost_delay(duration_s: Optional[float]) -> float:
+    duration = duration_s if duration_s is not None else SCHED_DEFAULT_DURATION_S
+    return min(SCHED_MAX_DELAY_S, max(0.0, duration) * SCHED_DURATION_WEIGHT)
+
+
+# Enfileira uma tarefa e retorna {pontuação, 1 se criou a entrada / 0 se ela já estava na fila};
+# o atraso de justiça depende de quantas tarefas a vendedora já tem. Sem vendedora (id vazio)
+# não há backlog: tarefas sem dono não se atrasam umas às outras
+_ENQUEUE_SCRIPT = """
+local existing = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if existing then
+  return {existing, 0}
+end
+local backlog = 0
+if ARGV[3] ~= '' then
+  backlog = redis.call('HINCRBY', KEYS[3], ARGV[3], 1) - 1
+end
+local score = tonumber(ARGV[4]) + backlog * tonumber(ARGV[5])
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+redis.call('ZADD', KEYS[1], score, ARGV[1])
+return {tostring(score), 1}
+"""
+
+# Entrega a tarefa de menor pontuação para o token; um token reentregue recebe a mesma tarefa
+_CLAIM_SCRIPT = """
+local current = redis.call('HGET', KEYS[3], ARGV[1])
+if current then
+  return current
+end
+local popped = redis.call('ZPOPMIN', KEYS[1])
+if #popped == 0 then
+  return false
+end
+local job = redis.call('HGET', KEYS[2], popped[1])
+redis.call('HDEL', KEYS[2], popped[1])
+if not job then
+  return false
+end
+redis.call('HSET', KEYS[3], ARGV[1], job)
+return job
+"""
+
+# Remove a tarefa (da fila ou da execução) e desconta do backlog da vendedora
+_RELEASE_SCRIPT = """
+local removed = redis.call('HDEL', KEYS[1], ARGV[1])
+if removed == 1 and ARGV[2] ~= '' and redis.call('HINCRBY', KEYS[2], ARGV[2], -1) <= 0 then
+  redis.call('HDEL', KEYS[2], ARGV[2])
+end
+return removed
+"""
+
+
+class AudioScheduler:
+    """
+    Fila de prioridade da transcrição num sorted set do Redis. A pontuação é o instante de
+    chegada mais um atraso proporcional à duração (limitado por SCHED_MAX_DELAY_S) e um atraso
+    por tarefa pendente da mesma vendedora: chamadas curtas passam na frente, as longas nunca
+    esperam indefinidamente (a chegada envelhece a pontuação) e uma vendedora com muitos envios
+    não monopoliza a GPU.
+
+    O Celery continua sendo o transporte: para cada tarefa enfileirada aqui a API envia um
+    `process_next_audio_task` sem argumentos, e é o worker que escolhe, na hora de executar,
+    qual tarefa pendente processar. Com `task_acks_late`, um token reentregue após a queda do
+    worker retoma a mesma tarefa, registrada em `inflight` pelo id do token.
+    """
+
+    def __init__(self, url: str, prefix: str) -> None:
+        self.url = url
+        self.pending_key = f"{prefix}:pending"
+        self.jobs_key = f"{prefix}:jobs"
+        self.inflight_key = f"{prefix}:inflight"
+        self.backlog_key = f"{prefix}:backlog"
+        self._client: Any = None
+        self._scripts: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _redis(self) -> Any:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import redis
+
+                    client = redis.Redis.from_url(self.url, socket_timeout=5, socket_connect_timeout=5)
+                    self._scripts = {
+                        "enqueue": client.register_script(_ENQUEUE_SCRIPT),
+                        "claim": client.register_script(_CLAIM_SCRIPT),
+                        "release": client.register_script(_RELEASE_SCRIPT),
+                    }
+                    self._client = client
+        return self._client
+
+    def _script(self, name: str) -> Any:
+        self._redis()
+        return self._scripts[name]
+
+    def enqueue(self, task_id: str, file_path: str, config: Dict[str, Any], saleswoman_id: Optional[str], duration_s: Optional[float]) -> Tuple[float, bool]:
+        """
+        Pontuação da tarefa e se esta chamada a criou. Uma tarefa que já está na fila (ex.: envio
+        repetido pelo backend) mantém a entrada e o token originais.
+        """
+        now = time.time()
+        job = {
+            "task_id": task_id,
+            "file_path": file_path,
+            "config": config,
+            "saleswoman_id": saleswoman_id or "",
+            "duration_s": duration_s,
+            "enqueued_at": now,
+        }
+        score, created = self._script("enqueue")(
+            keys=[self.pending_key, self.jobs_key, self.backlog_key],
+            args=[task_id, json.dumps(job), job["saleswoman_id"], now + cost_delay(duration_s), SCHED_FAIRNESS_S],
+        )
+        return float(score), bool(created)
+
+    def discard(self, task_id: str, saleswoman_id: Optional[str]) -> None:
+        """Desfaz um `enqueue` que criou a entrada e cujo token não pôde ser enviado ao Celery."""
+        self._redis().zrem(self.pending_key, task_id)
+        self._script("release")(keys=[self.jobs_key, self.backlog_key], args=[task_id, saleswoman_id or ""])
+
+    def claim(self, token: str) -> Optional[Dict[str, Any]]:
+        raw = self._script("claim")(keys=[self.pending_key, self.jobs_key, self.inflight_key], args=[token])
+        return json.loads(raw) if raw else None
+
+    def release(self, token: str, job: Dict[str, Any]) -> None:
+        self._script("release")(keys=[self.inflight_key, self.backlog_key], args=[token, job.get("saleswoman_id", "")])
+
+
+AUDIO_SCHEDULER = AudioScheduler(os.getenv("REDIS_URL", "redis://localhost:6380/0"), SCHEDULER_PREFIX)
@@ -0,0 +1,70 @@
+import logging
+import os
+import subprocess
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator
+
+import numpy as np
+
+logger = logging.getLogger("ai_worker")
+
+# Mesma taxa de amostragem usada pelo WhisperX (whisperx.audio.SAMPLE_RATE)
+SAMPLE_RATE = 16000
+# Diretório para o PCM temporário; em nós com pouco disco pode apontar para outro volume
+AUDIO_SCRATCH_DIR = os.getenv("AUDIO_SCRATCH_DIR") or None
+
+
+def decode_to_pcm(audio_path: str, output_path: str, sr: int = SAMPLE_RATE) -> None:
+    """
+    Decodifica o áudio com o ffmpeg direto para um arquivo float32 mono, sem passar pela memória
+    do processo Python (ao contrário de `whisperx.load_audio`, que lê tudo do stdout).
+    """
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", "0", "-y",
+        "-i", audio_path,
+        "-f", "f32le", "-ac", "1", "-acodec", "pcm_f32le", "-ar", str(sr),
+        output_path,
+    ]
+    try:
+        subprocess.run(cmd, capture_output=True, check=True)
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Falha ao decodificar o áudio: {e.stderr.decode(errors='ignore')}") from e
+
+
+@contextmanager
+def open_audio(audio_path: str, sr: int = SAMPLE_RATE) -> Iterator[np.ndarray]:
+    """
+    Abre o áudio como um `np.memmap` somente leitura (copy-on-write) sobre um PCM temporário.
+    Fatias do array (`audio[a:b]`) são views sem cópia, então transcrição, alinhamento e
+    diarização compartilham as mesmas páginas, que são do page cache e podem ser
+    descartadas pelo kernel, em vez de um array anônimo do tamanho da gravação inteira.
+    O arquivo temporário é removido ao sair do contexto.
+    """
+    fd, pcm_path = tempfile.mkstemp(prefix="audio_", suffix=".f32", dir=AUDIO_SCRATCH_DIR)
+    os.close(fd)
+    audio = None
+    try:
+        decode_to_pcm(audio_path, pcm_path, sr)
+        n_samples = os.path.getsize(pcm_path) // np.dtype(np.float32).itemsize
+        if n_samples == 0:
+            audio = np.zeros(0, dtype=np.float32)
+        else:
+            audio = np.memmap(pcm_path, dtype=np.float32, mode="c", shape=(n_samples,))
+        logger.info(f"Áudio mapeado em memória: {n_samples / sr:.1f}s ({n_samples * 4 / 1024 / 1024:.1f} MB em {pcm_path})")
+        yield audio
+    finally:
+        # O mapeamento só é desfeito quando a última view é coletada; remover o arquivo antes disso é seguro
+        del audio
+        try:
+            os.remove(pcm_path)
+        except OSError:
+            pass
+
+
+def audio_window(audio: np.ndarray, start_s: float, end_s: float, sr: int = SAMPLE_RATE) -> np.ndarray:
+    """View sem cópia de um trecho do áudio, em segundos."""
+    start = max(0, int(start_s * sr))
+    end = min(len(audio), int(end_s * sr))
+    return audio[start:end]
+
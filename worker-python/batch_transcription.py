@@ -0,0 +1,133 @@
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+from audio_source import SAMPLE_RATE
+
+logger = logging.getLogger("ai_worker")
+
+# Tamanho máximo (em segundos) de cada chunk de VAD, igual ao padrão do WhisperX
+CHUNK_SIZE_S = 30
+
+# Atributos internos do pipeline do WhisperX (3.1.x) usados para compartilhar os lotes
+_PIPELINE_ATTRIBUTES = ("vad_model", "_vad_params", "tokenizer", "preset_language", "detect_language")
+
+_warned_unsupported = False
+
+
+def _shared_batch_support(model: Any) -> Optional[Tuple[Callable[..., Any], Any]]:
+    """
+    `(merge_chunks, Tokenizer)` se a versão instalada do WhisperX expõe os internos usados pelo
+    lote compartilhado, ou None. Os imports são feitos aqui, e não no carregamento do módulo,
+    para que uma versão com outra organização (ex.: o VAD em `whisperx.vads`) só desative o
+    agrupamento em vez de impedir o worker de subir.
+    """
+    global _warned_unsupported
+    try:
+        from faster_whisper.tokenizer import Tokenizer
+        from whisperx.vad import merge_chunks
+
+        if all(hasattr(model, name) for name in _PIPELINE_ATTRIBUTES) and hasattr(model.model.model, "is_multilingual"):
+            return merge_chunks, Tokenizer
+    except (ImportError, AttributeError):
+        pass
+    if not _warned_unsupported:
+        _warned_unsupported = True
+        logger.warning("Versão do WhisperX sem os internos esperados. Lotes serão transcritos arquivo a arquivo.")
+    return None
+
+
+def _vad_chunks(model: Any, merge_chunks: Callable[..., Any], audio: np.ndarray, chunk_size: int) -> List[Dict[str, Any]]:
+    vad_segments = model.vad_model({"waveform": torch.from_numpy(audio).unsqueeze(0), "sample_rate": SAMPLE_RATE})
+    return merge_chunks(
+        vad_segments,
+        chunk_size,
+        onset=model._vad_params["vad_onset"],
+        offset=model._vad_params["vad_offset"],
+    )
+
+
+def _set_language(model: Any, tokenizer_cls: Any, language: str) -> None:
+    tokenizer = model.tokenizer
+    if tokenizer is None or tokenizer.language_code != language or tokenizer.task != "transcribe":
+        model.tokenizer = tokenizer_cls(
+            model.model.hf_tokenizer,
+            model.model.model.is_multilingual,
+            task="transcribe",
+            language=language,
+        )
+
+
+def _transcribe_group(
+    model: Any,
+    audios: List[np.ndarray],
+    items: List[Tuple[int, List[Dict[str, Any]]]],
+    batch_size: int,
+) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    Transcreve, em lotes compartilhados, os chunks de VAD de vários arquivos do mesmo idioma.
+    A ordem de saída do pipeline é a mesma da entrada, o que permite devolver cada
+    segmento ao arquivo de origem.
+    """
+    owners: List[Tuple[int, Dict[str, Any]]] = [(file_idx, seg) for file_idx, segs in items for seg in segs]
+
+    def data():
+        for file_idx, seg in owners:
+            f1 = int(seg["start"] * SAMPLE_RATE)
+            f2 = int(seg["end"] * SAMPLE_RATE)
+            yield {"inputs": audios[file_idx][f1:f2]}
+
+    segments: Dict[int, List[Dict[str, Any]]] = {file_idx: [] for file_idx, _ in items}
+    for idx, out in enumerate(model(data(), batch_size=batch_size, num_workers=0)):
+        text = out["text"]
+        if batch_size in [0, 1, None]:
+            text = text[0]
+        file_idx, seg = owners[idx]
+        segments[file_idx].append({"text": text, "start": round(seg["start"], 3), "end": round(seg["end"], 3)})
+    return segments
+
+
+def transcribe_batch(
+    model: Any,
+    audios: List[np.ndarray],
+    batch_size: int,
+    language: Optional[str] = None,
+    chunk_size: int = CHUNK_SIZE_S,
+) -> List[Dict[str, Any]]:
+    """
+    Equivalente a chamar `model.transcribe` para cada áudio, mas agrupando os chunks de VAD
+    de todos os arquivos (por idioma) em lotes de inferência compartilhados, para manter a
+    GPU ocupada mesmo com ligações curtas. Sem suporte (ver `_shared_batch_support`) ou com
+    `suppress_numerals`, cai para `model.transcribe` arquivo a arquivo.
+    """
+    support = _shared_batch_support(model)
+    if support is None or getattr(model, "suppress_numerals", False):
+        if support is not None:
+            logger.warning("suppress_numerals ativo no modelo. Transcrevendo o lote arquivo a arquivo.")
+        return [model.transcribe(audio, batch_size=batch_size, language=language) for audio in audios]
+    merge_chunks, tokenizer_cls = support
+
+    preset_language = language or model.preset_language
+    groups: Dict[str, List[Tuple[int, List[Dict[str, Any]]]]] = {}
+    for file_idx, audio in enumerate(audios):
+        vad_segments = _vad_chunks(model, merge_chunks, audio, chunk_size)
+        file_language = preset_language or model.detect_language(audio)
+        groups.setdefault(file_language, []).append((file_idx, vad_segments))
+
+    total_chunks = sum(len(segs) for items in groups.values() for _, segs in items)
+    logger.info(f"Lote com {len(audios)} arquivo(s), {total_chunks} chunk(s) de VAD e {len(groups)} idioma(s).")
+
+    results: List[Dict[str, Any]] = [{"segments": [], "language": preset_language} for _ in audios]
+    previous_tokenizer = model.tokenizer
+    try:
+        for group_language, items in groups.items():
+            _set_language(model, tokenizer_cls, group_language)
+            segments = _transcribe_group(model, audios, items, batch_size)
+            for file_idx, file_segments in segments.items():
+                results[file_idx] = {"segments": file_segments, "language": group_language}
+    finally:
+        # Mesmo comportamento do `transcribe` do WhisperX: sem idioma fixo, o tokenizer é descartado
+        model.tokenizer = previous_tokenizer if model.preset_language is not None else None
+    return results
@@ -0,0 +1,82 @@
+"""
+Compara dois resultados de `benchmarks.run` e aponta regressões.
+
+    python -m benchmarks.compare benchmarks/results/antes.json benchmarks/results/depois.json --threshold 0.10
+
+Retorna código 1 se alguma métrica piorar além do limite (útil em CI).
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# (nome exibido, caminho no nível, True se maior é melhor)
+_METRICS: List[Tuple[str, Tuple[str, ...], bool]] = [
+    ("vazão (s de áudio/s)", ("throughput", "audio_s_per_s"), True),
+    ("p50 até TRANSCRIBED (s)", ("latency_s", "transcribed_p50"), False),
+    ("p95 até TRANSCRIBED (s)", ("latency_s", "transcribed_p95"), False),
+    ("p50 até COMPLETED (s)", ("latency_s", "completed_p50"), False),
+    ("pico de RSS (MB)", ("peak_rss_mb",), False),
+    ("pico de GPU (MB)", ("peak_gpu_mb",), False),
+]
+
+
+def _get(data: Dict[str, Any], path: Tuple[str, ...]) -> Optional[float]:
+    for key in path:
+        if not isinstance(data, dict) or key not in data:
+            return None
+        data = data[key]
+    return data
+
+
+def _rows(base: Dict[str, Any], new: Dict[str, Any]) -> Iterator[Tuple[str, Optional[float], Optional[float], bool]]:
+    for name, path, higher_is_better in _METRICS:
+        yield name, _get(base, path), _get(new, path), higher_is_better
+    for stage in sorted(set(base.get("stages", {})) | set(new.get("stages", {}))):
+        yield f"etapa {stage} (s)", _get(base, ("stages", stage, "mean_s")), _get(new, ("stages", stage, "mean_s")), False
+
+
+def compare(baseline: Dict[str, Any], candidate: Dict[str, Any], threshold: float) -> int:
+    base_levels = {(lvl["audio_s"], lvl["concurrency"]): lvl for lvl in baseline["levels"]}
+    regressions = 0
+    for level in candidate["levels"]:
+        key = (level["audio_s"], level["concurrency"])
+        base = base_levels.get(key)
+        print(f"\n== {key[0]:g}s de áudio, concorrência {key[1]} ==")
+        if base is None:
+            print("   (sem nível correspondente no resultado base)")
+            continue
+        for name, old, new, higher_is_better in _rows(base, level):
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else 0.0
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > threshold:
+                flag = "  <-- REGRESSÃO"
+                regressions += 1
+            elif worse < -threshold:
+                flag = "  (melhora)"
+            print(f"   {name:<28} {old:>12.3f} -> {new:>12.3f}  {change:+7.1%}{flag}")
+    print(f"\n{regressions} regressão(ões) acima de {threshold:.0%}.")
+    return 1 if regressions else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compara dois resultados de benchmark.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Piora relativa tolerada (0.10 = 10%%).")
+    args = parser.parse_args(argv)
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+    for name, data in (("base", baseline), ("candidato", candidate)):
+        meta = data.get("meta", {})
+        print(f"{name}: {meta.get('label') or '-'} | commit {meta.get('git_commit')} | {meta.get('created_at')} | modelos {meta.get('models')}")
+    return compare(baseline, candidate, args.threshold)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+"""
+Benchmark de ponta a ponta do worker (transcrição + análise) em CPU, sem rede.
+
+    cd worker-python
+    python -m benchmarks.run --durations 60,300 --concurrency 1,2,4
+    python -m benchmarks.run --models real --whisper-model tiny   # modelos reais já baixados
+    python -m benchmarks.compare benchmarks/results/antes.json benchmarks/results/depois.json
+
+Os webhooks do backend e a API de Assistants da OpenAI são atendidos por um servidor local
+(benchmarks/standins.py); com `--models stub`, WhisperX, alinhamento e diarização são
+substituídos por stubs com custo de CPU proporcional à duração do áudio.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from benchmarks.standins import StandInServer
+from benchmarks.synthetic_audio import synthetic_call, write_wav
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+FORMAT_VERSION = 1
+
+
+def _csv(text: str, cast=float) -> List[Any]:
+    return [cast(part) for part in text.split(",") if part.strip()]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark offline do pipeline de transcrição e análise.")
+    parser.add_argument("--durations", default="60,300", help="Durações do áudio sintético, em segundos (lista).")
+    parser.add_argument("--concurrency", default="1,2,4", help="Níveis de concorrência (lista).")
+    parser.add_argument("--tasks-per-level", type=int, default=0, help="Tarefas por nível (padrão: 2x a concorrência).")
+    parser.add_argument("--models", choices=["stub", "real"], default="stub")
+    parser.add_argument("--whisper-model", default="tiny", help="Modelo do WhisperX com --models real.")
+    parser.add_argument("--stub-rtf", default="", help="Custo dos stubs por segundo de áudio, ex.: transcribe=0.05,align=0.01,diarize=0.03")
+    parser.add_argument("--assistant-latency", type=float, default=1.0, help="Latência simulada do OpenAI Assistant (s).")
+    parser.add_argument("--skip-analysis", action="store_true", help="Mede só a transcrição.")
+    parser.add_argument("--timeout", type=float, default=1800.0, help="Tempo máximo por tarefa (s).")
+    parser.add_argument("--label", default="", help="Rótulo livre gravado no resultado (ex.: nome do branch).")
+    parser.add_argument("--output", default="", help="Arquivo JSON de saída (padrão: benchmarks/results/<data>.json).")
+    return parser.parse_args(argv)
+
+
+def configure_environment(workdir: str, standins_url: str) -> None:
+    # Precisa acontecer antes de importar os módulos do worker, que leem o ambiente na importação
+    os.environ.update({
+        "NODE_BACKEND_URL": standins_url,
+        "INTERNAL_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": f"{standins_url}/v1",
+        "METRICS_BACKEND": "memory",
+        "TRANSCRIPTION_CACHE_MAX_MB": "0",
+        "ANALYSIS_CACHE_MAX_MB": "0",
+        "WARM_PRELOAD": "false",
+        "CUDA_VISIBLE_DEVICES": "",
+        "WORKER_CACHE_DIR": os.path.join(workdir, "cache"),
+        "WEBHOOK_OUTBOX_DIR": os.path.join(workdir, "outbox"),
+        "TRANSCRIPT_STORE_DIR": os.path.join(workdir, "transcripts"),
+        "CHECKPOINT_DIR": os.path.join(workdir, "checkpoints"),
+        "AUDIO_SCRATCH_DIR": workdir,
+    })
+
+
+class MemorySampler:
+    """Amostra o RSS do processo (e a GPU, se houver) para obter o pico de cada nível."""
+
+    def __init__(self, interval_s: float = 0.05):
+        self.interval_s = interval_s
+        self.peak_rss_mb = 0.0
+        self.peak_gpu_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self) -> "MemorySampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        page_mb = os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+        torch = sys.modules.get("torch")
+        while True:
+            try:
+                with open("/proc/self/statm") as f:
+                    self.peak_rss_mb = max(self.peak_rss_mb, int(f.read().split()[1]) * page_mb)
+            except (OSError, ValueError, IndexError):
+                pass
+            if torch is not None and torch.cuda.is_available():
+                free_bytes, total_bytes = torch.cuda.mem_get_info()
+                self.peak_gpu_mb = max(self.peak_gpu_mb, (total_bytes - free_bytes) / (1024 * 1024))
+            if self._stop.wait(self.interval_s):
+                return
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return round(ordered[index], 4)
+
+
+def _histogram_delta(before: Dict[str, Dict[str, float]], after: Dict[str, Dict[str, float]], name: str, label: str) -> Dict[str, Dict[str, float]]:
+    """{valor do label: {"sum": s, "count": n}} do que foi observado entre os dois snapshots."""
+    series: Dict[str, Dict[str, float]] = {}
+    old = before.get(name, {})
+    for field, value in after.get(name, {}).items():
+        kind, _, label_text = field.split("|", 2)
+        if kind not in ("sum", "count"):
+            continue
+        labels = dict(part.split("=", 1) for part in label_text.split(",") if part)
+        key = labels.get(label, '""').strip('"')
+        series.setdefault(key, {"sum": 0.0, "count": 0.0})[kind] += value - old.get(field, 0.0)
+    return {k: v for k, v in series.items() if v["count"] > 0}
+
+
+def _mean(stats: Dict[str, float]) -> float:
+    return round(stats["sum"] / stats["count"], 4)
+
+
+def run_level(tasks: Any, analysis_tasks: Any, metrics: Any, standins: StandInServer, audio_path: str,
+              duration_s: float, concurrency: int, task_count: int, args: argparse.Namespace) -> Dict[str, Any]:
+    config = {"HF_TOKEN": "benchmark", "WHISPERX_MODEL": args.whisper_model, "WHISPERX_LANGUAGE": "pt"}
+    analysis_config = {"OPENAI_API_KEY": "benchmark", "OPENAI_ASSISTANT_ID": "asst_bench"}
+    run_id = f"{int(time.time() * 1000):x}"
+
+    def one(index: int) -> Dict[str, Any]:
+        task_id = f"bench-{run_id}-{duration_s:g}s-c{concurrency}-{index}"
+        start = time.perf_counter()
+        tasks.process_audio_task(task_id, audio_path, config)
+        transcribed_at, payload = standins.wait_for(task_id, ("TRANSCRIBED", "FAILED"), args.timeout)
+        outcome = {"transcribed_s": transcribed_at - start, "failed": payload["status"] == "FAILED"}
+        if not outcome["failed"] and not args.skip_analysis:
+            analysis_tasks.analyze_task(task_id, payload["transcription"], analysis_config)
+            completed_at, payload = standins.wait_for(task_id, ("COMPLETED", "FAILED"), args.timeout)
+            outcome["completed_s"] = completed_at - start
+            outcome["failed"] = payload["status"] == "FAILED"
+        return outcome
+
+    before = metrics.snapshot()
+    with MemorySampler() as sampler, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        wall_start = time.perf_counter()
+        outcomes = list(pool.map(one, range(task_count)))
+        wall_s = time.perf_counter() - wall_start
+    after = metrics.snapshot()
+
+    stage_durations = _histogram_delta(before, after, "worker_stage_duration_seconds", "stage")
+    stage_rtf = _histogram_delta(before, after, "worker_stage_realtime_factor", "stage")
+    analysis_wait = _histogram_delta(before, after, "worker_analysis_wait_seconds", "phase")
+    webhooks = _histogram_delta(before, after, "worker_webhook_delivery_seconds", "")
+    succeeded = [o for o in outcomes if not o["failed"]]
+
+    return {
+        "audio_s": duration_s,
+        "concurrency": concurrency,
+        "tasks": task_count,
+        "failed": task_count - len(succeeded),
+        "wall_s": round(wall_s, 3),
+        "throughput": {
+            "tasks_per_min": round(len(succeeded) * 60 / wall_s, 3),
+            "audio_s_per_s": round(len(succeeded) * duration_s / wall_s, 3),
+        },
+        "latency_s": {
+            "transcribed_p50": _percentile([o["transcribed_s"] for o in succeeded], 0.5),
+            "transcribed_p95": _percentile([o["transcribed_s"] for o in succeeded], 0.95),
+            "completed_p50": _percentile([o["completed_s"] for o in succeeded if "completed_s" in o], 0.5),
+            "completed_p95": _percentile([o["completed_s"] for o in succeeded if "completed_s" in o], 0.95),
+        },
+        "stages": {
+            stage: {"count": int(stats["count"]), "mean_s": _mean(stats), "mean_rtf": _mean(stage_rtf[stage]) if stage in stage_rtf else None}
+            for stage, stats in sorted(stage_durations.items())
+        },
+        "analysis_wait_s": {phase: _mean(stats) for phase, stats in sorted(analysis_wait.items())},
+        "webhook_delivery_mean_s": _mean(next(iter(webhooks.values()))) if webhooks else None,
+        "peak_rss_mb": round(sampler.peak_rss_mb, 1),
+        "peak_gpu_mb": round(sampler.peak_gpu_mb, 1) or None,
+    }
+
+
+def _environment(args: argparse.Namespace) -> Dict[str, Any]:
+    from importlib import metadata
+
+    def version(package: str) -> Optional[str]:
+        try:
+            return metadata.version(package)
+        except metadata.PackageNotFoundError:
+            return None
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "format_version": FORMAT_VERSION,
+        "label": args.label,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "packages": {name: version(name) for name in ("whisperx", "faster-whisper", "torch", "pyannote.audio", "openai")},
+        "models": args.models,
+        "whisper_model": args.whisper_model,
+        "stub_rtf": args.stub_rtf,
+        "assistant_latency_s": args.assistant_latency,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    durations = _csv(args.durations)
+    levels = _csv(args.concurrency, int)
+
+    with tempfile.TemporaryDirectory(prefix="worker-bench-") as workdir:
+        standins = StandInServer(args.assistant_latency).start()
+        configure_environment(workdir, standins.url)
+
+        import analysis_tasks
+        import tasks
+        from metrics import METRICS
+        from notifier import NOTIFIER
+
+        if args.models == "stub":
+            from benchmarks import stubs
+            stubs.install(tasks, stubs.parse_rtf(args.stub_rtf))
+
+        results = {"meta": _environment(args), "levels": []}
+        try:
+            for duration_s in durations:
+                audio_path = write_wav(os.path.join(workdir, f"call-{duration_s:g}s.wav"), synthetic_call(duration_s))
+                for concurrency in levels:
+                    task_count = args.tasks_per_level or 2 * concurrency
+                    print(f"-> {duration_s:g}s de áudio, concorrência {concurrency}, {task_count} tarefas...", flush=True)
+                    level = run_level(tasks, analysis_tasks, METRICS, standins, audio_path, duration_s, concurrency, task_count, args)
+                    results["levels"].append(level)
+                    print(
+                        f"   {level['throughput']['audio_s_per_s']:.2f} s de áudio/s, "
+                        f"p50 transcrição {level['latency_s']['transcribed_p50']}s, "
+                        f"pico RSS {level['peak_rss_mb']:.0f} MB, falhas {level['failed']}",
+                        flush=True,
+                    )
+        finally:
+            NOTIFIER.flush()
+            standins.stop()
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"Resultados gravados em {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import gzip
+import json
+import threading
+import time
+import uuid
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+# Análise devolvida pelo Assistant simulado
+STUB_ANALYSIS = {"resumo": "Ligação sintética de benchmark.", "pontos_fortes": [], "pontos_a_melhorar": []}
+
+
+class StandInServer:
+    """
+    Servidor HTTP local que faz o papel do backend Node (webhooks PATCH /api/v1/tasks/<id>/complete)
+    e da API de Assistants da OpenAI (POST /v1/threads/runs com streaming SSE), para que o
+    benchmark rode sem rede. Registra o instante de chegada de cada status por tarefa.
+    """
+
+    def __init__(self, assistant_latency_s: float = 1.0):
+        self.assistant_latency_s = assistant_latency_s
+        self.events: Dict[str, List[Tuple[float, Dict[str, Any]]]] = defaultdict(list)
+        self._cond = threading.Condition()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StandInServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="benchmark-standins", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def record(self, task_id: str, payload: Dict[str, Any]) -> None:
+        with self._cond:
+            self.events[task_id].append((time.perf_counter(), payload))
+            self._cond.notify_all()
+
+    def wait_for(self, task_id: str, statuses: Tuple[str, ...], timeout: float) -> Tuple[float, Dict[str, Any]]:
+        """Espera a chegada de um dos status para a tarefa; retorna (instante, payload)."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                for arrived_at, payload in self.events.get(task_id, []):
+                    if payload.get("status") in statuses:
+                        return arrived_at, payload
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"Tarefa {task_id} não chegou a {statuses} em {timeout:.0f}s")
+                self._cond.wait(remaining)
+
+    def _handler(self):
+        standins = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def _body(self) -> bytes:
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if self.headers.get("Content-Encoding") == "gzip":
+                    body = gzip.decompress(body)
+                return body
+
+            def _json(self, status: int, data: Dict[str, Any]) -> None:
+                body = json.dumps(data).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_PATCH(self) -> None:
+                parts = self.path.strip("/").split("/")
+                if len(parts) == 5 and parts[:3] == ["api", "v1", "tasks"] and parts[4] == "complete":
+                    standins.record(parts[3], json.loads(self._body()))
+                    self._json(200, {"ok": True})
+                else:
+                    self._json(404, {"error": "rota desconhecida"})
+
+            def do_POST(self) -> None:
+                self._body()
+                if self.path.rstrip("/").endswith("/threads/runs"):
+                    self._stream_run()
+                elif "/runs/" in self.path and self.path.endswith("/cancel"):
+                    self._json(200, {"id": self.path.split("/")[-2], "object": "thread.run", "status": "cancelling"})
+                else:
+                    self._json(404, {"error": {"message": "rota desconhecida"}})
+
+            def _stream_run(self) -> None:
+                now = int(time.time())
+                thread_id, run_id = f"thread_{uuid.uuid4().hex[:12]}", f"run_{uuid.uuid4().hex[:12]}"
+                run = {"id": run_id, "object": "thread.run", "thread_id": thread_id, "assistant_id": "asst_bench", "created_at": now}
+                message = {
+                    "id": f"msg_{uuid.uuid4().hex[:12]}", "object": "thread.message", "thread_id": thread_id, "run_id": run_id,
+                    "role": "assistant", "created_at": now, "status": "completed",
+                    "content": [{"type": "text", "text": {"value": json.dumps(STUB_ANALYSIS, ensure_ascii=False), "annotations": []}}],
+                }
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self._event("thread.created", {"id": thread_id, "object": "thread", "created_at": now, "metadata": {}})
+                self._event("thread.run.created", {**run, "status": "queued"})
+                time.sleep(standins.assistant_latency_s)
+                self._event("thread.message.completed", message)
+                self._event("thread.run.completed", {**run, "status": "completed"})
+                self.wfile.write(b"event: done\ndata: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+            def _event(self, name: str, data: Dict[str, Any]) -> None:
+                self.wfile.write(f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+        return Handler
@@ -0,0 +1,95 @@
+import time
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+SAMPLE_RATE = 16000
+_WORDS = "olá bom dia tudo bem com você eu queria entender melhor o plano e o valor da proposta".split()
+
+
+def _busy(seconds: float) -> None:
+    # Espera ativa: o custo do stub ocupa a CPU como um modelo de verdade ocuparia
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class StubWhisperModel:
+    """Substitui o FasterWhisperPipeline: segmentos de ~5 s com texto fixo, custo proporcional ao áudio."""
+
+    def __init__(self, rtf: float):
+        self.rtf = rtf
+
+    def transcribe(self, audio: Any, batch_size: int = 8, language: Optional[str] = None, **_: Any) -> Dict[str, Any]:
+        duration = len(audio) / SAMPLE_RATE
+        _busy(duration * self.rtf)
+        segments = []
+        start = 0.0
+        while start < duration:
+            end = min(duration, start + 5.0)
+            segments.append({"start": start, "end": end, "text": " ".join(_WORDS[: 4 + int(start) % 8])})
+            start = end
+        return {"segments": segments, "language": language or "pt"}
+
+
+def stub_align(segments: List[Dict[str, Any]], duration: float, rtf: float) -> Dict[str, Any]:
+    """Substitui o whisperx.align: distribui as palavras de cada segmento pelo seu intervalo."""
+    _busy(duration * rtf)
+    aligned, word_segments = [], []
+    for segment in segments:
+        words = segment["text"].split()
+        step = (segment["end"] - segment["start"]) / max(1, len(words))
+        timed = [
+            {"word": w, "start": round(segment["start"] + i * step, 3), "end": round(segment["start"] + (i + 1) * step, 3), "score": 0.9}
+            for i, w in enumerate(words)
+        ]
+        aligned.append({**segment, "words": timed})
+        word_segments.extend(timed)
+    return {"segments": aligned, "word_segments": word_segments}
+
+
+class StubDiarizationModel:
+    """Substitui o DiarizationPipeline: turnos alternados de dois locutores a cada ~4 s."""
+
+    def __init__(self, rtf: float):
+        self.rtf = rtf
+
+    def __call__(self, audio: Any, return_embeddings: bool = False, **_: Any) -> Any:
+        duration = len(audio) / SAMPLE_RATE
+        _busy(duration * self.rtf)
+        rows, start, speaker = [], 0.0, 0
+        while start < duration:
+            end = min(duration, start + 4.0)
+            rows.append({"segment": None, "label": f"L{speaker}", "speaker": f"SPEAKER_0{speaker}", "start": start, "end": end})
+            start, speaker = end, 1 - speaker
+        return (pd.DataFrame(rows), None) if return_embeddings else pd.DataFrame(rows)
+
+
+def install(tasks_module: Any, rtf: Dict[str, float]) -> None:
+    """Troca os carregadores de modelos do `tasks` pelos stubs (o restante do pipeline é o real)."""
+    whisper = StubWhisperModel(rtf["transcribe"])
+    diarizer = StubDiarizationModel(rtf["diarize"])
+
+    def load_whisper_model(model_name: str, device: str, compute_type: str) -> StubWhisperModel:
+        return whisper
+
+    def get_diarize_model(hf_token: str, device: str) -> StubDiarizationModel:
+        return diarizer
+
+    def align_segments(segments: List[Dict[str, Any]], language_code: str, audio: Any, device: str) -> Dict[str, Any]:
+        return stub_align(segments, len(audio) / SAMPLE_RATE, rtf["align"])
+
+    tasks_module.load_whisper_model = load_whisper_model
+    tasks_module.get_diarize_model = get_diarize_model
+    tasks_module.align_segments = align_segments
+
+
+def parse_rtf(text: str) -> Dict[str, float]:
+    """'transcribe=0.05,align=0.01,diarize=0.03' -> dict, com os padrões para o que faltar."""
+    values = {"transcribe": 0.05, "align": 0.01, "diarize": 0.03}
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        name, _, value = part.partition("=")
+        if name not in values:
+            raise ValueError(f"Etapa desconhecida em --stub-rtf: {name}")
+        values[name] = float(value)
+    return values
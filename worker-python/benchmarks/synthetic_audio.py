@@ -0,0 +1,39 @@
+import wave
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+def synthetic_call(duration_s: float, seed: int = 0) -> np.ndarray:
+    """
+    Áudio sintético parecido com uma ligação: trechos de "fala" (tons com harmônicos e
+    envelope silábico) alternando entre duas vozes, separados por pausas com ruído de fundo.
+    """
+    rng = np.random.default_rng(seed)
+    total = int(duration_s * SAMPLE_RATE)
+    audio = rng.normal(0.0, 0.003, total).astype(np.float32)
+    position, speaker = 0, 0
+    while position < total:
+        turn = int(rng.uniform(1.5, 8.0) * SAMPLE_RATE)
+        end = min(total, position + turn)
+        t = np.arange(end - position) / SAMPLE_RATE
+        base = 120.0 if speaker == 0 else 210.0
+        pitch = base * (1 + 0.05 * np.sin(2 * np.pi * 0.7 * t))
+        phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+        voice = sum(np.sin(k * phase) / k for k in range(1, 5))
+        syllables = 0.5 * (1 + np.sin(2 * np.pi * 4.0 * t)) ** 2
+        audio[position:end] += (0.15 * voice * syllables).astype(np.float32)
+        position = end + int(rng.uniform(0.3, 1.5) * SAMPLE_RATE)
+        speaker = 1 - speaker
+    return np.clip(audio, -1.0, 1.0)
+
+
+def write_wav(path: str, audio: np.ndarray) -> str:
+    pcm = (audio * 32767).astype("<i2")
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(pcm.tobytes())
+    return path
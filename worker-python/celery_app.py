@@ -1,14 +1,20 @@
 import os
-import torch
 from celery import Celery
 
 REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6380/0')
 
+# Filas separadas: transcrição (GPU, concorrência 1) e análise (I/O, alta concorrência)
+AUDIO_QUEUE = os.getenv('CELERY_AUDIO_QUEUE', 'audio')
+ANALYSIS_QUEUE = os.getenv('CELERY_ANALYSIS_QUEUE', 'analysis')
+
+# Cada pool importa só os módulos de que precisa (o pool de análise não carrega torch/whisperx)
+TASK_MODULES = [m.strip() for m in os.getenv('CELERY_TASK_MODULES', 'tasks,analysis_tasks').split(',') if m.strip()]
+
 celery_app = Celery(
     'audio_worker',
     broker=REDIS_URL,
     backend=REDIS_URL,
-    include=['tasks'],
+    include=TASK_MODULES,
 )
 
 # Config robusta + serialização
@@ -20,7 +26,17 @@ celery_app.conf.update(
     timezone='UTC',
     enable_utc=True,
 
+    # Roteamento por nome da tarefa, para que a API possa enfileirar sem importar os módulos
+    task_default_queue=AUDIO_QUEUE,
+    task_routes={
+        'process_audio_task': {'queue': AUDIO_QUEUE},
+        'process_audio_batch_task': {'queue': AUDIO_QUEUE},
+        'process_next_audio_task': {'queue': AUDIO_QUEUE},
+        'analyze_task': {'queue': ANALYSIS_QUEUE},
+    },
+
     # MUITO IMPORTANTE p/ evitar duas transcrições simultâneas no mesmo GPU
+    # (o pool de análise sobrescreve a concorrência pela linha de comando, ver entrypoint.sh)
     worker_concurrency=int(os.getenv('CELERY_CONCURRENCY', '1')),
     worker_prefetch_multiplier=int(os.getenv('CELERY_PREFETCH', '1')),
     task_acks_late=True,
@@ -28,4 +44,4 @@ celery_app.conf.update(
 
     # Opcional: reciclar worker para evitar fragmentação (especialmente em CUDA)
     worker_max_tasks_per_child=int(os.getenv('CELERY_MAX_TASKS_PER_CHILD', '20')),
-)
\ No newline at end of file
+)
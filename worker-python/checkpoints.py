@@ -0,0 +1,116 @@
+import gzip
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+from typing import Any, List, Optional
+
+logger = logging.getLogger("ai_worker")
+
+# No volume de uploads compartilhado, para que a API saiba o que uma nova tentativa vai reaproveitar
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", "/app/uploads/checkpoints")
+CHECKPOINTS_ENABLED = os.getenv("CHECKPOINTS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Checkpoints de tarefas que nunca foram retomadas são apagados depois disso
+CHECKPOINT_TTL_HOURS = float(os.getenv("CHECKPOINT_TTL_HOURS", "72"))
+
+# Etapas do pipeline, na ordem
+STAGES = ("transcribe", "align", "diarize")
+
+_TASK_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+
+def _task_dir(task_id: str) -> str:
+    # O id vem da requisição; só aceita caracteres seguros para não sair do diretório
+    if not _TASK_ID_PATTERN.match(task_id or ""):
+        raise ValueError(f"Id de tarefa inválido para checkpoint: {task_id!r}")
+    return os.path.join(CHECKPOINT_DIR, task_id)
+
+
+def _json_default(value: Any) -> Any:
+    # Escalares do numpy (ex.: scores do alinhamento em float32)
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"Tipo não serializável em checkpoint: {type(value).__name__}")
+
+
+def saved_stages(task_id: str) -> List[str]:
+    """Etapas com checkpoint gravado para a tarefa, na ordem do pipeline."""
+    try:
+        names = os.listdir(_task_dir(task_id))
+    except (OSError, ValueError):
+        return []
+    return [stage for stage in STAGES if f"{stage}.json.gz" in names]
+
+
+def prune_stale(max_age_hours: float = CHECKPOINT_TTL_HOURS) -> None:
+    if not CHECKPOINTS_ENABLED or max_age_hours <= 0 or not os.path.isdir(CHECKPOINT_DIR):
+        return
+    cutoff = time.time() - max_age_hours * 3600
+    for name in os.listdir(CHECKPOINT_DIR):
+        path = os.path.join(CHECKPOINT_DIR, name)
+        try:
+            if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
+
+
+class TaskCheckpoints:
+    """
+    Saída de cada etapa de uma tarefa (gzip JSON em CHECKPOINT_DIR/<task_id>/<etapa>.json.gz).
+    Uma tarefa reentregue após a queda/reciclagem do worker, ou reenviada por `/retry-task`,
+    retoma da última etapa concluída. `fingerprint` identifica a configuração (modelo,
+    compute_type, idioma): checkpoints gravados com outra configuração são ignorados.
+    Falhas de leitura ou gravação nunca interrompem o pipeline.
+    """
+
+    def __init__(self, task_id: str, fingerprint: str):
+        self.task_id = task_id
+        self.fingerprint = fingerprint
+        self.enabled = CHECKPOINTS_ENABLED
+
+    def _path(self, stage: str) -> str:
+        return os.path.join(_task_dir(self.task_id), f"{stage}.json.gz")
+
+    def load(self, stage: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        try:
+            with gzip.open(self._path(stage), "rt", encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Checkpoint '{stage}' da tarefa {self.task_id} ilegível, ignorando: {e}")
+            return None
+        if entry.get("fingerprint") != self.fingerprint:
+            logger.info(f"Checkpoint '{stage}' da tarefa {self.task_id} é de outra configuração, ignorando.")
+            return None
+        return entry["data"]
+
+    def save(self, stage: str, data: Any) -> None:
+        if not self.enabled:
+            return
+        try:
+            directory = _task_dir(self.task_id)
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=3) as f:
+                    f.write(json.dumps({"fingerprint": self.fingerprint, "data": data}, default=_json_default).encode("utf-8"))
+                os.replace(tmp_path, self._path(stage))
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Não foi possível gravar o checkpoint '{stage}' da tarefa {self.task_id}: {e}")
+
+    def clear(self) -> None:
+        try:
+            shutil.rmtree(_task_dir(self.task_id), ignore_errors=True)
+        except ValueError:
+            pass
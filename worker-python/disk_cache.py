@@ -0,0 +1,135 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Any, List, Optional, Tuple
+
+logger = logging.getLogger("ai_worker")
+
+CACHE_ROOT = os.getenv("WORKER_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache"))
+
+
+def _json_default(value: Any) -> Any:
+    # Tipos numpy (float32, int64, str_) aparecem nos resultados do WhisperX/pandas
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_key(*parts: Any) -> str:
+    return hashlib.sha256("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """
+    Cache persistente em disco (JSON comprimido com gzip), endereçado por chave, com limite
+    de tamanho e descarte LRU. O mtime de cada arquivo marca o último acesso, então o
+    estado é compartilhado entre processos do Celery sem nenhum índice adicional.
+    Com `ttl_s`, cada entrada guarda o instante em que foi gravada e expira depois desse prazo,
+    mesmo que continue sendo lida.
+    """
+
+    def __init__(self, name: str, max_bytes: int, directory: Optional[str] = None, ttl_s: float = 0):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.directory = directory or os.path.join(CACHE_ROOT, name)
+        self.ttl_s = ttl_s
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json.gz")
+
+    def get(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                value = json.load(f)
+            if self.ttl_s > 0:
+                if time.time() - value["created_at"] > self.ttl_s:
+                    self.delete(key)
+                    return None
+                value = value["value"]
+            os.utime(path, None)
+            return value
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Entrada corrompida no cache '{self.name}' ({key}): {e}. Descartando.")
+            self.delete(key)
+            return None
+
+    def set(self, key: str, value: Any) -> None:
+        if not self.enabled:
+            return
+        path = self._path(key)
+        if self.ttl_s > 0:
+            value = {"created_at": time.time(), "value": value}
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as f:
+                    f.write(json.dumps(value, ensure_ascii=False, default=_json_default).encode("utf-8"))
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        except OSError as e:
+            logger.warning(f"Não foi possível gravar no cache '{self.name}': {e}")
+            return
+        self._evict()
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                if not filename.endswith(".json.gz"):
+                    continue
+                path = os.path.join(root, filename)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _evict(self) -> None:
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        evicted = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                evicted += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        logger.info(f"Cache '{self.name}': {evicted} entrada(s) descartada(s) por limite de tamanho.")
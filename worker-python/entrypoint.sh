@@ -6,13 +6,57 @@ cd /app || cd /usr/src/app || true
 
 echo "Diretório atual: $(pwd)"
 
-echo "Executando script de pré-inicialização do CUDA..."
-python3 /app/preload.py
-echo "Pré-inicialização concluída."
+# WORKER_ROLE permite subir cada parte num contêiner próprio:
+#   all (padrão) = API + pool de análise + worker de transcrição no mesmo contêiner
+#   api | analysis | audio = só a parte indicada
+WORKER_ROLE="${WORKER_ROLE:-all}"
 
-echo "Iniciando o servidor FastAPI (uvicorn) em background..."
+# Cada função termina com exec: em background substitui o subshell, em foreground o próprio script
 
-uvicorn --app-dir /app main:app --host 0.0.0.0 --port 8000 &
+start_api() {
+    # A API só enfileira pelo nome da tarefa: não importa torch/whisperx e sobe em segundos
+    exec uvicorn --app-dir /app main:app --host 0.0.0.0 --port 8000
+}
 
-echo "Iniciando o worker do Celery em foreground..."
-exec celery -A celery_app worker --loglevel=info
+start_analysis() {
+    # Pool de threads: cada tarefa só espera o resultado, enquanto um único event loop asyncio
+    # por processo conduz todas as execuções do Assistant (ver assistant_runner.py)
+    CELERY_TASK_MODULES=analysis_tasks exec celery -A celery_app worker --loglevel=info \
+        -Q "${CELERY_ANALYSIS_QUEUE:-analysis}" -n "analysis@%h" \
+        -P threads --concurrency="${ANALYSIS_CONCURRENCY:-50}"
+}
+
+start_audio() {
+    echo "Executando script de pré-inicialização do CUDA..."
+    python3 /app/preload.py
+    echo "Pré-inicialização concluída."
+    exec celery -A celery_app worker --loglevel=info \
+        -Q "${CELERY_AUDIO_QUEUE:-audio}" -n "audio@%h"
+}
+
+case "$WORKER_ROLE" in
+    api)
+        echo "Iniciando apenas o servidor FastAPI (uvicorn)..."
+        start_api
+        ;;
+    analysis)
+        echo "Iniciando apenas o pool de análise (threads, fila ${CELERY_ANALYSIS_QUEUE:-analysis})..."
+        start_analysis
+        ;;
+    audio)
+        echo "Iniciando apenas o worker de transcrição (fila ${CELERY_AUDIO_QUEUE:-audio})..."
+        start_audio
+        ;;
+    all)
+        echo "Iniciando o servidor FastAPI (uvicorn) em background..."
+        start_api &
+        echo "Iniciando o pool de análise (threads, fila ${CELERY_ANALYSIS_QUEUE:-analysis}) em background..."
+        start_analysis &
+        echo "Iniciando o worker de transcrição do Celery (fila ${CELERY_AUDIO_QUEUE:-audio}) em foreground..."
+        start_audio
+        ;;
+    *)
+        echo "WORKER_ROLE inválido: $WORKER_ROLE (use all, api, analysis ou audio)" >&2
+        exit 1
+        ;;
+esac
@@ -0,0 +1,106 @@
+import json
+import zlib
+from typing import Callable, Optional
+
+try:
+    import zstandard
+except ImportError:  # zstd é opcional; sem o pacote, só gzip/deflate são aceitos
+    zstandard = None
+
+# Limite do corpo já descomprimido, para que um payload pequeno não exploda a memória da API
+MAX_DECOMPRESSED_BYTES = 256 * 1024 * 1024
+
+
+def _zlib_decode(body: bytes, wbits: int) -> bytes:
+    decompressor = zlib.decompressobj(wbits)
+    data = decompressor.decompress(body, MAX_DECOMPRESSED_BYTES)
+    if decompressor.unconsumed_tail:
+        raise ValueError(f"corpo descomprimido maior que {MAX_DECOMPRESSED_BYTES} bytes")
+    return data
+
+
+def _zstd_decode(body: bytes) -> bytes:
+    with zstandard.ZstdDecompressor().stream_reader(body) as reader:
+        data = reader.read(MAX_DECOMPRESSED_BYTES + 1)
+    if len(data) > MAX_DECOMPRESSED_BYTES:
+        raise ValueError(f"corpo descomprimido maior que {MAX_DECOMPRESSED_BYTES} bytes")
+    return data
+
+
+def _decoder(encoding: str) -> Optional[Callable[[bytes], bytes]]:
+    if encoding in ("gzip", "x-gzip"):
+        return lambda body: _zlib_decode(body, 16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        return lambda body: _zlib_decode(body, zlib.MAX_WBITS)
+    if encoding == "zstd" and zstandard is not None:
+        return _zstd_decode
+    return None
+
+
+def supported_encodings() -> str:
+    return "gzip, deflate" + (", zstd" if zstandard is not None else "")
+
+
+class RequestDecompressionMiddleware:
+    """
+    Middleware ASGI que descomprime corpos de requisição com `Content-Encoding` gzip, deflate
+    ou zstd antes de chegarem aos endpoints, que continuam lendo JSON normalmente.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        encoding = headers.get(b"content-encoding", b"").decode("latin-1").strip().lower()
+        if encoding in ("", "identity"):
+            await self.app(scope, receive, send)
+            return
+
+        decode = _decoder(encoding)
+        if decode is None:
+            await _reply(send, 415, f"Content-Encoding não suportado: {encoding}. Use {supported_encodings()}.")
+            return
+
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        try:
+            body = decode(b"".join(chunks))
+        except Exception as e:
+            await _reply(send, 400, f"Corpo comprimido inválido ({encoding}): {e}")
+            return
+
+        scope = dict(scope)
+        scope["headers"] = [
+            (name, value) for name, value in scope["headers"] if name not in (b"content-encoding", b"content-length")
+        ] + [(b"content-length", str(len(body)).encode("latin-1"))]
+
+        sent = False
+
+        async def receive_decompressed():
+            nonlocal sent
+            if sent:
+                return await receive()
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        await self.app(scope, receive_decompressed, send)
+
+
+async def _reply(send, status: int, detail: str) -> None:
+    body = json.dumps({"detail": detail}, ensure_ascii=False).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode("latin-1"))],
+    })
+    await send({"type": "http.response.body", "body": body})
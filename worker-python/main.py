@@ -1,19 +1,35 @@
+import asyncio
 import os
 import uvicorn
 from fastapi import FastAPI, HTTPException, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel, ValidationError
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import openai
 from dotenv import load_dotenv
 
+load_dotenv()
+
 from celery_app import celery_app
 from celery.exceptions import CeleryError
 
-load_dotenv()
-
-from tasks import process_audio_task, analyze_task 
+from audio_scheduler import AUDIO_SCHEDULER, AUDIO_SCHEDULING, probe_duration
+from checkpoints import saved_stages
+from summary import NoSalesCallsError, generate_consolidated_summary
+from http_compression import RequestDecompressionMiddleware
+from metrics import METRICS
+from transcript_store import has_transcript, load_transcript
 
 openai.api_key = os.getenv("OPENAI_API_KEY")
+# As tarefas são enfileiradas pelo nome (ver task_routes em celery_app.py): a API não importa
+# tasks.py/analysis_tasks.py, e portanto nem torch nem whisperx
+PROCESS_AUDIO_TASK = "process_audio_task"
+PROCESS_AUDIO_BATCH_TASK = "process_audio_batch_task"
+PROCESS_NEXT_AUDIO_TASK = "process_next_audio_task"
+ANALYZE_TASK = "analyze_task"
+
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "16"))
 
 
 # --- Modelos de Dados Pydantic ---
@@ -21,17 +37,35 @@ class ProcessTaskRequest(BaseModel):
     task_id: str
     file_path: str
     config: Dict[str, Any]
+    saleswoman_id: Optional[str] = None
 
+class ProcessBatchItem(BaseModel):
+    task_id: str
+    file_path: str
+    saleswoman_id: Optional[str] = None
+
+class ProcessBatchRequest(BaseModel):
+    tasks: List[ProcessBatchItem]
+    config: Dict[str, Any]
+
+# As transcrições podem vir no corpo ou por referência (hash no volume de uploads compartilhado)
 class GenerateSummaryRequest(BaseModel):
     name: str
-    transcriptions: List[str]
+    transcriptions: List[str] = []
+    transcription_refs: List[str] = []
     openai_api_key: str
 
 class AnalyzeTaskRequest(BaseModel):
     task_id: str
-    transcription: str
+    transcription: Optional[str] = None
+    transcription_ref: Optional[str] = None
     config: Dict[str, Any]
+    # Ignora o cache de análises e roda o Assistant de novo
+    force_refresh: bool = False
 app = FastAPI(title="API de Análise de Áudio", version="2.0.0")
+# Aceita corpos com Content-Encoding gzip/deflate/zstd e comprime as respostas grandes
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+app.add_middleware(RequestDecompressionMiddleware)
 
 
 # --- Endpoints de Status e Saúde ---
@@ -53,6 +87,15 @@ def health_redis_check():
         )
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Métricas no formato do Prometheus, agregadas entre a API e os processos do Celery."""
+    try:
+        return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Não foi possível ler as métricas. Erro: {str(e)}")
+
+
 # --- Endpoints Principais ---
 @app.post("/process-task", status_code=202)
 async def process_task_endpoint(raw_request: Request):
@@ -77,9 +120,12 @@ async def process_task_endpoint(raw_request: Request):
         print(f"[API FastAPI] ARQUIVO NÃO ENCONTRADO! Retornando 404.")
         raise HTTPException(status_code=404, detail=f"Arquivo de áudio não encontrado em: {file_path_to_check}")
 
+    if AUDIO_SCHEDULING == "priority":
+        return await enqueue_by_priority(request)
+
     try:
         print(f"[API FastAPI] Tarefa validada: {request.task_id}. Enviando para a fila do Celery.")
-        process_audio_task.delay(request.task_id, request.file_path, request.config)
+        celery_app.send_task(PROCESS_AUDIO_TASK, args=[request.task_id, request.file_path, request.config, request.saleswoman_id])
         
         return {"message": "Tarefa de processamento de áudio aceita e enfileirada para execução."}
     except Exception as e:
@@ -87,12 +133,109 @@ async def process_task_endpoint(raw_request: Request):
         print(f"[API FastAPI] ERRO CRÍTICO: {error_detail}")
         raise HTTPException(status_code=500, detail=error_detail)
 
+async def enqueue_by_priority(request: ProcessTaskRequest) -> Dict[str, Any]:
+    """
+    Registra a tarefa na fila de prioridade (duração + justiça entre vendedoras) e envia ao
+    Celery um token `process_next_audio_task`; o worker decide qual tarefa processar.
+    """
+    duration_s = await asyncio.to_thread(probe_duration, request.file_path)
+    try:
+        score, created = await asyncio.to_thread(
+            AUDIO_SCHEDULER.enqueue, request.task_id, request.file_path, request.config, request.saleswoman_id, duration_s
+        )
+    except Exception as e:
+        error_detail = f"Falha ao registrar a tarefa na fila de prioridade. A API não conseguiu se conectar ao Redis. Erro: {str(e)}"
+        print(f"[API FastAPI] ERRO CRÍTICO: {error_detail}")
+        raise HTTPException(status_code=500, detail=error_detail)
+
+    if not created:
+        # Já estava na fila, com um token enviado; a entrada original não é tocada
+        print(f"[API FastAPI] Tarefa {request.task_id} já estava na fila de prioridade (pontuação: {score:.0f}).")
+        return {
+            "message": "Tarefa de processamento de áudio já estava enfileirada para execução.",
+            "duration_s": duration_s,
+        }
+
+    try:
+        celery_app.send_task(PROCESS_NEXT_AUDIO_TASK)
+    except Exception as e:
+        await asyncio.to_thread(AUDIO_SCHEDULER.discard, request.task_id, request.saleswoman_id)
+        error_detail = f"Falha ao enfileirar a tarefa no Celery. A API não conseguiu se conectar ao Redis. Erro: {str(e)}"
+        print(f"[API FastAPI] ERRO CRÍTICO: {error_detail}")
+        raise HTTPException(status_code=500, detail=error_detail)
+
+    print(f"[API FastAPI] Tarefa {request.task_id} na fila de prioridade (duração: {duration_s}s, pontuação: {score:.0f}).")
+    return {
+        "message": "Tarefa de processamento de áudio aceita e enfileirada para execução.",
+        "duration_s": duration_s,
+    }
+
+@app.post("/retry-task", status_code=202)
+async def retry_task_endpoint(request: ProcessTaskRequest):
+    """
+    Reenvia uma transcrição que falhou. O worker retoma da última etapa com checkpoint
+    (transcrição, alinhamento, diarização) em vez de recomeçar do zero.
+    """
+    if not os.path.exists(request.file_path):
+        raise HTTPException(status_code=404, detail=f"Arquivo de áudio não encontrado em: {request.file_path}")
+
+    stages = saved_stages(request.task_id)
+    print(f"[API FastAPI] Nova tentativa da tarefa {request.task_id}. Checkpoints disponíveis: {stages or 'nenhum'}.")
+    if AUDIO_SCHEDULING == "priority":
+        response = await enqueue_by_priority(request)
+    else:
+        try:
+            celery_app.send_task(PROCESS_AUDIO_TASK, args=[request.task_id, request.file_path, request.config, request.saleswoman_id])
+        except Exception as e:
+            error_detail = f"Falha ao enfileirar a tarefa no Celery. A API não conseguiu se conectar ao Redis. Erro: {str(e)}"
+            print(f"[API FastAPI] ERRO CRÍTICO: {error_detail}")
+            raise HTTPException(status_code=500, detail=error_detail)
+        response = {"message": "Tarefa de processamento de áudio aceita e enfileirada para execução."}
+    response["resumable_stages"] = stages
+    return response
+
+@app.post("/process-batch", status_code=202)
+async def process_batch_endpoint(request: ProcessBatchRequest):
+    """
+    Recebe várias tarefas de transcrição e as envia ao Celery como um único lote,
+    para que os chunks de áudio compartilhem os mesmos batches de inferência.
+
+    O backend não chama esta rota: o upload cria uma tarefa por arquivo e usa `/process-task`.
+    Ela atende importações em massa feitas por scripts, com tarefas já criadas no backend
+    (os webhooks de cada `task_id` continuam sendo os mesmos). O lote não passa pela fila de
+    prioridade.
+    """
+    if not request.tasks:
+        raise HTTPException(status_code=422, detail="O lote deve conter ao menos uma tarefa.")
+    if len(request.tasks) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=422, detail=f"O lote excede o limite de {MAX_BATCH_FILES} arquivos.")
+
+    missing = [item.file_path for item in request.tasks if not os.path.exists(item.file_path)]
+    if missing:
+        print(f"[API FastAPI] ARQUIVOS NÃO ENCONTRADOS no lote: {missing}. Retornando 404.")
+        raise HTTPException(status_code=404, detail=f"Arquivos de áudio não encontrados: {missing}")
+
+    try:
+        task_ids = [item.task_id for item in request.tasks]
+        print(f"[API FastAPI] Lote validado com {len(task_ids)} tarefas: {task_ids}. Enviando para a fila do Celery.")
+        celery_app.send_task(PROCESS_AUDIO_BATCH_TASK, args=[[item.model_dump() for item in request.tasks], request.config])
+        return {"message": f"Lote com {len(task_ids)} tarefas aceito e enfileirado para execução."}
+    except Exception as e:
+        error_detail = f"Falha ao enfileirar o lote no Celery. A API não conseguiu se conectar ao Redis. Erro: {str(e)}"
+        print(f"[API FastAPI] ERRO CRÍTICO: {error_detail}")
+        raise HTTPException(status_code=500, detail=error_detail)
+
 @app.post("/analyze-task", status_code=202)
 async def analyze_task_endpoint(request: AnalyzeTaskRequest):
+    if request.transcription is None and not request.transcription_ref:
+        raise HTTPException(status_code=422, detail="Informe 'transcription' ou 'transcription_ref'.")
+    if request.transcription is None and not has_transcript(request.transcription_ref):
+        raise HTTPException(status_code=404, detail=f"Transcrição não encontrada para a referência: {request.transcription_ref}")
 
     try:
         print(f"[API FastAPI] Tarefa de ANÁLISE recebida: {request.task_id}. Enviando para a fila do Celery.")
-        analyze_task.delay(request.task_id, request.transcription, request.config)
+        # Por referência, só o hash passa pelo Redis; o worker lê o texto do volume compartilhado
+        celery_app.send_task(ANALYZE_TASK, args=[request.task_id, request.transcription, request.config, request.transcription_ref, request.force_refresh])
         return {"message": "Tarefa de análise aceita e enfileirada para execução."}
     except Exception as e:
         error_detail = f"Falha ao enfileirar a tarefa de análise no Celery. Erro: {str(e)}"
@@ -100,57 +243,22 @@ async def analyze_task_endpoint(request: AnalyzeTaskRequest):
         raise HTTPException(status_code=500, detail=error_detail)
 
 @app.post("/generate-summary")
-def generate_summary(request: GenerateSummaryRequest):
-    client = openai.OpenAI(api_key=request.openai_api_key)
-    
-    print(f"-> Gerando resumo para {request.name} com base em {len(request.transcriptions)} transcricoes.")
-    
-    previous_transcriptions_text = "\n\n---\n[FIM DA TRANSCRICAO]\n---\n\n".join(
-        [f"Transcricao {i+1}:\n{transcription}" for i, transcription in enumerate(request.transcriptions)]
-    )
-
-    prompt = f"""
-    Você é um gerente de vendas sênior e está preparando uma análise de desempenho para a vendedora chamada "{request.name}".
-    Você tem em mãos as últimas {len(request.transcriptions)} transcrições de suas ligações.
-    O modelo de transcrição que gera o arquivo VTT não é perfeito. Frequentemente, ele confunde os interlocutores, atribuindo a fala de uma pessoa a outra (ex: SPEAKER 01 pode conter falas tanto do vendedor quanto do cliente). Portanto, sua análise não deve confiar cegamente nessas etiquetas de voz. Sua inteligência está em superar essa limitação.
-    Ignore as transcrições que são muito curtas ou que claramente não representam uma ligação de vendas real.
-    Sua tarefa é sintetizar essas análises em um único documento coeso e construtivo. O documento deve ser em formato de markdown, direcionado para a vendedora, bem detalhado e sempre dando exemplos concretos das ligações.
-
-    **Regras obrigatórias de formatação:**
-    - Sempre coloque títulos, subtítulos e tópicos importantes em **negrito** usando `**texto**`.
-    - Nas seções de "Oportunidades de Desenvolvimento", **os subtópicos devem obrigatoriamente vir em negrito** assim:
-         **O que melhorar:**
-         **Como isso se manifestou (Exemplo prático):**
-         **Como pode ser diferente (Sugestão de melhoria):**
-
-    Estruture o documento da seguinte forma:
-
-    1.  **Visão Geral do Desempenho:** Comece com um parágrafo de abertura, reconhecendo o esforço e o volume de trabalho recente de {request.name}.
-    2.  **Padrões de Destaque (Pontos Fortes):** Identifique e liste em tópicos os pontos fortes que aparecem consistentemente nas transcrições. Essa parte pode ser mais resumida.
-    3.  **Oportunidades de Desenvolvimento (Pontos a Melhorar):** Identifique os principais pontos de melhoria recorrentes. Para cada ponto, detalhe extensivamente de forma construtiva, usando obrigatoriamente a seguinte estrutura:
-         **O que melhorar:** Identifique a competência ou o comportamento a ser desenvolvido (Ex: Condução da fase de descoberta, contorno de objeções de preço, etc.).
-         **Como isso se manifestou (Exemplo prático):** Descreva uma ou mais situações específicas das ligações em que isso foi notado. Seja específico, citando o contexto e, se possível, trechos que ilustrem o ponto.
-         **Como pode ser diferente (Sugestão de melhoria):** Ofereça uma sugestão clara e prática sobre como agir de forma diferente em situações futuras para obter um resultado melhor. Dê exemplos de frases ou abordagens alternativas.
-    4.  **Plano de Ação Sugerido:** Com base nas oportunidades identificadas, sugira ações práticas, bem detalhadas e focadas que {request.name} pode implementar nas próximas semanas.
-    
-    Seja objetivo, claro e não economize palavras.
+async def generate_summary(request: GenerateSummaryRequest):
+    try:
+        referenced = await asyncio.gather(*(asyncio.to_thread(load_transcript, ref) for ref in request.transcription_refs))
+    except (FileNotFoundError, ValueError) as e:
+        raise HTTPException(status_code=404, detail=f"Transcrição referenciada não encontrada: {e}")
+    transcriptions = list(request.transcriptions) + list(referenced)
+    print(f"-> Gerando resumo para {request.name} com base em {len(transcriptions)} transcricoes.")
 
-    Aqui estão as transcrições para sua referência:
-    ---
-    {previous_transcriptions_text}
-    """
-    
     try:
-        response = client.chat.completions.create(
-            model="gpt-5-mini-2025-08-07",
-            messages=[
-                {"role": "system", "content": "Você é um gerente de vendas sênior elaborando um feedback de desempenho."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-        summary = response.choices[0].message.content
+        summary = await generate_consolidated_summary(request.openai_api_key, request.name, transcriptions)
         print("  -> Resumo consolidado gerado com sucesso.")
         return {"summary": summary}
+    except NoSalesCallsError as e:
+        # Erro do pedido (só ligações curtas ou que não são de vendas), não do worker
+        print(f"  -> Resumo não gerado: {e}")
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         print(f"  -> ERRO ao gerar resumo: {e}")
         raise HTTPException(status_code=500, detail=f"Falha ao gerar o resumo da IA: {str(e)}")
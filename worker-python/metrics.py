@@ -0,0 +1,270 @@
+import atexit
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("ai_worker")
+
+# "redis" agrega entre todos os processos (API, pools do Celery); "memory" vale só para o processo; "off" desativa
+METRICS_BACKEND = os.getenv("METRICS_BACKEND", "redis").strip().lower()
+METRICS_PREFIX = os.getenv("METRICS_PREFIX", "worker_metrics")
+# Intervalo entre os envios das métricas acumuladas no processo para o Redis
+METRICS_FLUSH_S = float(os.getenv("METRICS_FLUSH_S", "2"))
+# Depois de uma falha de envio, espera isso antes de tentar de novo
+METRICS_RETRY_S = float(os.getenv("METRICS_RETRY_S", "30"))
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+RTF_BUCKETS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 5)
+AUDIO_BUCKETS = (10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200)
+
+# nome -> (tipo, descrição, buckets)
+_DEFINITIONS: Dict[str, Tuple[str, str, Sequence[float]]] = {
+    "worker_stage_duration_seconds": ("histogram", "Duração de cada etapa do pipeline.", DURATION_BUCKETS),
+    "worker_stage_realtime_factor": ("histogram", "Tempo de processamento da etapa dividido pela duração do áudio.", RTF_BUCKETS),
+    "worker_audio_duration_seconds": ("histogram", "Duração dos áudios processados.", AUDIO_BUCKETS),
+    "worker_tasks_total": ("counter", "Tarefas finalizadas por tipo e resultado.", ()),
+    "worker_model_cache_total": ("counter", "Consultas ao registro de modelos (hit/miss).", ()),
+    "worker_model_evictions_total": ("counter", "Modelos descartados por orçamento de memória.", ()),
+    "worker_model_load_seconds": ("histogram", "Tempo de carregamento dos modelos.", DURATION_BUCKETS),
+    "worker_audio_queue_wait_seconds": ("histogram", "Tempo entre o envio da tarefa e o início da transcrição.", DURATION_BUCKETS),
+    "worker_analysis_wait_seconds": ("histogram", "Espera pelo OpenAI Assistant (fila do semáforo e execução do run).", DURATION_BUCKETS),
+    "worker_webhook_delivery_seconds": ("histogram", "Latência de cada tentativa de entrega de webhook.", DURATION_BUCKETS),
+    "worker_webhook_deliveries_total": ("counter", "Tentativas de entrega de webhook por resultado.", ()),
+    "worker_webhook_dead_letters_total": ("counter", "Webhooks terminais abandonados (arquivos .dead no outbox).", ()),
+    "worker_peak_rss_bytes": ("gauge", "Maior RSS observado num processo do worker.", ()),
+    "worker_peak_gpu_bytes": ("gauge", "Maior uso de memória da GPU observado.", ()),
+}
+
+
+def _labels(labels: Dict[str, Any]) -> str:
+    return ",".join(f'{k}="{str(v)}"' for k, v in sorted(labels.items()) if v is not None)
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _MemoryStore:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict[str, float]] = defaultdict(dict)
+
+    def apply(self, increments: List[Tuple[str, str, float]], maxima: List[Tuple[str, str, float]]) -> None:
+        with self._lock:
+            for key, field, amount in increments:
+                self._data[key][field] = self._data[key].get(field, 0.0) + amount
+            for key, field, value in maxima:
+                if value > self._data[key].get(field, float("-inf")):
+                    self._data[key][field] = value
+
+    def dump(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {key: dict(fields) for key, fields in self._data.items()}
+
+
+# Máximo atômico num campo de hash
+_HMAX_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], ARGV[1])
+if not current or tonumber(ARGV[2]) > tonumber(current) then
+  redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+end
+"""
+
+
+class _RedisStore:
+    """
+    Acumula incrementos e máximos no processo e os envia ao Redis por uma thread de fundo a cada
+    METRICS_FLUSH_S: registrar uma métrica nunca espera pela rede, nem dentro de locks nem no
+    loop do asyncio. Com o Redis indisponível, os valores continuam agregados em memória e o
+    envio só é tentado de novo depois de METRICS_RETRY_S.
+    """
+
+    def __init__(self, url: str, prefix: str) -> None:
+        import redis
+
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+        self._hmax = self._client.register_script(_HMAX_SCRIPT)
+        self._reset()
+        # Os processos do Celery nascem por fork: o filho não herda a thread nem deve reenviar o buffer do pai
+        os.register_at_fork(after_in_child=self._reset)
+        atexit.register(self.flush)
+
+    def _reset(self) -> None:
+        self._lock = threading.Lock()
+        self._increments: Dict[Tuple[str, str], float] = defaultdict(float)
+        self._maxima: Dict[Tuple[str, str], float] = {}
+        self._flusher: Optional[threading.Thread] = None
+        self._failing = False
+
+    def apply(self, increments: List[Tuple[str, str, float]], maxima: List[Tuple[str, str, float]]) -> None:
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, name="metrics-flush", daemon=True)
+                self._flusher.start()
+            for key, field, amount in increments:
+                self._increments[(key, field)] += amount
+            for key, field, value in maxima:
+                if value > self._maxima.get((key, field), float("-inf")):
+                    self._maxima[(key, field)] = value
+
+    def _merge(self, increments: Dict[Tuple[str, str], float], maxima: Dict[Tuple[str, str], float]) -> None:
+        for item, amount in increments.items():
+            self._increments[item] += amount
+        for item, value in maxima.items():
+            if value > self._maxima.get(item, float("-inf")):
+                self._maxima[item] = value
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(METRICS_RETRY_S if self._failing else METRICS_FLUSH_S)
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            increments, self._increments = self._increments, defaultdict(float)
+            maxima, self._maxima = self._maxima, {}
+        if not increments and not maxima:
+            return
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            for (key, field), amount in increments.items():
+                pipe.hincrbyfloat(f"{self.prefix}:{key}", field, amount)
+            for (key, field), value in maxima.items():
+                self._hmax(keys=[f"{self.prefix}:{key}"], args=[field, value], client=pipe)
+            pipe.execute()
+        except Exception as e:
+            # Volta para o buffer e vai no próximo envio
+            with self._lock:
+                self._merge(increments, maxima)
+            if not self._failing:
+                logger.warning(f"Não foi possível enviar métricas ao Redis ({e}). Nova tentativa em {METRICS_RETRY_S:.0f}s.")
+            self._failing = True
+            return
+        if self._failing:
+            logger.info("Envio de métricas ao Redis restabelecido.")
+        self._failing = False
+
+    def dump(self) -> Dict[str, Dict[str, float]]:
+        self.flush()
+        pipe = self._client.pipeline(transaction=False)
+        for name in _DEFINITIONS:
+            pipe.hgetall(f"{self.prefix}:{name}")
+        result = {}
+        for name, fields in zip(_DEFINITIONS, pipe.execute()):
+            result[name] = {k.decode("utf-8"): float(v) for k, v in fields.items()}
+        return result
+
+
+class Metrics:
+    """
+    Contadores, histogramas e máximos no formato do Prometheus. Com o backend Redis, cada
+    processo incrementa os mesmos hashes, então o `/metrics` da API enxerga o agregado de
+    todos os processos do Celery. Falhas ao gravar nunca interrompem o pipeline.
+    """
+
+    def __init__(self, backend: str):
+        self.backend = backend
+        self._store: Any = None
+        self._lock = threading.Lock()
+        self._warned = False
+
+    def _get_store(self) -> Any:
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    if self.backend == "redis":
+                        self._store = _RedisStore(os.getenv("REDIS_URL", "redis://localhost:6380/0"), METRICS_PREFIX)
+                    else:
+                        self._store = _MemoryStore()
+        return self._store
+
+    def _apply(self, increments: List[Tuple[str, str, float]], maxima: List[Tuple[str, str, float]] = ()) -> None:
+        if self.backend == "off":
+            return
+        try:
+            self._get_store().apply(increments, list(maxima))
+        except Exception as e:
+            if not self._warned:
+                self._warned = True
+                logger.warning(f"Não foi possível registrar métricas ({e}). Novas falhas serão omitidas.")
+
+    def inc(self, name: str, amount: float = 1.0, **labels: Any) -> None:
+        self._apply([(name, _labels(labels), amount)])
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        label_text = _labels(labels)
+        increments = [(name, f"bucket|{_format_value(b)}|{label_text}", 1.0) for b in _DEFINITIONS[name][2] if value <= b]
+        increments += [
+            (name, f"bucket|+Inf|{label_text}", 1.0),
+            (name, f"sum||{label_text}", value),
+            (name, f"count||{label_text}", 1.0),
+        ]
+        self._apply(increments)
+
+    def set_max(self, name: str, value: float, **labels: Any) -> None:
+        self._apply([], [(name, _labels(labels), value)])
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Valores brutos por métrica (campos internos de cada hash), usados pelos benchmarks."""
+        return {} if self.backend == "off" else self._get_store().dump()
+
+    def render(self) -> str:
+        """Texto no formato de exposição do Prometheus (version 0.0.4)."""
+        data = self.snapshot()
+        lines: List[str] = []
+        for name, (kind, help_text, buckets) in _DEFINITIONS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            fields = data.get(name, {})
+            if kind != "histogram":
+                for label_text, value in sorted(fields.items()):
+                    lines.append(f"{name}{{{label_text}}} {_format_value(value)}" if label_text else f"{name} {_format_value(value)}")
+                continue
+            series = sorted({field.split("|", 2)[2] for field in fields})
+            for label_text in series:
+                sep = "," if label_text else ""
+                for le in [_format_value(b) for b in buckets] + ["+Inf"]:
+                    count = fields.get(f"bucket|{le}|{label_text}", 0.0)
+                    lines.append(f'{name}_bucket{{{label_text}{sep}le="{le}"}} {_format_value(count)}')
+                suffix = f"{{{label_text}}}" if label_text else ""
+                lines.append(f"{name}_sum{suffix} {_format_value(fields.get(f'sum||{label_text}', 0.0))}")
+                lines.append(f"{name}_count{suffix} {_format_value(fields.get(f'count||{label_text}', 0.0))}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics(METRICS_BACKEND)
+
+
+def record_peak_memory(component: str) -> None:
+    """Registra o pico de RSS do processo e o uso de GPU atual (se o torch já estiver carregado)."""
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    METRICS.set_max("worker_peak_rss_bytes", peak_rss, component=component)
+    # Não importa o torch: a API e o pool de análise não devem carregá-lo só por causa das métricas
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        try:
+            free_bytes, total_bytes = torch.cuda.mem_get_info()
+            used = max(total_bytes - free_bytes, torch.cuda.max_memory_allocated())
+            METRICS.set_max("worker_peak_gpu_bytes", used, component=component)
+        except RuntimeError:
+            pass
+
+
+@contextmanager
+def stage_timer(stage: str, audio_seconds: Optional[float] = None, **labels: Any) -> Iterator[None]:
+    """Mede a duração de uma etapa e, com a duração do áudio, o fator de tempo real."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        METRICS.observe("worker_stage_duration_seconds", elapsed, stage=stage, **labels)
+        if audio_seconds:
+            METRICS.observe("worker_stage_realtime_factor", elapsed / audio_seconds, stage=stage, **labels)
@@ -0,0 +1,164 @@
+import gc
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import torch
+
+from metrics import METRICS
+
+logger = logging.getLogger("ai_worker")
+
+MODEL_MEMORY_BUDGET_MB = float(os.getenv("MODEL_MEMORY_BUDGET_MB", "16384"))
+
+
+def _rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _gpu_used_mb() -> Optional[float]:
+    if not torch.cuda.is_available():
+        return None
+    try:
+        # mem_get_info enxerga também a memória alocada fora do PyTorch (CTranslate2)
+        free_bytes, total_bytes = torch.cuda.mem_get_info()
+        return (total_bytes - free_bytes) / (1024 * 1024)
+    except RuntimeError:
+        return None
+
+
+def _memory_snapshot() -> Dict[str, Optional[float]]:
+    return {"rss": _rss_mb(), "gpu": _gpu_used_mb()}
+
+
+def _memory_delta(before: Dict[str, Optional[float]], after: Dict[str, Optional[float]]) -> float:
+    total = 0.0
+    for name in ("rss", "gpu"):
+        if before[name] is not None and after[name] is not None:
+            total += max(0.0, after[name] - before[name])
+    return total
+
+
+class _Entry:
+    __slots__ = ("model", "size_mb", "label")
+
+    def __init__(self, model: Any, size_mb: float, label: str):
+        self.model = model
+        self.size_mb = size_mb
+        self.label = label
+
+
+class ModelRegistry:
+    """
+    Cache único dos modelos (WhisperX, alinhamento e diarização) com orçamento de memória.
+    O tamanho de cada modelo é medido pela variação de RSS/memória da GPU durante o carregamento
+    (com uma estimativa como piso); ao estourar o orçamento, os modelos menos usados
+    recentemente são descartados. Uma referência ainda em uso por uma etapa em andamento
+    continua válida até o fim dela.
+    """
+
+    def __init__(self, budget_mb: float):
+        self.budget_mb = budget_mb
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        # Cargas em andamento: o evento é sinalizado ao terminar, e a estimativa fica reservada no orçamento
+        self._loading: Dict[Hashable, threading.Event] = {}
+        self._reserved_mb: Dict[Hashable, float] = {}
+        self._lock = threading.RLock()
+        self._stats = {"hits": 0, "misses": 0, "loads": 0, "evictions": 0, "load_seconds": 0.0}
+
+    def get(self, key: Hashable, loader: Callable[[], Any], estimate_mb: float, label: str) -> Any:
+        """
+        Devolve o modelo cacheado ou o carrega com `loader`. A carga acontece fora do lock, então
+        etapas que usam outros modelos não esperam por ela; quem pede o mesmo modelo durante a
+        carga espera o evento dela em vez de carregá-lo de novo.
+        """
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    METRICS.inc("worker_model_cache_total", result="hit")
+                    logger.info(f"Reutilizando modelo cacheado: {label}.")
+                    return entry.model
+                loading = self._loading.get(key)
+                if loading is None:
+                    loading = self._loading[key] = threading.Event()
+                    self._stats["misses"] += 1
+                    METRICS.inc("worker_model_cache_total", result="miss")
+                    self._make_room(estimate_mb)
+                    self._reserved_mb[key] = estimate_mb
+                    break
+            # Se a outra carga falhar, o laço tenta carregar nesta thread
+            loading.wait()
+
+        try:
+            logger.info(f"Carregando modelo: {label}...")
+            before = _memory_snapshot()
+            start = time.perf_counter()
+            model = loader()
+            elapsed = time.perf_counter() - start
+            # Com cargas simultâneas a variação inclui a outra carga, o que só superestima o tamanho
+            size_mb = max(_memory_delta(before, _memory_snapshot()), estimate_mb)
+
+            with self._lock:
+                self._entries[key] = _Entry(model, size_mb, label)
+                self._stats["loads"] += 1
+                self._stats["load_seconds"] += elapsed
+                del self._reserved_mb[key]
+                self._make_room(0)
+        finally:
+            with self._lock:
+                self._reserved_mb.pop(key, None)
+                self._loading.pop(key).set()
+
+        METRICS.observe("worker_model_load_seconds", elapsed)
+        logger.info(f"Modelo carregado em {elapsed:.1f}s (~{size_mb:.0f} MB): {label}. {self.describe()}")
+        return model
+
+    def _make_room(self, incoming_mb: float) -> None:
+        if self.budget_mb <= 0:
+            return
+        evicted = False
+        # Nunca descarta o último modelo restante: um modelo maior que o orçamento ainda precisa rodar
+        while len(self._entries) > 1 and self.used_mb() + sum(self._reserved_mb.values()) + incoming_mb > self.budget_mb:
+            _, entry = self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+            METRICS.inc("worker_model_evictions_total")
+            evicted = True
+            logger.info(f"Descartando modelo por orçamento de memória: {entry.label} (~{entry.size_mb:.0f} MB).")
+        if evicted:
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+    def used_mb(self) -> float:
+        return sum(entry.size_mb for entry in self._entries.values())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "models": [entry.label for entry in self._entries.values()],
+                "used_mb": round(self.used_mb(), 1),
+                "budget_mb": self.budget_mb,
+            }
+
+    def describe(self) -> str:
+        s = self.stats()
+        return (
+            f"Registro de modelos: {len(s['models'])} em memória, {s['used_mb']:.0f}/{s['budget_mb']:.0f} MB, "
+            f"hits={s['hits']}, misses={s['misses']}, cargas={s['loads']} ({s['load_seconds']:.1f}s), "
+            f"descartes={s['evictions']}"
+        )
+
+
+MODEL_REGISTRY = ModelRegistry(MODEL_MEMORY_BUDGET_MB)
@@ -0,0 +1,282 @@
+import atexit
+import fcntl
+import gzip
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import requests
+from celery.signals import worker_process_shutdown
+from requests.adapters import HTTPAdapter
+
+from metrics import METRICS
+
+logger = logging.getLogger("ai_worker")
+
+INTERNAL_API_KEY = os.getenv("INTERNAL_API_KEY")
+WEBHOOK_TIMEOUT_S = float(os.getenv("WEBHOOK_TIMEOUT_S", "20"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "20"))
+WEBHOOK_RETRY_MAX_DELAY_S = float(os.getenv("WEBHOOK_RETRY_MAX_DELAY_S", "300"))
+# Corpos a partir deste tamanho (bytes) vão comprimidos com gzip; o express.json do backend descomprime
+WEBHOOK_GZIP_MIN_BYTES = int(os.getenv("WEBHOOK_GZIP_MIN_BYTES", "16384"))
+WEBHOOK_OUTBOX_DIR = os.getenv(
+    "WEBHOOK_OUTBOX_DIR", os.path.join(os.getenv("WORKER_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")), "outbox")
+)
+# A cada quantos segundos o outbox é varrido em busca de entregas órfãs (de processos que morreram)
+OUTBOX_RESCAN_S = 30.0
+# Entregas abandonadas (.dead) ficam no outbox para inspeção por este prazo e depois são apagadas
+WEBHOOK_DEAD_RETENTION_DAYS = float(os.getenv("WEBHOOK_DEAD_RETENTION_DAYS", "7"))
+
+# Status que encerram uma etapa: vão para o outbox e são reenviados até o backend confirmar
+TERMINAL_STATUSES = {"TRANSCRIBED", "NO_SPEECH", "COMPLETED", "FAILED"}
+_RETRYABLE_HTTP_STATUS = {408, 425, 429}
+
+
+class _Job:
+    __slots__ = ("url", "payload", "terminal", "path", "fd", "attempts", "next_at")
+
+    def __init__(self, url: str, payload: Dict[str, Any], terminal: bool, path: Optional[str] = None, fd: Optional[int] = None):
+        self.url = url
+        self.payload = payload
+        self.terminal = terminal
+        self.path = path
+        self.fd = fd
+        self.attempts = 0
+        self.next_at = 0.0
+
+
+class WebhookNotifier:
+    """
+    Envia os webhooks para o backend numa thread em segundo plano, com conexões keep-alive.
+
+    - Atualizações de progresso (TRANSCRIBING, ALIGNING, ...) ainda não enviadas são substituídas
+      pela mais recente da mesma URL e descartadas quando chega um status terminal.
+    - Status terminais são gravados antes num outbox em disco e reenviados com backoff
+      exponencial até o backend responder; um processo que morra deixa o arquivo para o próximo.
+    - Cada URL é entregue em ordem: um item em espera de retry segura os posteriores da mesma URL.
+    """
+
+    def __init__(self, outbox_dir: str):
+        self.outbox_dir = outbox_dir
+        self._cond = threading.Condition()
+        self._jobs: List[_Job] = []
+        self._inflight: Optional[_Job] = None
+        self._held_paths: Set[str] = set()
+        self._pid: Optional[int] = None
+        self._session: Optional[requests.Session] = None
+        self._last_rescan = 0.0
+
+    # --- API pública ---
+    def notify(self, url: str, payload: Dict[str, Any]) -> None:
+        self._ensure_started()
+        terminal = payload.get("status") in TERMINAL_STATUSES
+        job = _Job(url, payload, terminal)
+        if terminal:
+            self._persist(job)
+        with self._cond:
+            if terminal:
+                self._jobs = [j for j in self._jobs if j.url != url or j.terminal]
+            else:
+                pending = next((j for j in self._jobs if j.url == url and not j.terminal), None)
+                if pending is not None:
+                    pending.payload = payload
+                    return
+            self._jobs.append(job)
+            self._cond.notify()
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Espera a fila esvaziar; entregas terminais que não couberem no prazo continuam no outbox."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._jobs or self._inflight is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    # --- Infraestrutura ---
+    def _ensure_started(self) -> None:
+        with self._cond:
+            # Após um fork (prefork do Celery) a thread e a sessão do processo pai não existem mais
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._jobs, self._inflight, self._held_paths = [], None, set()
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._session = session
+            self._last_rescan = 0.0
+            threading.Thread(target=self._run, name="webhook-notifier", daemon=True).start()
+
+    def _persist(self, job: _Job) -> None:
+        try:
+            os.makedirs(self.outbox_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.outbox_dir, suffix=".tmp")
+            # O lock é tomado antes do rename, para que nenhum outro processo adote o arquivo
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            with os.fdopen(os.dup(fd), "w", encoding="utf-8") as f:
+                json.dump({"url": job.url, "payload": job.payload}, f, ensure_ascii=False)
+            path = os.path.join(self.outbox_dir, f"{time.time():.6f}-{uuid.uuid4().hex}.json")
+            os.replace(tmp_path, path)
+            job.fd, job.path = fd, path
+            with self._cond:
+                self._held_paths.add(path)
+        except OSError as e:
+            logger.error(f"Não foi possível gravar o webhook no outbox ({e}). Entrega sem garantia de retry.")
+
+    @staticmethod
+    def _lock_file(path: str) -> Optional[int]:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fd
+        except OSError:
+            os.close(fd)
+            return None
+
+    def _adopt_orphans(self) -> None:
+        """Recupera entregas terminais deixadas no outbox por processos que reiniciaram."""
+        try:
+            names = sorted(n for n in os.listdir(self.outbox_dir) if n.endswith(".json"))
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(self.outbox_dir, name)
+            if path in self._held_paths:
+                continue
+            try:
+                fd = self._lock_file(path)
+            except FileNotFoundError:
+                continue
+            if fd is None:
+                continue  # outro processo está entregando
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error(f"Entrada inválida no outbox de webhooks ({name}): {e}")
+                os.close(fd)
+                continue
+            logger.info(f"Retomando entrega pendente do outbox para {data['url']}.")
+            self._held_paths.add(path)
+            self._jobs.append(_Job(data["url"], data["payload"], True, path, fd))
+
+    def _prune_dead(self) -> None:
+        """Apaga as entregas abandonadas (.dead) mais antigas que WEBHOOK_DEAD_RETENTION_DAYS."""
+        if WEBHOOK_DEAD_RETENTION_DAYS <= 0:
+            return
+        cutoff = time.time() - WEBHOOK_DEAD_RETENTION_DAYS * 86400
+        removed = 0
+        try:
+            names = [n for n in os.listdir(self.outbox_dir) if n.endswith(".dead")]
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(self.outbox_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                continue
+        if removed:
+            logger.info(f"Outbox de webhooks: {removed} entrega(s) abandonada(s) com mais de {WEBHOOK_DEAD_RETENTION_DAYS:.0f} dia(s) apagada(s).")
+
+    def _next_ready(self, now: float) -> Optional[_Job]:
+        blocked: Set[str] = set()
+        for job in self._jobs:
+            if job.url in blocked:
+                continue
+            if job.next_at <= now:
+                return job
+            blocked.add(job.url)
+        return None
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    if now - self._last_rescan >= OUTBOX_RESCAN_S:
+                        self._last_rescan = now
+                        self._adopt_orphans()
+                        self._prune_dead()
+                    job = self._next_ready(now)
+                    if job is not None:
+                        break
+                    waits = [j.next_at - now for j in self._jobs] + [self._last_rescan + OUTBOX_RESCAN_S - now]
+                    self._cond.wait(max(0.05, min(waits)))
+                self._jobs.remove(job)
+                self._inflight = job
+
+            delivered, retryable = self._send(job)
+
+            with self._cond:
+                self._inflight = None
+                if delivered or not job.terminal or not retryable or job.attempts >= WEBHOOK_MAX_ATTEMPTS:
+                    if job.terminal and not delivered:
+                        logger.error(f"Desistindo da entrega do webhook para {job.url} após {job.attempts} tentativa(s).")
+                    self._finish(job, delivered)
+                else:
+                    delay = min(WEBHOOK_RETRY_MAX_DELAY_S, 2.0 ** job.attempts)
+                    job.next_at = time.monotonic() + delay
+                    logger.warning(f"Nova tentativa do webhook para {job.url} em {delay:.0f}s (tentativa {job.attempts}).")
+                    self._jobs.insert(0, job)
+                self._cond.notify_all()
+
+    def _send(self, job: _Job) -> Tuple[bool, bool]:
+        headers = {'Content-Type': 'application/json'}
+        if INTERNAL_API_KEY:
+            headers['x-internal-api-key'] = INTERNAL_API_KEY
+        else:
+            logger.warning("INTERNAL_API_KEY não definida. A notificação para o backend pode falhar.")
+        body = json.dumps(job.payload, ensure_ascii=False).encode("utf-8")
+        if WEBHOOK_GZIP_MIN_BYTES > 0 and len(body) >= WEBHOOK_GZIP_MIN_BYTES:
+            body = gzip.compress(body, compresslevel=5)
+            headers['Content-Encoding'] = 'gzip'
+        job.attempts += 1
+        start = time.monotonic()
+        try:
+            resp = self._session.patch(job.url, data=body, headers=headers, timeout=WEBHOOK_TIMEOUT_S)
+        except requests.RequestException as req_e:
+            logger.error(f"Falha ao notificar backend em {job.url}: {req_e}")
+            METRICS.inc("worker_webhook_deliveries_total", result="error")
+            return False, True
+        METRICS.observe("worker_webhook_delivery_seconds", time.monotonic() - start)
+        METRICS.inc("worker_webhook_deliveries_total", result="ok" if resp.status_code < 400 else str(resp.status_code))
+        if resp.status_code >= 400:
+            logger.error(f"Webhook para {job.url} retornou status {resp.status_code}: {resp.text}")
+            return False, resp.status_code >= 500 or resp.status_code in _RETRYABLE_HTTP_STATUS
+        return True, False
+
+    def _finish(self, job: _Job, delivered: bool) -> None:
+        if job.path is None:
+            return
+        try:
+            if delivered:
+                os.remove(job.path)
+            else:
+                os.replace(job.path, job.path[:-len(".json")] + ".dead")
+                METRICS.inc("worker_webhook_dead_letters_total")
+        except OSError:
+            pass
+        if job.fd is not None:
+            os.close(job.fd)
+        self._held_paths.discard(job.path)
+
+
+NOTIFIER = WebhookNotifier(WEBHOOK_OUTBOX_DIR)
+atexit.register(NOTIFIER.flush)
+
+
+@worker_process_shutdown.connect
+def _flush_on_shutdown(**_: Any) -> None:
+    NOTIFIER.flush()
@@ -0,0 +1,197 @@
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from celery.signals import worker_process_shutdown
+
+from audio_source import SAMPLE_RATE, audio_window
+from model_registry import MODEL_MEMORY_BUDGET_MB
+from speech_activity import split_points
+
+logger = logging.getLogger("ai_worker")
+
+# Processos de transcrição por gravação longa em nós só com CPU ("0" desliga, "auto" = núcleos / SHARD_THREADS)
+SHARD_WORKERS = os.getenv("SHARD_WORKERS", "0")
+# Threads do CTranslate2/torch em cada processo do pool
+SHARD_THREADS = int(os.getenv("SHARD_THREADS", "2"))
+# Gravações mais curtas que isso seguem pelo caminho normal (o custo fixo por shard não compensa)
+SHARD_MIN_DURATION_S = float(os.getenv("SHARD_MIN_DURATION_S", "600"))
+
+
+def configured_shard_workers() -> int:
+    value = SHARD_WORKERS.strip().lower()
+    if value == "auto":
+        return max(1, (os.cpu_count() or 1) // max(1, SHARD_THREADS))
+    return max(0, int(value or 0))
+
+
+def shard_worker_count(worker_memory_mb: float) -> int:
+    """
+    Processos do pool para um modelo que ocupa `worker_memory_mb` por processo. Cada processo
+    carrega o próprio WhisperX e o modelo de alinhamento, então o pool inteiro precisa caber em
+    MODEL_MEMORY_BUDGET_MB (0 = sem limite), como os modelos do registro.
+    """
+    workers = configured_shard_workers()
+    if MODEL_MEMORY_BUDGET_MB > 0 and worker_memory_mb > 0:
+        workers = min(workers, int(MODEL_MEMORY_BUDGET_MB // worker_memory_mb))
+    return workers
+
+
+def should_shard(audio: np.ndarray, device: str, worker_memory_mb: float) -> bool:
+    # Os processos do pool leem o mesmo PCM em disco, então o áudio precisa vir de open_audio
+    return (
+        device == "cpu"
+        and shard_worker_count(worker_memory_mb) > 1
+        and len(audio) / SAMPLE_RATE >= SHARD_MIN_DURATION_S
+        and getattr(audio, "filename", None) is not None
+    )
+
+
+# --- Processos do pool ---
+# Cada processo carrega o WhisperX uma única vez (no primeiro shard) e o reaproveita enquanto o
+# pool existir. O áudio não é serializado: cada shard abre um memmap do PCM temporário da tarefa,
+# então todos os processos compartilham as mesmas páginas do page cache.
+_STATE: Dict[str, Any] = {}
+
+
+def _init_shard_process(model_name: str, compute_type: str, threads: int) -> None:
+    import torch
+
+    torch.set_num_threads(threads)
+    _STATE.update(model_name=model_name, compute_type=compute_type, threads=threads, model=None, align={})
+
+
+def _shard_whisper_model() -> Any:
+    import whisperx
+
+    if _STATE["model"] is None:
+        _STATE["model"] = whisperx.load_model(
+            _STATE["model_name"], "cpu", compute_type=_STATE["compute_type"], threads=_STATE["threads"]
+        )
+    return _STATE["model"]
+
+
+def _shard_align_model(language_code: str) -> Tuple[Any, Any]:
+    import whisperx
+
+    if language_code not in _STATE["align"]:
+        _STATE["align"][language_code] = whisperx.load_align_model(language_code=language_code, device="cpu")
+    return _STATE["align"][language_code]
+
+
+def _shift(segments: List[Dict[str, Any]], offset_s: float) -> List[Dict[str, Any]]:
+    for segment in segments:
+        for item in [segment] + segment.get("words", []):
+            for key in ("start", "end"):
+                if key in item and item[key] is not None:
+                    item[key] = round(item[key] + offset_s, 3)
+    return segments
+
+
+def _transcribe_shard(pcm_path: str, n_samples: int, start_s: float, end_s: float, language: Optional[str], batch_size: int) -> Dict[str, Any]:
+    import torch
+    import whisperx
+
+    audio = np.memmap(pcm_path, dtype=np.float32, mode="c", shape=(n_samples,))
+    window = audio_window(audio, start_s, end_s)
+    with torch.inference_mode():
+        result = _shard_whisper_model().transcribe(window, batch_size=batch_size, language=language)
+        shard_language = result.get("language") or language or "pt"
+        model_a, metadata = _shard_align_model(shard_language)
+        aligned = whisperx.align(result["segments"], model_a, metadata, window, "cpu", return_char_alignments=False)
+    return {
+        "language": shard_language,
+        "duration_s": end_s - start_s,
+        "segments": _shift(aligned["segments"], start_s),
+    }
+
+
+# --- Processo da tarefa ---
+class ShardPool:
+    """
+    Pool de processos (spawn) reutilizado entre tarefas do mesmo processo do Celery. É recriado
+    só quando muda o modelo/compute_type pedido ou quando um processo filho morre.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._key: Optional[Tuple[str, str, int]] = None
+
+    def get(self, model_name: str, compute_type: str, workers: int) -> ProcessPoolExecutor:
+        key = (model_name, compute_type, workers)
+        with self._lock:
+            if self._executor is None or self._key != key:
+                self._shutdown_locked()
+                logger.info(f"Criando pool de transcrição em shards: {workers} processo(s) x {SHARD_THREADS} thread(s), {model_name} ({compute_type}).")
+                self._executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_shard_process,
+                    initargs=(model_name, compute_type, SHARD_THREADS),
+                )
+                self._key = key
+            return self._executor
+
+    def reset(self) -> None:
+        with self._lock:
+            self._shutdown_locked()
+
+    def _shutdown_locked(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor, self._key = None, None
+
+
+SHARD_POOL = ShardPool()
+atexit.register(SHARD_POOL.reset)
+
+
+@worker_process_shutdown.connect
+def _shutdown_shard_pool(**_: Any) -> None:
+    SHARD_POOL.reset()
+
+
+def transcribe_sharded(
+    audio: np.ndarray, model_name: str, compute_type: str, language: Optional[str], batch_size: int, worker_memory_mb: float
+) -> Dict[str, Any]:
+    """
+    Divide a gravação em pausas (ver speech_activity.split_points), transcreve e alinha cada
+    parte em paralelo no pool e junta os segmentos com os timestamps já deslocados para a
+    posição original. Retorna o mesmo formato de `whisperx.align`, com o idioma predominante.
+    """
+    workers = shard_worker_count(worker_memory_mb)
+    if workers < configured_shard_workers():
+        logger.info(f"Pool de shards limitado a {workers} processo(s) (~{worker_memory_mb:.0f} MB cada) pelo orçamento de {MODEL_MEMORY_BUDGET_MB:.0f} MB.")
+    duration_s = len(audio) / SAMPLE_RATE
+    bounds = [0.0] + split_points(audio, workers) + [duration_s]
+    shards = list(zip(bounds[:-1], bounds[1:]))
+    logger.info(f"Transcrição em {len(shards)} shard(s): " + ", ".join(f"{a:.0f}-{b:.0f}s" for a, b in shards))
+
+    executor = SHARD_POOL.get(model_name, compute_type, workers)
+    shard_batch_size = max(1, batch_size // workers)
+    futures = [
+        executor.submit(_transcribe_shard, audio.filename, len(audio), start_s, end_s, language, shard_batch_size)
+        for start_s, end_s in shards
+    ]
+    try:
+        results = [future.result() for future in futures]
+    except Exception:
+        for future in futures:
+            future.cancel()
+        # Um processo que morreu (ex.: falta de memória) deixa o pool quebrado; o próximo uso recria
+        SHARD_POOL.reset()
+        raise
+
+    spoken = Counter()
+    for result in results:
+        spoken[result["language"]] += result["duration_s"]
+    segments = [segment for result in results for segment in result["segments"]]
+    word_segments = [word for segment in segments for word in segment.get("words", [])]
+    return {"segments": segments, "word_segments": word_segments, "language": spoken.most_common(1)[0][0]}
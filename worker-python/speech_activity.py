@@ -0,0 +1,89 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from audio_source import SAMPLE_RATE
+
+# Janela de análise de energia (20 ms)
+FRAME_S = 0.02
+# Quanto acima do ruído de fundo um quadro precisa estar para contar como fala
+SPEECH_MARGIN_DB = 12.0
+# Piso absoluto: abaixo disso é silêncio mesmo numa gravação sem ruído de fundo
+ABSOLUTE_FLOOR_DB = -55.0
+# Nível absoluto de fala: acima disso o quadro é fala, mesmo que a gravação quase não tenha
+# pausas (sem pausas o percentil 10 já é fala e o limiar relativo fica alto demais)
+ABSOLUTE_SPEECH_DB = -35.0
+# Blocos processados por vez, para não materializar o memmap inteiro de uma gravação longa
+_BLOCK_S = 60.0
+
+
+def frame_energy_db(audio: np.ndarray, sr: int = SAMPLE_RATE, frame_s: float = FRAME_S) -> np.ndarray:
+    """Energia RMS (dBFS) por quadro, calculada em blocos sobre o áudio (memmap ou array)."""
+    frame = max(1, int(frame_s * sr))
+    n_frames = len(audio) // frame
+    energy = np.empty(n_frames, dtype=np.float32)
+    block_frames = max(1, int(_BLOCK_S * sr) // frame)
+    for first in range(0, n_frames, block_frames):
+        last = min(n_frames, first + block_frames)
+        block = np.asarray(audio[first * frame:last * frame], dtype=np.float32).reshape(-1, frame)
+        rms = np.sqrt(np.mean(np.square(block), axis=1))
+        energy[first:last] = 20 * np.log10(np.maximum(rms, 1e-10))
+    return energy
+
+
+def speech_mask(energy_db: np.ndarray) -> np.ndarray:
+    """
+    Quadros com fala: acima do limiar adaptativo a partir do ruído de fundo (percentil 10)
+    ou acima do nível absoluto de fala.
+    """
+    if len(energy_db) == 0:
+        return np.zeros(0, dtype=bool)
+    noise_floor = float(np.percentile(energy_db, 10))
+    threshold = max(noise_floor + SPEECH_MARGIN_DB, ABSOLUTE_FLOOR_DB)
+    return (energy_db > threshold) | (energy_db > ABSOLUTE_SPEECH_DB)
+
+
+def silence_runs(mask: np.ndarray, min_frames: int) -> List[Tuple[int, int]]:
+    """Trechos contínuos sem fala com pelo menos `min_frames` quadros, como (início, fim) em quadros."""
+    padded = np.concatenate(([True], mask, [True]))
+    changes = np.flatnonzero(padded[1:] != padded[:-1])
+    runs = []
+    for start, end in zip(changes[::2], changes[1::2]):
+        if end - start >= min_frames:
+            runs.append((int(start), int(end)))
+    return runs
+
+
+def speech_stats(audio: np.ndarray, sr: int = SAMPLE_RATE) -> Dict[str, float]:
+    """Duração total, segundos com fala e a proporção de fala da gravação."""
+    mask = speech_mask(frame_energy_db(audio, sr))
+    duration_s = len(audio) / sr
+    speech_s = float(mask.sum()) * FRAME_S
+    return {"duration_s": duration_s, "speech_s": speech_s, "speech_ratio": speech_s / duration_s if duration_s else 0.0}
+
+
+def split_points(audio: np.ndarray, n_parts: int, sr: int = SAMPLE_RATE, search_s: float = 20.0, min_silence_s: float = 0.3) -> List[float]:
+    """
+    Pontos de corte (em segundos) para dividir o áudio em `n_parts` partes de duração parecida,
+    cada um no meio da pausa mais longa a até `search_s` do ponto ideal; sem pausa por perto,
+    usa o quadro de menor energia da janela, para nunca cortar no meio de uma palavra alta.
+    """
+    duration_s = len(audio) / sr
+    if n_parts <= 1 or duration_s <= 0:
+        return []
+    energy = frame_energy_db(audio, sr)
+    runs = silence_runs(speech_mask(energy), max(1, int(min_silence_s / FRAME_S)))
+    points: List[float] = []
+    for i in range(1, n_parts):
+        ideal = duration_s * i / n_parts
+        lo, hi = ideal - search_s, ideal + search_s
+        candidates = [(end - start, (start + end) / 2 * FRAME_S) for start, end in runs if lo <= (start + end) / 2 * FRAME_S <= hi]
+        if candidates:
+            point = max(candidates)[1]
+        else:
+            first = max(0, int(lo / FRAME_S))
+            last = min(len(energy), int(hi / FRAME_S))
+            point = (first + int(np.argmin(energy[first:last]))) * FRAME_S if last > first else ideal
+        if not points or point > points[-1] + 1.0:
+            points.append(round(point, 3))
+    return points
@@ -0,0 +1,188 @@
+import gc
+import logging
+import os
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+import torch
+
+logger = logging.getLogger("ai_worker")
+
+T = TypeVar("T")
+
+# Teto padrão quando WHISPERX_BATCH_SIZE não está definido
+BATCH_SIZE_MAX = int(os.getenv("WHISPERX_BATCH_SIZE_MAX", "32"))
+# Fração da memória livre que o lote de transcrição pode ocupar
+MEMORY_HEADROOM = float(os.getenv("WHISPERX_MEMORY_HEADROOM", "0.7"))
+
+# Memória aproximada (MB) por item do lote em float16/float32, por família de modelo
+_PER_ITEM_MB = {"tiny": 60, "base": 90, "small": 180, "medium": 320, "large": 480, "turbo": 300}
+_COMPUTE_TYPE_FACTOR = {"float32": 2.0, "int8_float32": 1.2, "float16": 1.0, "bfloat16": 1.0, "int8_float16": 0.7, "int8": 0.6}
+_VALID_COMPUTE_TYPES = {
+    "cuda": {"float16", "bfloat16", "float32", "int8", "int8_float16", "int8_float32"},
+    "cpu": {"int8", "int8_float32", "float32"},
+}
+
+# Menor lote que já estourou a memória, por (dispositivo, modelo, compute_type), neste processo
+_OOM_LIMITS: Dict[Tuple[str, str, str], int] = {}
+
+
+# --- Detecção de Dispositivo ---
+def _mps_available() -> bool:
+    return bool(getattr(torch.backends, "mps", None) and torch.backends.mps.is_available())
+
+def detect_device() -> str:
+    if torch.cuda.is_available():
+        return "cuda"
+    if _mps_available():
+        return "mps"
+    return "cpu"
+
+DEVICE = detect_device()
+
+
+def resolve_device(requested: Optional[str], default: str = DEVICE) -> str:
+    """Valida um dispositivo pedido na configuração, caindo para o padrão se indisponível."""
+    if not requested:
+        return default
+    requested = requested.strip().lower()
+    if requested.startswith("cuda") and not torch.cuda.is_available():
+        logger.warning(f"Dispositivo '{requested}' solicitado, mas CUDA não está disponível. Usando {default}.")
+        return default
+    if requested == "mps" and not _mps_available():
+        logger.warning(f"Dispositivo 'mps' solicitado, mas não está disponível. Usando {default}.")
+        return default
+    return requested
+
+
+def resolve_compute_type(requested: Optional[str], device: str) -> str:
+    kind = "cuda" if device.startswith("cuda") else "cpu"
+    default = "float16" if kind == "cuda" else "int8"
+    if not requested:
+        return default
+    requested = requested.strip().lower()
+    if requested not in _VALID_COMPUTE_TYPES[kind]:
+        logger.warning(f"compute_type '{requested}' não é suportado em {device}. Usando {default}.")
+        return default
+    return requested
+
+
+def resolve_batch_size(requested: Optional[str]) -> int:
+    """Teto do lote pedido na configuração; ausente ou inválido, usa BATCH_SIZE_MAX."""
+    if not requested:
+        return BATCH_SIZE_MAX
+    try:
+        return max(1, int(requested.strip()))
+    except ValueError:
+        logger.warning(f"WHISPERX_BATCH_SIZE inválido: {requested!r}. Usando {BATCH_SIZE_MAX}.")
+        return BATCH_SIZE_MAX
+
+
+def _setting(config: Dict[str, Any], name: str) -> Optional[str]:
+    value = config.get(name) or os.getenv(name)
+    return str(value) if value not in (None, "") else None
+
+
+class StagePlacement:
+    """
+    Dispositivo e parâmetros de cada etapa do pipeline, lidos da configuração da tarefa
+    (enviada pelo backend) com fallback para as variáveis de ambiente do worker.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        # O CTranslate2 (faster-whisper) só roda em CUDA ou CPU
+        self.transcribe_device = "cuda" if DEVICE == "cuda" else "cpu"
+        self.compute_type = resolve_compute_type(_setting(config, "WHISPERX_COMPUTE_TYPE"), self.transcribe_device)
+        self.align_device = resolve_device(_setting(config, "ALIGN_DEVICE"))
+        self.diar_device = resolve_device(_setting(config, "DIAR_DEVICE"))
+        self.max_batch_size = resolve_batch_size(_setting(config, "WHISPERX_BATCH_SIZE"))
+
+    def batch_size_for(self, model_name: str) -> int:
+        return pick_batch_size(self.transcribe_device, model_name, self.compute_type, self.max_batch_size)
+
+    def describe(self) -> str:
+        return (
+            f"transcrição={self.transcribe_device}/{self.compute_type} (lote até {self.max_batch_size}), "
+            f"alinhamento={self.align_device}, diarização={self.diar_device}"
+        )
+
+
+# --- Dimensionamento do lote ---
+def available_memory_mb(device: str) -> Optional[float]:
+    try:
+        if device.startswith("cuda"):
+            free_bytes, _ = torch.cuda.mem_get_info()
+            return free_bytes / (1024 * 1024)
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, RuntimeError, ValueError):
+        pass
+    return None
+
+
+def _per_item_mb(model_name: str, compute_type: str) -> float:
+    family = next((name for name in _PER_ITEM_MB if name in model_name.lower()), "large")
+    return _PER_ITEM_MB[family] * _COMPUTE_TYPE_FACTOR.get(compute_type, 1.0)
+
+
+def pick_batch_size(device: str, model_name: str, compute_type: str, upper: int) -> int:
+    """
+    Maior lote que cabe na memória livre do dispositivo (GPU ou RAM do host), limitado pelo
+    teto configurado e pelo menor lote que já causou OOM neste processo.
+    """
+    limit = upper
+    oom_limit = _OOM_LIMITS.get((device, model_name, compute_type))
+    if oom_limit is not None:
+        limit = min(limit, oom_limit)
+    free_mb = available_memory_mb(device)
+    if free_mb is not None:
+        limit = min(limit, int(free_mb * MEMORY_HEADROOM // _per_item_mb(model_name, compute_type)))
+    batch_size = max(1, limit)
+    free_text = f"{free_mb:.0f} MB" if free_mb is not None else "desconhecida"
+    logger.info(f"Tamanho de lote escolhido: {batch_size} (teto={upper}, memória livre={free_text})")
+    return batch_size
+
+
+# --- Recuperação de falta de memória ---
+def is_oom_error(exc: BaseException) -> bool:
+    if isinstance(exc, MemoryError):
+        return True
+    oom_type = getattr(torch.cuda, "OutOfMemoryError", None)
+    if oom_type is not None and isinstance(exc, oom_type):
+        return True
+    message = str(exc).lower()
+    return "out of memory" in message or "failed to allocate" in message
+
+
+def release_device_memory() -> None:
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+def run_with_batch_backoff(fn: Callable[[int], T], batch_size: int, device: str, model_name: str, compute_type: str) -> T:
+    """Executa `fn(batch_size)`, reduzindo o lote pela metade a cada OOM até chegar a 1."""
+    while True:
+        try:
+            return fn(batch_size)
+        except Exception as e:
+            if not is_oom_error(e) or batch_size <= 1:
+                raise
+            smaller = max(1, batch_size // 2)
+            _OOM_LIMITS[(device, model_name, compute_type)] = smaller
+            logger.warning(f"Falta de memória com lote {batch_size} em {device}. Tentando novamente com lote {smaller}.")
+            release_device_memory()
+            batch_size = smaller
+
+
+def run_with_device_fallback(fn: Callable[[str], T], device: str, stage: str) -> T:
+    """Executa `fn(device)`; se faltar memória num acelerador, repete a etapa na CPU."""
+    try:
+        return fn(device)
+    except Exception as e:
+        if device == "cpu" or not is_oom_error(e):
+            raise
+        logger.warning(f"Falta de memória na etapa de {stage} em {device}. Repetindo na CPU.")
+        release_device_memory()
+        return fn("cpu")
@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import os
+from typing import Dict, List, Optional
+
+from openai import AsyncOpenAI
+
+from disk_cache import DiskCache, make_key
+from metrics import stage_timer
+
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "gpt-5-mini-2025-08-07")
+SUMMARY_DIGEST_MODEL = os.getenv("SUMMARY_DIGEST_MODEL", SUMMARY_MODEL)
+# Quantas ligações são condensadas em paralelo na etapa de map
+SUMMARY_MAP_CONCURRENCY = int(os.getenv("SUMMARY_MAP_CONCURRENCY", "8"))
+# Incrementar sempre que o prompt do digest mudar, para invalidar o cache
+DIGEST_PROMPT_VERSION = "2"
+# Marcador devolvido pelo digest para ligações que não são de vendas (ou curtas demais)
+IGNORE_MARKER = "IGNORAR"
+
+class NoSalesCallsError(ValueError):
+    """Nenhuma das transcrições enviadas é uma ligação de vendas aproveitável para o resumo."""
+
+
+DIGEST_CACHE = DiskCache("summary_digests", int(os.getenv("SUMMARY_DIGEST_CACHE_MAX_MB", "256")) * 1024 * 1024)
+
+_clients: Dict[str, AsyncOpenAI] = {}
+
+
+def get_client(api_key: str) -> AsyncOpenAI:
+    # Um cliente por chave, reaproveitando o pool de conexões entre requisições
+    client = _clients.get(api_key)
+    if client is None:
+        client = AsyncOpenAI(api_key=api_key)
+        _clients[api_key] = client
+    return client
+
+
+def _digest_key(name: str, transcription: str) -> str:
+    transcription_hash = hashlib.sha256(transcription.encode("utf-8")).hexdigest()
+    return make_key(transcription_hash, name, SUMMARY_DIGEST_MODEL, DIGEST_PROMPT_VERSION)
+
+
+def _digest_prompt(name: str, transcription: str) -> str:
+    return f"""
+    Você é um gerente de vendas sênior revisando UMA ligação da vendedora "{name}" (transcrição em formato VTT).
+    Quando a transcrição usa as etiquetas VENDEDORA e CLIENTE, a vendedora foi reconhecida pela voz e as etiquetas são confiáveis.
+    Com etiquetas genéricas (ex: SPEAKER_01), o modelo pode confundir os interlocutores; nesse caso identifique quem é quem pelo contexto, não pelas etiquetas.
+    Se a transcrição for muito curta ou claramente não representar uma ligação de vendas real, responda apenas: {IGNORE_MARKER}
+
+    Caso contrário, produza um resumo compacto (no máximo 300 palavras), em tópicos, com:
+    - **Contexto:** cliente, produto/necessidade e resultado da ligação.
+    - **Pontos fortes:** comportamentos positivos da vendedora, cada um com um trecho literal curto da ligação.
+    - **Pontos a melhorar:** falhas na abertura, descoberta, qualificação, contorno de objeções ou fechamento, cada uma com um trecho literal curto e o contexto em que ocorreu.
+
+    Transcrição:
+    ---
+    {transcription}
+    """
+
+
+async def digest_transcription(client: AsyncOpenAI, name: str, transcription: str, semaphore: asyncio.Semaphore) -> Optional[str]:
+    """
+    Etapa de map: condensa uma ligação num digest, reaproveitando o cache por hash da transcrição.
+    Retorna None para ligações que devem ser ignoradas.
+    """
+    key = _digest_key(name, transcription)
+    # O cache lê e descomprime do disco; fora do loop para não travar as outras requisições
+    cached = await asyncio.to_thread(DIGEST_CACHE.get, key)
+    if cached is not None:
+        return cached["digest"]
+
+    async with semaphore:
+        try:
+            response = await client.chat.completions.create(
+                model=SUMMARY_DIGEST_MODEL,
+                messages=[
+                    {"role": "system", "content": "Você é um gerente de vendas sênior resumindo ligações para um feedback de desempenho."},
+                    {"role": "user", "content": _digest_prompt(name, transcription)},
+                ],
+            )
+        except Exception as e:
+            # Sem o digest, a transcrição completa vai para o reduce, como antes
+            print(f"  -> AVISO: falha ao condensar uma transcrição ({e}). Usando o texto completo.")
+            return transcription
+
+    content = (response.choices[0].message.content or "").strip()
+    digest = None if content.upper().startswith(IGNORE_MARKER) else content
+    await asyncio.to_thread(DIGEST_CACHE.set, key, {"digest": digest})
+    return digest
+
+
+def _reduce_prompt(name: str, digests: List[str], total_calls: int) -> str:
+    previous_digests_text = "\n\n---\n[FIM DO RESUMO]\n---\n\n".join(
+        [f"Ligação {i+1}:\n{digest}" for i, digest in enumerate(digests)]
+    )
+    return f"""
+    Você é um gerente de vendas sênior e está preparando uma análise de desempenho para a vendedora chamada "{name}".
+    Você tem em mãos resumos estruturados de {len(digests)} das últimas {total_calls} ligações dela (as demais eram curtas demais ou não eram ligações de vendas reais e já foram descartadas).
+    Cada resumo traz o contexto da ligação, os pontos fortes e os pontos a melhorar, com trechos literais das falas.
+    Sua tarefa é sintetizar essas análises em um único documento coeso e construtivo. O documento deve ser em formato de markdown, direcionado para a vendedora, bem detalhado e sempre dando exemplos concretos das ligações.
+
+    **Regras obrigatórias de formatação:**
+    - Sempre coloque títulos, subtítulos e tópicos importantes em **negrito** usando `**texto**`.
+    - Nas seções de "Oportunidades de Desenvolvimento", **os subtópicos devem obrigatoriamente vir em negrito** assim:
+         **O que melhorar:**
+         **Como isso se manifestou (Exemplo prático):**
+         **Como pode ser diferente (Sugestão de melhoria):**
+
+    Estruture o documento da seguinte forma:
+
+    1.  **Visão Geral do Desempenho:** Comece com um parágrafo de abertura, reconhecendo o esforço e o volume de trabalho recente de {name}.
+    2.  **Padrões de Destaque (Pontos Fortes):** Identifique e liste em tópicos os pontos fortes que aparecem consistentemente nas ligações. Essa parte pode ser mais resumida.
+    3.  **Oportunidades de Desenvolvimento (Pontos a Melhorar):** Identifique os principais pontos de melhoria recorrentes. Para cada ponto, detalhe extensivamente de forma construtiva, usando obrigatoriamente a seguinte estrutura:
+         **O que melhorar:** Identifique a competência ou o comportamento a ser desenvolvido (Ex: Condução da fase de descoberta, contorno de objeções de preço, etc.).
+         **Como isso se manifestou (Exemplo prático):** Descreva uma ou mais situações específicas das ligações em que isso foi notado. Seja específico, citando o contexto e os trechos que ilustrem o ponto.
+         **Como pode ser diferente (Sugestão de melhoria):** Ofereça uma sugestão clara e prática sobre como agir de forma diferente em situações futuras para obter um resultado melhor. Dê exemplos de frases ou abordagens alternativas.
+    4.  **Plano de Ação Sugerido:** Com base nas oportunidades identificadas, sugira ações práticas, bem detalhadas e focadas que {name} pode implementar nas próximas semanas.
+
+    Seja objetivo, claro e não economize palavras.
+
+    Aqui estão os resumos das ligações para sua referência:
+    ---
+    {previous_digests_text}
+    """
+
+
+async def generate_consolidated_summary(api_key: str, name: str, transcriptions: List[str]) -> str:
+    """
+    Resumo em map-reduce: cada transcrição é condensada uma única vez (digest em cache) e os
+    digests são combinados no resumo final. Regerar o resumo após uma ligação nova custa
+    um digest novo mais o reduce, em vez de reenviar todo o histórico.
+    """
+    client = get_client(api_key)
+    semaphore = asyncio.Semaphore(SUMMARY_MAP_CONCURRENCY)
+    with stage_timer("summary_map"):
+        results = await asyncio.gather(*(digest_transcription(client, name, t, semaphore) for t in transcriptions))
+    digests = [d for d in results if d]
+    print(f"  -> {len(digests)} de {len(transcriptions)} ligações condensadas para o resumo.")
+    if not digests:
+        raise NoSalesCallsError("Nenhuma das transcrições representa uma ligação de vendas válida para o resumo.")
+
+    with stage_timer("summary_reduce"):
+        response = await client.chat.completions.create(
+            model=SUMMARY_MODEL,
+            messages=[
+                {"role": "system", "content": "Você é um gerente de vendas sênior elaborando um feedback de desempenho."},
+                {"role": "user", "content": _reduce_prompt(name, digests, len(transcriptions))},
+            ],
+        )
+    return response.choices[0].message.content
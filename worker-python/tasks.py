@@ -1,207 +1,411 @@
 import os
-import logging
-import requests
 import whisperx
 import torch
 import gc
-import tempfile
-import traceback
-import time
-import json
-import re
-from typing import Any, Dict, Optional, Tuple
+import hashlib
+import inspect
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import ExitStack
 from functools import lru_cache
+import time
+import pandas as pd
+from typing import Any, Dict, List, Optional, Tuple
 
-import openai
-from openai import OpenAI
-from dotenv import load_dotenv
+from celery.signals import worker_process_init
 
 from celery_app import celery_app
-
-load_dotenv()
-
-# --- Logging ---
-logger = logging.getLogger("ai_worker")
-handler = logging.StreamHandler()
-formatter = logging.Formatter(
-    "%(asctime)s | %(levelname)s | %(name)s | %(message)s", "%Y-%m-%d %H:%M:%S"
+from audio_scheduler import AUDIO_SCHEDULER
+from audio_source import SAMPLE_RATE, open_audio
+from batch_transcription import transcribe_batch
+from checkpoints import TaskCheckpoints, prune_stale
+from disk_cache import DiskCache, file_sha256, make_key
+from metrics import METRICS, record_peak_memory, stage_timer
+from model_registry import MODEL_REGISTRY
+from sharding import should_shard, transcribe_sharded
+from speech_activity import speech_stats
+from transcript_format import result_to_vtt
+from transcript_store import store_transcript
+from voice_profiles import VOICE_PROFILES, label_speakers
+from stage_placement import (
+    DEVICE,
+    StagePlacement,
+    run_with_batch_backoff,
+    run_with_device_fallback,
 )
-handler.setFormatter(formatter)
-if not logger.handlers:
-    logger.addHandler(handler)
-logger.setLevel(logging.INFO)
-logger.propagate = False
-logger.info("Iniciando a configuração do Worker de IA...")
-
-# --- Constantes e Configurações Padrão ---
-NODE_BACKEND_URL = os.getenv("NODE_BACKEND_URL", "http://localhost:3001")
-ASSISTANT_MAX_WAIT_S = int(os.getenv("ASSISTANT_MAX_WAIT_S", "300"))
-INTERNAL_API_KEY = os.getenv("INTERNAL_API_KEY") 
-# --- Detecção de Dispositivo ---
-def detect_device() -> str:
-    if torch.cuda.is_available():
-        return "cuda"
-    if getattr(torch.backends, "mps", None) and torch.backends.mps.is_available():
-        return "mps"
-    return "cpu"
-
-DEVICE = detect_device()
-COMPUTE_TYPE_DEFAULT = "float16" if DEVICE == "cuda" else "int8"
-BATCH_SIZE = 4
+from worker_common import logger, notify_backend, notify_failure, webhook_url_for
 
+# --- Dispositivo e Ajustes por Etapa ---
+# DEVICE é o dispositivo principal detectado; cada tarefa resolve o seu StagePlacement
 logger.info(f"Dispositivo de processamento principal detectado: {DEVICE}")
 
-# --- Cache de Modelos ---
-MODEL_CACHE: Dict[Tuple[str, str, str], Any] = {}
-ALIGN_MODELS_CACHE: Dict[Tuple[str, str], Tuple[Any, Any]] = {}
+# --- Diarização em paralelo ---
+# A diarização depende só do áudio, então roda numa thread própria enquanto o WhisperX
+# transcreve e alinha no dispositivo principal. Uma única thread evita que dois pipelines
+# do pyannote disputem a mesma memória quando há tarefas em lote.
+DIARIZE_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="diarize")
+
+# --- Cache de Transcrições (conteúdo do áudio + configuração do modelo) ---
+TRANSCRIPTION_CACHE = DiskCache("transcriptions", int(os.getenv("TRANSCRIPTION_CACHE_MAX_MB", "1024")) * 1024 * 1024)
+
+# --- Triagem de fala ---
+# Gravações com menos fala que isso (caixa postal, ligação caída, arquivo mudo) terminam como
+# NO_SPEECH sem carregar WhisperX/pyannote e sem chegar à análise. "0" desliga o critério.
+SCREEN_MIN_SPEECH_S = float(os.getenv("SCREEN_MIN_SPEECH_S", "5"))
+SCREEN_MIN_SPEECH_RATIO = float(os.getenv("SCREEN_MIN_SPEECH_RATIO", "0.05"))
+
+# --- Diarização: limites de locutores ---
+# Toda ligação tem a vendedora e um ou poucos clientes; restringir o agrupamento do pyannote
+# evita buscar o número de locutores às cegas. A configuração da tarefa (MIN_SPEAKERS,
+# MAX_SPEAKERS) tem precedência sobre o ambiente; vazio = sem limite.
+DIARIZE_MIN_SPEAKERS = os.getenv("DIARIZE_MIN_SPEAKERS", "2")
+DIARIZE_MAX_SPEAKERS = os.getenv("DIARIZE_MAX_SPEAKERS", "4")
+
+# --- Registro de Modelos ---
+# Estimativas (MB) usadas como piso quando a medição de memória no carregamento não é possível
+_WHISPER_ESTIMATE_MB = {"tiny": 150, "base": 300, "small": 900, "medium": 2000, "large": 3500, "turbo": 1800}
+_ALIGN_ESTIMATE_MB = 1300
+_DIARIZE_ESTIMATE_MB = 600
+
+def whisper_estimate_mb(model_name: str, compute_type: str) -> float:
+    family = next((name for name in _WHISPER_ESTIMATE_MB if name in model_name.lower()), "large")
+    return _WHISPER_ESTIMATE_MB[family] * (0.5 if compute_type.startswith("int8") else 1.0)
 
 def load_whisper_model(model_name: str, device: str, compute_type: str) -> Any:
-    key = (model_name, device, compute_type)
-    if key not in MODEL_CACHE:
-        logger.info(f"Carregando WhisperX ({model_name}) em {device} (compute_type={compute_type})...")
-        MODEL_CACHE[key] = whisperx.load_model(model_name, device, compute_type=compute_type)
-    else:
-        logger.info(f"Reutilizando modelo WhisperX cacheado para {key}.")
-    return MODEL_CACHE[key]
-
-@lru_cache(maxsize=2)
-def get_diarize_model(hf_token: str, device: str) -> Any:
-    logger.info(f"Carregando modelo de Diarização no device={device}...")
+    return MODEL_REGISTRY.get(
+        ("whisper", model_name, device, compute_type),
+        lambda: whisperx.load_model(model_name, device, compute_type=compute_type),
+        whisper_estimate_mb(model_name, compute_type),
+        f"WhisperX {model_name} em {device} ({compute_type})",
+    )
+
+def _load_diarize_model(hf_token: str, device: str) -> Any:
     try:
-        diarize_model = whisperx.DiarizationPipeline(use_auth_token=hf_token, device=device)
+        return whisperx.DiarizationPipeline(use_auth_token=hf_token, device=device)
     except TypeError:
-        diarize_model = whisperx.DiarizationPipeline(hf_token=hf_token, device=device)
-    return diarize_model
+        return whisperx.DiarizationPipeline(hf_token=hf_token, device=device)
+
+def get_diarize_model(hf_token: str, device: str) -> Any:
+    # O token entra na chave só como hash, para não aparecer em logs ou estatísticas
+    token_id = hashlib.sha256(hf_token.encode("utf-8")).hexdigest()[:12]
+    return MODEL_REGISTRY.get(
+        ("diarize", token_id, device),
+        lambda: _load_diarize_model(hf_token, device),
+        _DIARIZE_ESTIMATE_MB,
+        f"Diarização em {device}",
+    )
 
 def get_align_model(language_code: str, device: str) -> Tuple[Any, Any]:
-    key = (language_code, device)
-    if key not in ALIGN_MODELS_CACHE:
-        logger.info(f"Carregando modelo de alinhamento para idioma: {language_code} em {device}")
-        model_a, metadata = whisperx.load_align_model(language_code=language_code, device=device)
-        ALIGN_MODELS_CACHE[key] = (model_a, metadata)
-    else:
-        logger.info(f"Reutilizando modelo de alinhamento cacheado para '{language_code}' em {device}.")
-    return ALIGN_MODELS_CACHE[key]
+    return MODEL_REGISTRY.get(
+        ("align", language_code, device),
+        lambda: whisperx.load_align_model(language_code=language_code, device=device),
+        _ALIGN_ESTIMATE_MB,
+        f"Alinhamento '{language_code}' em {device}",
+    )
 
+# --- Pré-carregamento na inicialização do processo ---
+WARM_PRELOAD = os.getenv("WARM_PRELOAD", "true").lower() in ("1", "true", "yes")
+WARM_ALIGN_LANGUAGES = [lang.strip() for lang in os.getenv("WARM_ALIGN_LANGUAGES", "pt").split(",") if lang.strip()]
 
-# --- Utilitários ---
-def notify_backend(webhook_url: str, payload: Dict[str, Any], timeout: int = 20) -> None:
-    try:
-        headers = {
-            'Content-Type': 'application/json'
-        }
-        if INTERNAL_API_KEY:
-            headers['x-internal-api-key'] = INTERNAL_API_KEY
-        else:
-            logger.warning("INTERNAL_API_KEY não definida. A notificação para o backend pode falhar.")
-
-        resp = requests.patch(webhook_url, json=payload, headers=headers, timeout=timeout)
-        
-        if resp.status_code >= 400:
-            logger.error(f"Webhook para {webhook_url} retornou status {resp.status_code}: {resp.text}")
-    except requests.RequestException as req_e:
-        logger.error(f"Falha ao notificar backend em {webhook_url}: {req_e}")
-def generate_vtt(segments_obj: Dict[str, Any], audio_path: str) -> str:
-    with tempfile.TemporaryDirectory() as temp_dir:
-        writer = whisperx.utils.WriteVTT(output_dir=temp_dir)
-        writer(segments_obj, audio_path, {"max_line_width": None, "max_line_count": None, "highlight_words": False})
-        output_vtt_path = os.path.join(temp_dir, os.path.splitext(os.path.basename(audio_path))[0] + ".vtt")
-        with open(output_vtt_path, "r", encoding="utf-8") as f:
-            return f.read()
-
-def extract_json_from_text(text: str) -> Dict[str, Any]:
+def warm_models() -> None:
+    """
+    Carrega os modelos configurados no ambiente antes da primeira tarefa, para que a reciclagem
+    de processos (worker_max_tasks_per_child) não faça a próxima ligação pagar o cold start.
+    """
+    placement = StagePlacement({})
+    start = time.perf_counter()
     try:
-        return json.loads(text)
-    except Exception:
-        pass
-    code_block = re.search(r"```(?:json)?\s*([\s\S]*?)\s*```", text, re.IGNORECASE)
-    if code_block:
-        candidate = code_block.group(1).strip()
-        try:
-            return json.loads(candidate)
-        except Exception:
-            pass
-    first = text.find("{")
-    last = text.rfind("}")
-    if first != -1 and last != -1 and last > first:
-        candidate = text[first : last + 1].strip()
+        load_whisper_model(os.getenv("WHISPERX_MODEL", "large-v3"), placement.transcribe_device, placement.compute_type)
+        for language_code in WARM_ALIGN_LANGUAGES:
+            get_align_model(language_code, placement.align_device)
+        hf_token = os.getenv("HF_TOKEN")
+        if hf_token:
+            get_diarize_model(hf_token, placement.diar_device)
+        logger.info(f"Pré-carregamento concluído em {time.perf_counter() - start:.1f}s. {MODEL_REGISTRY.describe()}")
+    except Exception as e:
+        logger.warning(f"Falha no pré-carregamento de modelos (serão carregados sob demanda): {e}")
+
+@worker_process_init.connect
+def _warm_models_on_process_init(**_: Any) -> None:
+    if not WARM_PRELOAD:
+        return
+    # O Celery mata processos cujo init demora mais que alguns segundos, então o carregamento
+    # roda em segundo plano; uma tarefa que chegue antes espera no lock do registro.
+    threading.Thread(target=warm_models, name="warm-models", daemon=True).start()
+
+
+def speaker_bounds(config: Dict[str, Any]) -> Dict[str, int]:
+    """min_speakers/max_speakers para o DiarizationPipeline; valores ausentes ou inválidos são ignorados."""
+    bounds: Dict[str, int] = {}
+    for key, config_key, default in (("min_speakers", "MIN_SPEAKERS", DIARIZE_MIN_SPEAKERS), ("max_speakers", "MAX_SPEAKERS", DIARIZE_MAX_SPEAKERS)):
+        value = config.get(config_key) or default
         try:
-            return json.loads(candidate)
-        except Exception:
-            pass
-    raise ValueError("Não foi possível extrair um JSON válido da resposta do Assistant.")
-
-def run_openai_assistant(vtt_content: str, api_key: str, assistant_id: str, max_wait_s: int = ASSISTANT_MAX_WAIT_S) -> Dict[str, Any]:
-    if not api_key or not assistant_id:
-        raise RuntimeError("Chave da API OpenAI ou ID do Assistente ausentes.")
-
-    client = OpenAI(api_key=api_key)
-    thread = client.beta.threads.create()
-    logger.info(f"Thread criada: {thread.id}")
-
-    prompt = (
-        "Analise a seguinte transcrição de chamada (formato VTT) e RETORNE EXCLUSIVAMENTE um JSON válido, "
-        "sem qualquer texto adicional. Se não puder analisar, retorne um JSON como "
-        '{"erro": "<motivo>"}.\n\n---\n\n'
-        f"{vtt_content}"
+            if value not in (None, ""):
+                bounds[key] = max(1, int(value))
+        except (TypeError, ValueError):
+            logger.warning(f"Valor inválido para {config_key}: {value!r}. Ignorando.")
+    if bounds.get("min_speakers", 0) > bounds.get("max_speakers", float("inf")):
+        logger.warning(f"MIN_SPEAKERS maior que MAX_SPEAKERS ({bounds}). Ignorando os limites.")
+        return {}
+    return bounds
+
+@lru_cache(maxsize=None)
+def accepts_return_embeddings(pipeline_type: type) -> bool:
+    """Se o DiarizationPipeline da versão instalada do WhisperX aceita `return_embeddings`."""
+    try:
+        supported = "return_embeddings" in inspect.signature(pipeline_type.__call__).parameters
+    except (TypeError, ValueError):
+        supported = False
+    if not supported:
+        logger.warning("DiarizationPipeline sem return_embeddings. Perfis de voz desativados nesta versão do WhisperX.")
+    return supported
+
+def diarize_with_embeddings(model: Any, audio: Any, bounds: Dict[str, int], want_embeddings: bool) -> Tuple[Any, Optional[Dict[str, Any]]]:
+    if want_embeddings and accepts_return_embeddings(type(model)):
+        diarize_segments, embeddings = model(audio, return_embeddings=True, **bounds)
+        return diarize_segments, embeddings
+    return model(audio, **bounds), None
+
+def run_diarization(
+    hf_token: str,
+    device: str,
+    audio: Any,
+    checkpoints: Optional[TaskCheckpoints] = None,
+    bounds: Optional[Dict[str, int]] = None,
+    saleswoman_id: Optional[str] = None,
+) -> Any:
+    want_embeddings = VOICE_PROFILES.enabled and bool(saleswoman_id)
+    # inference_mode vale por thread, então precisa ser reativado aqui
+    with torch.inference_mode(), stage_timer("diarize", audio_seconds(audio)):
+        diarize_segments, embeddings = run_with_device_fallback(
+            lambda d: diarize_with_embeddings(get_diarize_model(hf_token, d), audio, bounds or {}, want_embeddings),
+            device, "diarização",
+        )
+    # Com a vendedora reconhecida pela voz, os rótulos passam a ser VENDEDORA/CLIENTE
+    diarize_segments = label_speakers(diarize_segments, VOICE_PROFILES.identify_seller(saleswoman_id, embeddings))
+    if checkpoints is not None:
+        # Só as colunas usadas por assign_word_speakers (a coluna "segment" guarda objetos do pyannote)
+        checkpoints.save("diarize", diarize_segments[["start", "end", "speaker"]].to_dict("records"))
+    return diarize_segments
+
+def start_diarization(
+    hf_token: str,
+    device: str,
+    audio: Any,
+    checkpoints: Optional[TaskCheckpoints] = None,
+    bounds: Optional[Dict[str, int]] = None,
+    saleswoman_id: Optional[str] = None,
+) -> Future:
+    return DIARIZE_EXECUTOR.submit(run_diarization, hf_token, device, audio, checkpoints, bounds, saleswoman_id)
+
+def resumed_diarization(records: List[Dict[str, Any]]) -> Future:
+    future: Future = Future()
+    future.set_result(pd.DataFrame(records, columns=["start", "end", "speaker"]))
+    return future
+
+
+# --- Utilitários ---
+def audio_seconds(audio: Any) -> float:
+    return len(audio) / SAMPLE_RATE
+
+def fail_transcription(webhook_url: str, error_message: str) -> None:
+    METRICS.inc("worker_tasks_total", task="transcription", result="failed")
+    notify_failure(webhook_url, error_message)
+
+def screen_out_silence(webhook_url: str, audio: Any) -> bool:
+    """
+    Mede a fala da gravação com o detector de energia (sem modelos). Abaixo dos limites, envia o
+    webhook NO_SPEECH com as medidas e retorna True para a tarefa parar por aqui.
+    """
+    if SCREEN_MIN_SPEECH_S <= 0 and SCREEN_MIN_SPEECH_RATIO <= 0:
+        return False
+    with stage_timer("screen", audio_seconds(audio)):
+        stats = speech_stats(audio)
+    if stats["speech_s"] >= SCREEN_MIN_SPEECH_S and stats["speech_ratio"] >= SCREEN_MIN_SPEECH_RATIO:
+        return False
+    logger.info(
+        f"Pouca fala detectada ({stats['speech_s']:.1f}s de {stats['duration_s']:.1f}s, "
+        f"{stats['speech_ratio']:.1%}). Encerrando sem transcrição."
     )
-    client.beta.threads.messages.create(thread_id=thread.id, role="user", content=prompt)
-    logger.info("Transcrição enviada à thread do Assistant.")
-
-    run = client.beta.threads.runs.create(thread_id=thread.id, assistant_id=assistant_id, tool_choice="none")
-    logger.info(f"Run iniciada: {run.id} (aguardando conclusão)")
-
-    start = time.time()
-    sleep_s = 2.0
-    terminal_status = {"completed", "failed", "cancelled", "expired"}
-    while True:
-        run = client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
-        status = run.status
-        logger.info(f"Status atual do run: {status}")
-
-        if status in terminal_status:
-            break
-
-        if time.time() - start > max_wait_s:
-            try:
-                client.beta.threads.runs.cancel(thread_id=thread.id, run_id=run.id)
-            except Exception: pass
-            raise TimeoutError(f"Tempo máximo de espera ({max_wait_s}s) excedido para execução do Assistant.")
-
-        time.sleep(sleep_s)
-        sleep_s = min(5.0, sleep_s + 0.5)
-
-    if run.status != "completed":
-        last_error = getattr(run, "last_error", None)
-        reason = getattr(last_error, "message", f"Status final foi '{run.status}'")
-        raise RuntimeError(f"A execução do Assistant falhou. Causa: {reason}")
-    
-    messages = client.beta.threads.messages.list(thread_id=thread.id)
-    assistant_text = next(
-        (part.text.value for m in messages.data if m.role == "assistant" for part in m.content if part.type == "text" and part.text), ""
+    METRICS.inc("worker_tasks_total", task="transcription", result="no_speech")
+    notify_backend(webhook_url, {
+        "status": "NO_SPEECH",
+        "transcription": None,
+        "analysis": {key: round(value, 3) for key, value in stats.items()},
+    })
+    return True
+
+def diarization_fingerprint(bounds: Dict[str, int], saleswoman_id: Optional[str]) -> str:
+    """
+    O que muda a saída da diarização além do áudio: os limites de locutores e, com perfis de voz,
+    a vendedora (que decide os rótulos VENDEDORA/CLIENTE).
+    """
+    seller = saleswoman_id if VOICE_PROFILES.enabled and saleswoman_id else ""
+    return make_key(bounds.get("min_speakers", ""), bounds.get("max_speakers", ""), seller)
+
+def transcription_cache_key(audio_path: str, model_name: str, compute_type: str, language: Optional[str], diarization: str) -> Optional[str]:
+    if not TRANSCRIPTION_CACHE.enabled:
+        return None
+    return make_key(file_sha256(audio_path), model_name, compute_type, language or "auto", diarization)
+
+def task_checkpoints(task_id: str, model_name: str, compute_type: str, language: Optional[str], diarization: str) -> Tuple[TaskCheckpoints, TaskCheckpoints]:
+    """
+    Checkpoints da tarefa e, no mesmo diretório, os da diarização, que só são reaproveitados
+    com os mesmos limites de locutores e vendedora.
+    """
+    checkpoints = TaskCheckpoints(task_id, make_key(model_name, compute_type, language or "auto"))
+    return checkpoints, TaskCheckpoints(task_id, make_key(checkpoints.fingerprint, diarization))
+
+def load_resumable(task_id: str, checkpoints: TaskCheckpoints, diarize_checkpoints: TaskCheckpoints) -> Tuple[Any, Any, Any]:
+    """Transcrição, alinhamento e registros da diarização já salvos (None nas etapas sem checkpoint)."""
+    result_transcribe = checkpoints.load("transcribe")
+    result_aligned = checkpoints.load("align")
+    diarize_records = diarize_checkpoints.load("diarize")
+    resumed = [name for name, data in (("transcribe", result_transcribe), ("align", result_aligned), ("diarize", diarize_records)) if data is not None]
+    if resumed:
+        logger.info(f"Retomando a tarefa {task_id} a partir dos checkpoints: {resumed}")
+    return result_transcribe, result_aligned, diarize_records
+
+def notify_cached_transcription(webhook_url: str, cache_key: Optional[str]) -> bool:
+    """
+    Em caso de acerto no cache, envia direto o webhook TRANSCRIBED e retorna True.
+    """
+    if cache_key is None:
+        return False
+    cached = TRANSCRIPTION_CACHE.get(cache_key)
+    if cached is None:
+        return False
+    logger.info(f"Transcrição encontrada no cache ({cache_key[:12]}). Pulando transcrição, alinhamento e diarização.")
+    METRICS.inc("worker_tasks_total", task="transcription", result="cached")
+    notify_backend(webhook_url, transcribed_payload(cached["vtt"]))
+    return True
+
+def transcribed_payload(vtt_content: str) -> Dict[str, Any]:
+    """
+    Webhook TRANSCRIBED. O VTT também é gravado no volume de uploads compartilhado, para que o
+    backend possa pedir a análise/resumo passando só a referência em vez do texto inteiro.
+    """
+    payload: Dict[str, Any] = {"status": "TRANSCRIBED", "transcription": vtt_content, "analysis": None}
+    try:
+        payload["transcription_ref"] = store_transcript(vtt_content)
+    except OSError as e:
+        logger.warning(f"Não foi possível gravar a transcrição no volume compartilhado: {e}")
+    return payload
+
+def transcribe_audio(model: Any, audio: Any, placement: StagePlacement, model_name: str, language: Optional[str]) -> Dict[str, Any]:
+    return run_with_batch_backoff(
+        lambda batch_size: model.transcribe(audio, batch_size=batch_size, language=language),
+        placement.batch_size_for(model_name),
+        placement.transcribe_device, model_name, placement.compute_type,
     )
-    
-    if not assistant_text:
-        raise RuntimeError("Não foi possível localizar a mensagem do Assistant com conteúdo de texto.")
 
-    analysis_json = extract_json_from_text(assistant_text)
-    logger.info("Análise JSON da IA obtida com sucesso.")
-    return analysis_json
+def transcribe_whole_or_sharded(
+    audio: Any, placement: StagePlacement, model_name: str, language: Optional[str]
+) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """
+    Transcreve a gravação inteira. Em nós só com CPU, gravações longas são divididas em shards
+    transcritos e alinhados em paralelo (ver sharding.py); nesse caso o resultado já alinhado
+    também é retornado, e o alinhamento em finish_transcription é pulado.
+    """
+    duration = audio_seconds(audio)
+    # Cada processo do pool de shards carrega o próprio WhisperX e o modelo de alinhamento
+    shard_memory_mb = whisper_estimate_mb(model_name, placement.compute_type) + _ALIGN_ESTIMATE_MB
+    if should_shard(audio, placement.transcribe_device, shard_memory_mb):
+        try:
+            with stage_timer("transcribe_sharded", duration):
+                result_aligned = transcribe_sharded(
+                    audio, model_name, placement.compute_type, language, placement.batch_size_for(model_name), shard_memory_mb
+                )
+            return {"segments": result_aligned["segments"], "language": result_aligned["language"]}, result_aligned
+        except Exception as e:
+            logger.warning(f"Falha na transcrição em shards, seguindo em um único processo: {e}")
+
+    model = load_whisper_model(model_name, placement.transcribe_device, placement.compute_type)
+    with stage_timer("transcribe", duration):
+        return transcribe_audio(model, audio, placement, model_name, language), None
+
+def align_segments(segments: List[Dict[str, Any]], language_code: str, audio: Any, device: str) -> Dict[str, Any]:
+    def align(d: str) -> Dict[str, Any]:
+        model_a, metadata = get_align_model(language_code, d)
+        return whisperx.align(segments, model_a, metadata, audio, d, return_char_alignments=False)
+    return run_with_device_fallback(align, device, "alinhamento")
+
+def finish_transcription(
+    webhook_url: str,
+    audio: Any,
+    placement: StagePlacement,
+    result_transcribe: Dict[str, Any],
+    diarize_future: Future,
+    cache_key: Optional[str] = None,
+    result_aligned: Optional[Dict[str, Any]] = None,
+    checkpoints: Optional[TaskCheckpoints] = None,
+) -> None:
+    """
+    Etapas posteriores à transcrição (alinhamento, diarização, atribuição de locutores e VTT),
+    compartilhadas pela tarefa individual e pela tarefa em lote. A diarização já foi iniciada
+    em paralelo por `start_diarization`; aqui apenas aguardamos o resultado.
+    """
+    language_code = result_transcribe.get("language", "pt")
+    logger.info(f"Idioma detectado: {language_code}")
+    duration = audio_seconds(audio)
+    if DEVICE == "cuda": torch.cuda.empty_cache()
+
+    if result_aligned is None:
+        logger.info("Etapa 2: Alinhando...")
+        notify_backend(webhook_url, {"status": "ALIGNING"})
+        with stage_timer("align", duration):
+            result_aligned = align_segments(result_transcribe["segments"], language_code, audio, placement.align_device)
+        if checkpoints is not None:
+            checkpoints.save("align", result_aligned)
+        if DEVICE == "cuda": torch.cuda.empty_cache()
+
+    logger.info("Etapa 3: Aguardando diarização...")
+    notify_backend(webhook_url, {"status": "DIARIZING"})
+    # Só o tempo que a diarização ainda segurou o pipeline depois do alinhamento
+    with stage_timer("diarize_wait", duration):
+        diarize_segments = diarize_future.result()
+
+    logger.info("Etapa 4: Atribuindo locutores...")
+    with stage_timer("assign_speakers", duration):
+        result_with_speakers = whisperx.assign_word_speakers(diarize_segments, result_aligned)
+    result_with_speakers["language"] = language_code
+    if DEVICE == "cuda": torch.cuda.empty_cache()
+
+    logger.info("Etapa 5: Gerando VTT...")
+    with stage_timer("vtt", duration):
+        vtt_content = result_to_vtt(result_with_speakers)
+    if cache_key is not None:
+        TRANSCRIPTION_CACHE.set(cache_key, {"vtt": vtt_content})
+
+    logger.info(f"Enviando webhook de transcrição concluída para: {webhook_url}")
+    notify_backend(webhook_url, transcribed_payload(vtt_content))
+    METRICS.inc("worker_tasks_total", task="transcription", result="completed")
+    if checkpoints is not None:
+        checkpoints.clear()
+
+def release_memory() -> None:
+    logger.info(MODEL_REGISTRY.describe())
+    record_peak_memory("audio")
+    gc.collect()
+    if DEVICE == "cuda" and torch.cuda.is_available():
+        torch.cuda.empty_cache()
 
 
 @celery_app.task(name="process_audio_task")
-def process_audio_task(task_id: str, audio_path: str, config: Dict[str, Any]):
+def process_audio_task(task_id: str, audio_path: str, config: Dict[str, Any], saleswoman_id: Optional[str] = None):
     """
     Pipeline que agora realiza APENAS a transcrição, alinhamento e diarização.
     """
     logger.info(f"[Worker Celery] Iniciando TRANSCRIÇÃO | task_id={task_id}")
-    webhook_url = f"{NODE_BACKEND_URL}/api/v1/tasks/{task_id}/complete"
+    webhook_url = webhook_url_for(task_id)
     
     hf_token = config.get("HF_TOKEN")
     whisperx_model_name = config.get("WHISPERX_MODEL", "large-v3")
+    language = config.get("WHISPERX_LANGUAGE") or None
     
-    # Usa o dispositivo global detectado (cuda, mps, cpu) para todos os modelos
-    logger.info(f"Dispositivo de processamento para esta tarefa: {DEVICE}")
+    # Cada etapa usa o dispositivo configurado (DIAR_DEVICE, ALIGN_DEVICE), com fallback para o principal
+    placement = StagePlacement(config)
+    logger.info(f"Dispositivos para esta tarefa: {placement.describe()}")
 
     if not all([hf_token]):
         error_message = "Configuração incompleta: HF_TOKEN não foi fornecido."
@@ -215,102 +419,207 @@ def process_audio_task(task_id: str, audio_path: str, config: Dict[str, Any]):
         notify_backend(webhook_url, {"status": "FAILED", "analysis": {"error": error_message}})
         return
 
-    audio, result_transcribe, result_aligned, diarize_segments, result_with_speakers = None, None, None, None, None
+    result_transcribe, diarize_future = None, None
+    bounds = speaker_bounds(config)
+    diarization = diarization_fingerprint(bounds, saleswoman_id)
+    # Tarefas reentregues (queda ou reciclagem do worker) ou reenviadas por /retry-task retomam daqui
+    prune_stale()
+    checkpoints, diarize_checkpoints = task_checkpoints(task_id, whisperx_model_name, placement.compute_type, language, diarization)
 
     try:
-        model = load_whisper_model(whisperx_model_name, DEVICE, COMPUTE_TYPE_DEFAULT)
-        diarize_model = get_diarize_model(hf_token, DEVICE)
+        cache_key = transcription_cache_key(audio_path, whisperx_model_name, placement.compute_type, language, diarization)
+        if notify_cached_transcription(webhook_url, cache_key):
+            checkpoints.clear()
+            return
+
+        result_transcribe, result_aligned, diarize_records = load_resumable(task_id, checkpoints, diarize_checkpoints)
 
         logger.info(f"Carregando áudio: {audio_path}")
-        with torch.inference_mode():
-            audio = whisperx.load_audio(audio_path)
-
-            logger.info("Etapa 1: Transcrevendo...")
-            notify_backend(webhook_url, {"status": "TRANSCRIBING"})
-            result_transcribe = model.transcribe(audio, batch_size=BATCH_SIZE)
-            language_code = result_transcribe.get("language", "pt")
-            logger.info(f"Idioma detectado: {language_code}")
-            if DEVICE == "cuda": torch.cuda.empty_cache()
-
-            logger.info("Etapa 2: Alinhando...")
-            notify_backend(webhook_url, {"status": "ALIGNING"})
-            model_a, metadata = get_align_model(language_code, DEVICE)
-            result_aligned = whisperx.align(result_transcribe["segments"], model_a, metadata, audio, DEVICE, return_char_alignments=False)
-            if DEVICE == "cuda": torch.cuda.empty_cache()
-
-            logger.info("Etapa 3: Diarizando...")
-            notify_backend(webhook_url, {"status": "DIARIZING"})
-            diarize_segments = diarize_model(audio)
-            
-            logger.info("Etapa 4: Atribuindo locutores...")
-            result_with_speakers = whisperx.assign_word_speakers(diarize_segments, result_aligned)
-            result_with_speakers["language"] = language_code
-            if DEVICE == "cuda": torch.cuda.empty_cache()
-
-            logger.info("Etapa 5: Gerando VTT...")
-            vtt_content = generate_vtt(result_with_speakers, audio_path)
-
-        payload = {
-            "status": "TRANSCRIBED",
-            "transcription": vtt_content,
-            "analysis": None
-        }
-        logger.info(f"Enviando webhook de transcrição concluída para: {webhook_url}")
-        notify_backend(webhook_url, payload)
+        with torch.inference_mode(), open_audio(audio_path) as audio:
+            METRICS.observe("worker_audio_duration_seconds", audio_seconds(audio))
+            if result_transcribe is None and screen_out_silence(webhook_url, audio):
+                return
+            if diarize_records is not None:
+                diarize_future = resumed_diarization(diarize_records)
+            else:
+                diarize_future = start_diarization(
+                    hf_token, placement.diar_device, audio, diarize_checkpoints, bounds, saleswoman_id
+                )
+
+            if result_transcribe is not None:
+                logger.info("Etapa 1: Transcrição retomada do checkpoint.")
+            else:
+                logger.info("Etapa 1: Transcrevendo...")
+                notify_backend(webhook_url, {"status": "TRANSCRIBING"})
+                result_transcribe, result_aligned = transcribe_whole_or_sharded(audio, placement, whisperx_model_name, language)
+                checkpoints.save("transcribe", result_transcribe)
+                if result_aligned is not None:
+                    checkpoints.save("align", result_aligned)
+
+            finish_transcription(webhook_url, audio, placement, result_transcribe, diarize_future, cache_key, result_aligned, checkpoints)
 
     except Exception as e:
-        full_traceback = traceback.format_exc()
-        error_message = f"Erro ao transcrever a tarefa {task_id}: {e}"
-        logger.error(error_message)
-        logger.error("Stack Trace completo:\n" + full_traceback)
-        notify_backend(webhook_url, {"status": "FAILED", "analysis": {"error": error_message, "traceback": full_traceback}})
+        fail_transcription(webhook_url, f"Erro ao transcrever a tarefa {task_id}: {e}")
 
     finally:
         logger.info(f"[Worker Celery] Limpando memória para a tarefa de transcrição {task_id}...")
-        if audio is not None: del audio
+        # Em caso de erro, a diarização pode ainda estar rodando; a próxima tarefa espera por ela
+        if diarize_future is not None: wait([diarize_future])
         if result_transcribe is not None: del result_transcribe
-        if result_aligned is not None: del result_aligned
-        if diarize_segments is not None: del diarize_segments
-        if result_with_speakers is not None: del result_with_speakers
         
-        gc.collect()
-        if DEVICE == "cuda" and torch.cuda.is_available():
-            torch.cuda.empty_cache()
+        release_memory()
         logger.info(f"[Worker Celery] Finalizado processamento de transcrição | task_id={task_id}")
 
-@celery_app.task(name="analyze_task")
-def analyze_task(task_id: str, transcription: str, config: Dict[str, Any]):
+@celery_app.task(name="process_next_audio_task", bind=True)
+def process_next_audio_task(self):
     """
-    Recebe uma transcrição e realiza apenas a análise com IA.
+    Token da fila de prioridade (ver audio_scheduler.py): processa a tarefa pendente de menor
+    custo no momento em que o worker fica livre, e não a que chegou primeiro.
     """
-    logger.info(f"[Worker Celery] Iniciando ANÁLISE DE IA | task_id={task_id}")
-    webhook_url = f"{NODE_BACKEND_URL}/api/v1/tasks/{task_id}/complete"
-    
-    openai_api_key = config.get("OPENAI_API_KEY")
-    openai_assistant_id = config.get("OPENAI_ASSISTANT_ID")
+    job = AUDIO_SCHEDULER.claim(self.request.id)
+    if job is None:
+        logger.info("[Worker Celery] Nenhuma tarefa pendente na fila de prioridade.")
+        return
+    wait_s = time.time() - job["enqueued_at"]
+    METRICS.observe("worker_audio_queue_wait_seconds", wait_s)
+    logger.info(f"[Worker Celery] Tarefa {job['task_id']} retirada da fila de prioridade após {wait_s:.0f}s (duração estimada: {job.get('duration_s')}s)")
+    try:
+        process_audio_task(job["task_id"], job["file_path"], job["config"], job.get("saleswoman_id") or None)
+    finally:
+        AUDIO_SCHEDULER.release(self.request.id, job)
+
+def close_batch_audio(entry: Dict[str, Any]) -> None:
+    """Fecha o áudio de um arquivo do lote, depois que a diarização dele terminar de lê-lo."""
+    future = entry.get("diarize_future")
+    if future is not None:
+        wait([future])
+    entry.pop("audio", None)
+    stack = entry.pop("audio_stack", None)
+    if stack is not None:
+        stack.close()
+
+@celery_app.task(name="process_audio_batch_task")
+def process_audio_batch_task(items: List[Dict[str, Any]], config: Dict[str, Any]):
+    """
+    Transcreve vários arquivos de uma vez, agrupando os chunks de VAD de todos eles em lotes
+    de inferência compartilhados. Cada arquivo segue depois para alinhamento e diarização
+    individualmente e é reportado pelo seu próprio webhook. Os checkpoints são por arquivo:
+    um lote reentregue só retranscreve os arquivos sem checkpoint de transcrição.
+    """
+    task_ids = [item["task_id"] for item in items]
+    logger.info(f"[Worker Celery] Iniciando TRANSCRIÇÃO EM LOTE | task_ids={task_ids}")
 
-    if not all([openai_api_key, openai_assistant_id]):
-        error_message = "Configuração incompleta para análise: Chave da API OpenAI ou ID do assistente ausentes."
+    hf_token = config.get("HF_TOKEN")
+    whisperx_model_name = config.get("WHISPERX_MODEL", "large-v3")
+    language = config.get("WHISPERX_LANGUAGE") or None
+    placement = StagePlacement(config)
+    bounds = speaker_bounds(config)
+    logger.info(f"Dispositivos para este lote: {placement.describe()}")
+
+    if not all([hf_token]):
+        error_message = "Configuração incompleta: HF_TOKEN não foi fornecido."
         logger.error(error_message)
-        notify_backend(webhook_url, {"status": "FAILED", "analysis": {"error": error_message}})
+        for task_id in task_ids:
+            notify_backend(webhook_url_for(task_id), {"status": "FAILED", "analysis": {"error": error_message}})
         return
-    
-    try:
-        logger.info("Etapa 1: Enviando transcrição ao OpenAI Assistant...")
-        analysis_result_json = run_openai_assistant(transcription, openai_api_key, openai_assistant_id)
 
-        payload = {
-            "status": "COMPLETED",
-            "analysis": json.dumps(analysis_result_json, ensure_ascii=False),
-        }
-        logger.info(f"Enviando webhook de ANÁLISE concluída para: {webhook_url}")
-        notify_backend(webhook_url, payload)
+    prune_stale()
+    pending: List[Dict[str, Any]] = []
+    for item in items:
+        webhook_url = webhook_url_for(item["task_id"])
+        if not os.path.exists(item["file_path"]):
+            error_message = f"Arquivo de áudio não encontrado: {item['file_path']}"
+            logger.error(error_message)
+            notify_backend(webhook_url, {"status": "FAILED", "analysis": {"error": error_message}})
+            continue
+        diarization = diarization_fingerprint(bounds, item.get("saleswoman_id"))
+        checkpoints, diarize_checkpoints = task_checkpoints(item["task_id"], whisperx_model_name, placement.compute_type, language, diarization)
+        try:
+            cache_key = transcription_cache_key(item["file_path"], whisperx_model_name, placement.compute_type, language, diarization)
+            if notify_cached_transcription(webhook_url, cache_key):
+                checkpoints.clear()
+                continue
+        except Exception as e:
+            fail_transcription(webhook_url, f"Erro ao consultar o cache da tarefa {item['task_id']}: {e}")
+            continue
+        result_transcribe, result_aligned, diarize_records = load_resumable(item["task_id"], checkpoints, diarize_checkpoints)
+        pending.append({
+            "task_id": item["task_id"], "file_path": item["file_path"], "saleswoman_id": item.get("saleswoman_id"),
+            "webhook_url": webhook_url, "cache_key": cache_key,
+            "checkpoints": checkpoints, "diarize_checkpoints": diarize_checkpoints,
+            "result_transcribe": result_transcribe, "result_aligned": result_aligned, "diarize_records": diarize_records,
+        })
+
+    if not pending:
+        return
+
+    try:
+        with torch.inference_mode():
+            for entry in pending:
+                logger.info(f"Carregando áudio: {entry['file_path']}")
+                entry["audio_stack"] = ExitStack()
+                entry["audio"] = entry["audio_stack"].enter_context(open_audio(entry["file_path"]))
+                METRICS.observe("worker_audio_duration_seconds", audio_seconds(entry["audio"]))
+                if entry["result_transcribe"] is None and screen_out_silence(entry["webhook_url"], entry["audio"]):
+                    entry["done"] = True
+                    close_batch_audio(entry)
+                    continue
+                if entry["diarize_records"] is not None:
+                    entry["diarize_future"] = resumed_diarization(entry["diarize_records"])
+                else:
+                    entry["diarize_future"] = start_diarization(
+                        hf_token, placement.diar_device, entry["audio"], entry["diarize_checkpoints"], bounds, entry["saleswoman_id"]
+                    )
+            pending[:] = [entry for entry in pending if not entry.get("done")]
+            if not pending:
+                return
+
+            to_transcribe = [entry for entry in pending if entry["result_transcribe"] is None]
+            if to_transcribe:
+                # Só carrega o modelo depois da triagem, para um lote só de gravações vazias não pagar por ele
+                model = load_whisper_model(whisperx_model_name, placement.transcribe_device, placement.compute_type)
+
+                logger.info(f"Etapa 1: Transcrevendo o lote ({len(to_transcribe)} de {len(pending)} arquivo(s) sem checkpoint)...")
+                for entry in to_transcribe:
+                    notify_backend(entry["webhook_url"], {"status": "TRANSCRIBING"})
+                audios = [entry["audio"] for entry in to_transcribe]
+                with stage_timer("transcribe_batch", sum(audio_seconds(a) for a in audios)):
+                    results = run_with_batch_backoff(
+                        lambda batch_size: transcribe_batch(model, audios, batch_size, language=language),
+                        placement.batch_size_for(whisperx_model_name),
+                        placement.transcribe_device, whisperx_model_name, placement.compute_type,
+                    )
+                audios.clear()
+                for entry, result_transcribe in zip(to_transcribe, results):
+                    entry["result_transcribe"] = result_transcribe
+                    entry["checkpoints"].save("transcribe", result_transcribe)
+            else:
+                logger.info("Etapa 1: Transcrição de todo o lote retomada dos checkpoints.")
+
+            for entry in pending:
+                try:
+                    finish_transcription(
+                        entry["webhook_url"], entry["audio"], placement, entry.pop("result_transcribe"), entry["diarize_future"],
+                        entry["cache_key"], entry.pop("result_aligned"), entry["checkpoints"],
+                    )
+                except Exception as e:
+                    fail_transcription(entry["webhook_url"], f"Erro ao transcrever a tarefa {entry['task_id']}: {e}")
+                finally:
+                    entry["done"] = True
+                    # `audios` já foi esvaziada: fechar o contexto do arquivo remove o PCM temporário
+                    # e solta a última referência ao memmap, sem esperar o restante do lote
+                    close_batch_audio(entry)
 
     except Exception as e:
-        full_traceback = traceback.format_exc()
-        error_message = f"Erro ao analisar a tarefa {task_id}: {e}"
-        logger.error(error_message)
-        logger.error("Stack Trace completo:\n" + full_traceback)
-        notify_backend(webhook_url, {"status": "FAILED", "analysis": {"error": error_message, "traceback": full_traceback}})
+        # Falha no carregamento ou na transcrição compartilhada
+        for entry in pending:
+            if not entry.get("done"):
+                fail_transcription(entry["webhook_url"], f"Erro ao transcrever o lote da tarefa {entry['task_id']}: {e}")
+
     finally:
-        logger.info(f"[Worker Celery] Finalizado processamento de análise | task_id={task_id}")
\ No newline at end of file
+        logger.info(f"[Worker Celery] Limpando memória do lote {task_ids}...")
+        for entry in pending:
+            close_batch_audio(entry)
+        pending.clear()
+        release_memory()
+        logger.info(f"[Worker Celery] Finalizado processamento do lote | task_ids={task_ids}")
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Os módulos do worker ficam na raiz de worker-python (layout plano, sem pacote)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Os testes não dependem de um Redis rodando; métricas ficam só no processo
+os.environ.setdefault("METRICS_BACKEND", "memory")
@@ -0,0 +1,79 @@
+import pytest
+
+import audio_scheduler
+
+
+def test_cost_delay_grows_with_duration_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr(audio_scheduler, "SCHED_DURATION_WEIGHT", 0.5)
+    monkeypatch.setattr(audio_scheduler, "SCHED_MAX_DELAY_S", 1800)
+    monkeypatch.setattr(audio_scheduler, "SCHED_DEFAULT_DURATION_S", 600)
+    assert audio_scheduler.cost_delay(60) == 30
+    assert audio_scheduler.cost_delay(7200) == 1800
+    assert audio_scheduler.cost_delay(None) == 300
+    assert audio_scheduler.cost_delay(-5) == 0
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    monkeypatch.setattr(audio_scheduler, "SCHED_DURATION_WEIGHT", 0.5)
+    monkeypatch.setattr(audio_scheduler, "SCHED_MAX_DELAY_S", 1800)
+    monkeypatch.setattr(audio_scheduler, "SCHED_FAIRNESS_S", 120)
+    monkeypatch.setattr(audio_scheduler.time, "time", lambda: 1000.0)
+    scheduler = audio_scheduler.AudioScheduler("redis://unused", "test_scheduler")
+    client = fakeredis.FakeRedis()
+    scheduler._client = client
+    scheduler._scripts = {
+        "enqueue": client.register_script(audio_scheduler._ENQUEUE_SCRIPT),
+        "claim": client.register_script(audio_scheduler._CLAIM_SCRIPT),
+        "release": client.register_script(audio_scheduler._RELEASE_SCRIPT),
+    }
+    return scheduler
+
+
+def test_short_calls_are_claimed_before_long_ones(scheduler):
+    scheduler.enqueue("long", "/a.mp3", {}, "ana", 3600)
+    scheduler.enqueue("short", "/b.mp3", {}, "bia", 60)
+    assert scheduler.claim("token-1")["task_id"] == "short"
+    assert scheduler.claim("token-2")["task_id"] == "long"
+    assert scheduler.claim("token-3") is None
+
+
+def test_saleswoman_backlog_delays_her_next_tasks(scheduler):
+    first, _ = scheduler.enqueue("ana-1", "/a.mp3", {}, "ana", 60)
+    second, _ = scheduler.enqueue("ana-2", "/b.mp3", {}, "ana", 60)
+    assert second - first == pytest.approx(120)
+
+
+def test_tasks_without_saleswoman_skip_the_fairness_term(scheduler):
+    first, _ = scheduler.enqueue("t1", "/a.mp3", {}, None, 60)
+    second, _ = scheduler.enqueue("t2", "/b.mp3", {}, "", 60)
+    assert second == first
+    assert scheduler._client.hgetall(scheduler.backlog_key) == {}
+
+
+def test_redelivered_token_gets_the_same_job_and_release_clears_backlog(scheduler):
+    scheduler.enqueue("t1", "/a.mp3", {}, "ana", 60)
+    job = scheduler.claim("token-1")
+    assert scheduler.claim("token-1") == job
+    scheduler.release("token-1", job)
+    assert scheduler._client.hgetall(scheduler.backlog_key) == {}
+    assert scheduler._client.hgetall(scheduler.inflight_key) == {}
+
+
+def test_discard_undoes_an_enqueue(scheduler):
+    scheduler.enqueue("t1", "/a.mp3", {}, "ana", 60)
+    scheduler.discard("t1", "ana")
+    assert scheduler.claim("token-1") is None
+    assert scheduler._client.hgetall(scheduler.backlog_key) == {}
+
+
+def test_enqueue_reports_whether_it_created_the_entry(scheduler):
+    score, created = scheduler.enqueue("t1", "/a.mp3", {}, "ana", 60)
+    assert created
+    again, created_again = scheduler.enqueue("t1", "/a.mp3", {}, "ana", 600)
+    assert not created_again
+    assert again == score
+    # O envio repetido não conta de novo no backlog da vendedora
+    assert scheduler._client.hgetall(scheduler.backlog_key) == {b"ana": b"1"}
@@ -0,0 +1,64 @@
+import os
+import time
+
+import pytest
+
+import checkpoints
+
+
+@pytest.fixture(autouse=True)
+def checkpoint_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpoints, "CHECKPOINT_DIR", str(tmp_path))
+    monkeypatch.setattr(checkpoints, "CHECKPOINTS_ENABLED", True)
+    return tmp_path
+
+
+def test_saved_stage_round_trips_and_is_listed_in_pipeline_order():
+    task = checkpoints.TaskCheckpoints("task-1", "large-v3|float16|pt")
+    task.save("diarize", [{"start": 0.0, "end": 1.5, "speaker": "VENDEDORA"}])
+    task.save("transcribe", {"segments": [{"text": "olá", "start": 0.0, "end": 1.5}], "language": "pt"})
+    assert task.load("transcribe")["segments"][0]["text"] == "olá"
+    assert checkpoints.saved_stages("task-1") == ["transcribe", "diarize"]
+
+
+def test_checkpoint_from_another_configuration_is_ignored():
+    checkpoints.TaskCheckpoints("task-1", "large-v3").save("transcribe", {"segments": []})
+    assert checkpoints.TaskCheckpoints("task-1", "medium").load("transcribe") is None
+
+
+def test_numpy_scalars_are_serialized():
+    np = pytest.importorskip("numpy")
+    task = checkpoints.TaskCheckpoints("task-1", "fp")
+    task.save("align", {"score": np.float32(0.5)})
+    assert task.load("align") == {"score": 0.5}
+
+
+def test_corrupted_checkpoint_is_ignored(checkpoint_dir):
+    task = checkpoints.TaskCheckpoints("task-1", "fp")
+    task.save("transcribe", {"segments": []})
+    (checkpoint_dir / "task-1" / "transcribe.json.gz").write_bytes(b"not gzip")
+    assert task.load("transcribe") is None
+
+
+def test_unsafe_task_id_never_touches_the_filesystem(checkpoint_dir):
+    task = checkpoints.TaskCheckpoints("../fora", "fp")
+    task.save("transcribe", {"segments": []})
+    assert task.load("transcribe") is None
+    assert checkpoints.saved_stages("../fora") == []
+    assert list(checkpoint_dir.iterdir()) == []
+
+
+def test_clear_and_prune_stale(checkpoint_dir):
+    fresh = checkpoints.TaskCheckpoints("fresh", "fp")
+    fresh.save("transcribe", {})
+    stale = checkpoints.TaskCheckpoints("stale", "fp")
+    stale.save("transcribe", {})
+    old = time.time() - 10 * 3600
+    os.utime(checkpoint_dir / "stale", (old, old))
+
+    checkpoints.prune_stale(max_age_hours=1)
+    assert checkpoints.saved_stages("stale") == []
+    assert checkpoints.saved_stages("fresh") == ["transcribe"]
+
+    fresh.clear()
+    assert checkpoints.saved_stages("fresh") == []
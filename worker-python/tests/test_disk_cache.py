@@ -0,0 +1,83 @@
+import gzip
+import os
+import time
+
+import pytest
+
+from disk_cache import DiskCache, file_sha256, make_key
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DiskCache("test", 1024 * 1024, directory=str(tmp_path))
+
+
+def test_round_trip_and_miss(cache):
+    key = make_key("abc", "large-v3", "float16", "pt")
+    assert cache.get(key) is None
+    cache.set(key, {"vtt": "WEBVTT\n\nolá"})
+    assert cache.get(key) == {"vtt": "WEBVTT\n\nolá"}
+
+
+def test_make_key_depends_on_every_part():
+    assert make_key("a", "b") != make_key("a", "c")
+    assert make_key("a", "b") != make_key("ab")
+
+
+def test_file_sha256_matches_content(tmp_path):
+    path = tmp_path / "audio.bin"
+    path.write_bytes(b"\x00\x01" * 1000)
+    other = tmp_path / "copy.bin"
+    other.write_bytes(b"\x00\x01" * 1000)
+    assert file_sha256(str(path)) == file_sha256(str(other))
+
+
+def test_corrupted_entry_is_discarded(cache):
+    key = make_key("corrupted")
+    cache.set(key, {"vtt": "x"})
+    with open(cache._path(key), "wb") as f:
+        f.write(b"not gzip")
+    assert cache.get(key) is None
+    assert not os.path.exists(cache._path(key))
+
+
+def test_entries_expire_after_ttl(tmp_path):
+    cache = DiskCache("ttl", 1024 * 1024, directory=str(tmp_path), ttl_s=60)
+    key = make_key("ttl")
+    cache.set(key, {"analysis": 1})
+    assert cache.get(key) == {"analysis": 1}
+
+    with gzip.open(cache._path(key), "rt", encoding="utf-8") as f:
+        assert "created_at" in f.read()
+    cache.ttl_s = 0.001
+    time.sleep(0.01)
+    assert cache.get(key) is None
+    assert not os.path.exists(cache._path(key))
+
+
+def test_least_recently_used_entries_are_evicted_over_size(tmp_path):
+    payload = os.urandom(20_000).hex()
+    probe = DiskCache("probe", 1024 * 1024, directory=str(tmp_path / "probe"))
+    probe.set("0" * 64, {"v": payload})
+    entry_size = os.path.getsize(probe._path("0" * 64))
+
+    cache = DiskCache("lru", int(entry_size * 2.5), directory=str(tmp_path / "lru"))
+    keys = [make_key(i) for i in range(3)]
+    cache.set(keys[0], {"v": payload})
+    cache.set(keys[1], {"v": payload})
+    old = time.time() - 100
+    os.utime(cache._path(keys[1]), (old, old))
+    os.utime(cache._path(keys[0]), (old + 10, old + 10))
+    cache.set(keys[2], {"v": payload})
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[2]) is not None
+
+
+def test_zero_size_disables_the_cache(tmp_path):
+    cache = DiskCache("off", 0, directory=str(tmp_path))
+    assert not cache.enabled
+    cache.set(make_key("x"), {"v": 1})
+    assert cache.get(make_key("x")) is None
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,56 @@
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def server(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    redis = pytest.importorskip("redis")
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.Redis, "from_url", classmethod(lambda cls, url, **kwargs: fakeredis.FakeRedis(server=server)))
+    return server
+
+
+def test_memory_backend_renders_counters_and_histograms():
+    m = metrics.Metrics("memory")
+    m.inc("worker_tasks_total", task="transcription", result="done")
+    m.observe("worker_model_load_seconds", 3.0)
+    text = m.render()
+    assert 'worker_tasks_total{result="done",task="transcription"} 1' in text
+    assert 'worker_model_load_seconds_bucket{le="2.5"} 0' in text
+    assert 'worker_model_load_seconds_bucket{le="5"} 1' in text
+    assert "worker_model_load_seconds_count 1" in text
+
+
+def server_client(server):
+    import fakeredis
+
+    return fakeredis.FakeRedis(server=server)
+
+
+def test_redis_backend_buffers_until_flush(server):
+    m = metrics.Metrics("redis")
+    m.inc("worker_tasks_total", task="analysis", result="done")
+    m.inc("worker_tasks_total", task="analysis", result="done")
+    m.set_max("worker_peak_rss_bytes", 10, component="api")
+    m.set_max("worker_peak_rss_bytes", 5, component="api")
+    client = server_client(server)
+    assert client.hgetall(f"{metrics.METRICS_PREFIX}:worker_tasks_total") == {}
+
+    m._get_store().flush()
+    assert float(client.hget(f"{metrics.METRICS_PREFIX}:worker_tasks_total", 'result="done",task="analysis"')) == 2
+    assert float(client.hget(f"{metrics.METRICS_PREFIX}:worker_peak_rss_bytes", 'component="api"')) == 10
+
+
+def test_failed_flush_keeps_values_for_the_next_attempt(server):
+    m = metrics.Metrics("redis")
+    m.inc("worker_tasks_total", task="analysis", result="done")
+    store = m._get_store()
+    server.connected = False
+    store.flush()
+    assert store._failing
+    server.connected = True
+    m.inc("worker_tasks_total", task="analysis", result="done")
+    assert m.snapshot()["worker_tasks_total"]['result="done",task="analysis"'] == 2
+    assert not store._failing
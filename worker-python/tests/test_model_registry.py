@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+pytest.importorskip("torch")
+
+import metrics  # noqa: E402
+import model_registry  # noqa: E402
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(model_registry, "METRICS", metrics.Metrics("memory"))
+    return model_registry.ModelRegistry(budget_mb=0)
+
+
+def test_same_model_is_loaded_once_by_concurrent_callers(registry):
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        release.wait(5)
+        return object()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get("a", loader, 1, "a"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(calls) == 1
+    assert len(results) == 4 and all(result is results[0] for result in results)
+
+
+def test_other_models_load_while_one_is_loading(registry):
+    other_loaded = threading.Event()
+
+    def slow_loader():
+        # Só termina se a carga de "b" não ficar presa atrás desta
+        assert other_loaded.wait(5)
+        return "a"
+
+    thread = threading.Thread(target=registry.get, args=("a", slow_loader, 1, "a"))
+    thread.start()
+    assert registry.get("b", lambda: "b", 1, "b") == "b"
+    other_loaded.set()
+    thread.join(5)
+    assert registry.stats()["loads"] == 2
+
+
+def test_failed_load_lets_the_next_caller_retry(registry):
+    def broken():
+        raise RuntimeError("sem memória")
+
+    with pytest.raises(RuntimeError):
+        registry.get("a", broken, 1, "a")
+    assert registry.get("a", lambda: "ok", 1, "a") == "ok"
+
+
+def test_least_recently_used_model_is_evicted_over_budget(monkeypatch):
+    monkeypatch.setattr(model_registry, "METRICS", metrics.Metrics("memory"))
+    monkeypatch.setattr(model_registry, "_memory_snapshot", lambda: {"rss": None, "gpu": None})
+    registry = model_registry.ModelRegistry(budget_mb=100)
+    registry.get("a", lambda: "a", 60, "a")
+    registry.get("b", lambda: "b", 60, "b")
+    assert registry.stats()["models"] == ["b"]
@@ -0,0 +1,130 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("celery")
+
+import metrics  # noqa: E402
+import notifier  # noqa: E402
+
+
+class Backend:
+    """Backend falso: registra os PATCH recebidos e responde com os status da fila `replies`."""
+
+    def __init__(self):
+        self.received = []
+        self.replies = []
+        self.gate = threading.Event()
+        self.gate.set()
+        backend = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_PATCH(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                backend.gate.wait(5)
+                backend.received.append(json.loads(body)["status"])
+                status = backend.replies.pop(0) if backend.replies else 200
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/tasks/t1/status"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def backend():
+    backend = Backend()
+    yield backend
+    backend.gate.set()
+    backend.server.shutdown()
+
+
+@pytest.fixture
+def outbox(tmp_path, monkeypatch):
+    monkeypatch.setattr(notifier, "WEBHOOK_RETRY_MAX_DELAY_S", 0.05)
+    return tmp_path
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def test_pending_progress_updates_are_coalesced(backend, outbox):
+    n = notifier.WebhookNotifier(str(outbox))
+    backend.gate.clear()
+    n.notify(backend.url, {"status": "TRANSCRIBING"})
+    assert wait_until(lambda: n._inflight is not None)
+    n.notify(backend.url, {"status": "ALIGNING"})
+    n.notify(backend.url, {"status": "DIARIZING"})
+    backend.gate.set()
+    assert n.flush(5)
+    assert backend.received == ["TRANSCRIBING", "DIARIZING"]
+
+
+def test_terminal_status_drops_pending_progress(backend, outbox):
+    n = notifier.WebhookNotifier(str(outbox))
+    backend.gate.clear()
+    n.notify(backend.url, {"status": "TRANSCRIBING"})
+    assert wait_until(lambda: n._inflight is not None)
+    n.notify(backend.url, {"status": "ALIGNING"})
+    n.notify(backend.url, {"status": "TRANSCRIBED", "transcription": "WEBVTT"})
+    backend.gate.set()
+    assert n.flush(5)
+    assert backend.received == ["TRANSCRIBING", "TRANSCRIBED"]
+
+
+def test_terminal_status_is_retried_and_removed_from_outbox(backend, outbox):
+    backend.replies = [503, 503]
+    n = notifier.WebhookNotifier(str(outbox))
+    n.notify(backend.url, {"status": "COMPLETED"})
+    assert n.flush(5)
+    assert backend.received == ["COMPLETED"] * 3
+    assert list(outbox.iterdir()) == []
+
+
+def test_rejected_terminal_status_goes_to_dead_letter(backend, outbox, monkeypatch):
+    monkeypatch.setattr(notifier, "METRICS", metrics.Metrics("memory"))
+    backend.replies = [404]
+    n = notifier.WebhookNotifier(str(outbox))
+    n.notify(backend.url, {"status": "FAILED"})
+    assert n.flush(5)
+    assert backend.received == ["FAILED"]
+    assert [p.suffix for p in outbox.iterdir()] == [".dead"]
+    assert notifier.METRICS.snapshot()["worker_webhook_dead_letters_total"] == {"": 1.0}
+
+
+def test_dead_letters_older_than_retention_are_pruned(outbox, monkeypatch):
+    monkeypatch.setattr(notifier, "WEBHOOK_DEAD_RETENTION_DAYS", 7)
+    old = outbox / "1.000000-old.dead"
+    recent = outbox / "2.000000-recent.dead"
+    for path in (old, recent):
+        path.write_text("{}")
+    stale = time.time() - 8 * 86400
+    os.utime(old, (stale, stale))
+
+    n = notifier.WebhookNotifier(str(outbox))
+    n._ensure_started()
+    assert wait_until(lambda: not old.exists())
+    assert recent.exists()
+
+
+def test_orphaned_outbox_entry_is_delivered(backend, outbox):
+    (outbox / "1.000000-orphan.json").write_text(json.dumps({"url": backend.url, "payload": {"status": "NO_SPEECH"}}))
+    n = notifier.WebhookNotifier(str(outbox))
+    n._ensure_started()
+    assert wait_until(lambda: backend.received == ["NO_SPEECH"])
+    assert wait_until(lambda: list(outbox.iterdir()) == [])
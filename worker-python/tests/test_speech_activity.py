@@ -0,0 +1,47 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import speech_activity  # noqa: E402
+from audio_source import SAMPLE_RATE  # noqa: E402
+
+
+def tone(seconds, amplitude, syllable_hz=4.0):
+    """Tom de 200 Hz modulado no ritmo das sílabas, como fala contínua sem pausas."""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    envelope = 0.6 + 0.4 * np.sin(2 * np.pi * syllable_hz * t)
+    return (amplitude * envelope * np.sin(2 * np.pi * 200 * t)).astype(np.float32)
+
+
+def silence(seconds, noise=1e-4):
+    rng = np.random.default_rng(0)
+    return (noise * rng.standard_normal(int(seconds * SAMPLE_RATE))).astype(np.float32)
+
+
+def test_continuous_speech_counts_as_speech():
+    stats = speech_activity.speech_stats(tone(30, 0.2))
+    assert stats["duration_s"] == pytest.approx(30)
+    assert stats["speech_ratio"] > 0.9
+
+
+def test_near_silent_recording_has_no_speech():
+    stats = speech_activity.speech_stats(silence(30))
+    assert stats["speech_s"] < 1.0
+
+
+def test_quiet_speech_over_quiet_background_uses_relative_threshold():
+    audio = np.concatenate([silence(10, noise=1e-4), tone(10, 0.02), silence(10, noise=1e-4)])
+    stats = speech_activity.speech_stats(audio)
+    assert 8.0 < stats["speech_s"] < 11.0
+
+
+def test_split_points_fall_inside_pauses():
+    audio = np.concatenate([tone(29, 0.2), silence(2), tone(29, 0.2)])
+    points = speech_activity.split_points(audio, 2)
+    assert len(points) == 1
+    assert 29.0 <= points[0] <= 31.0
+
+
+def test_silence_runs_respects_minimum_length():
+    mask = np.array([True, False, False, True, False, False, False, True])
+    assert speech_activity.silence_runs(mask, 3) == [(4, 7)]
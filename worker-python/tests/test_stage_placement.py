@@ -0,0 +1,17 @@
+import pytest
+
+pytest.importorskip("torch")
+
+import stage_placement  # noqa: E402
+
+
+def test_batch_size_from_config_is_used():
+    assert stage_placement.StagePlacement({"WHISPERX_BATCH_SIZE": "8"}).max_batch_size == 8
+    assert stage_placement.StagePlacement({"WHISPERX_BATCH_SIZE": 0}).max_batch_size == stage_placement.BATCH_SIZE_MAX
+    assert stage_placement.StagePlacement({"WHISPERX_BATCH_SIZE": "-3"}).max_batch_size == 1
+
+
+@pytest.mark.parametrize("value", ["abc", "8.5", " "])
+def test_invalid_batch_size_falls_back_to_the_default(value):
+    placement = stage_placement.StagePlacement({"WHISPERX_BATCH_SIZE": value})
+    assert placement.max_batch_size == stage_placement.BATCH_SIZE_MAX
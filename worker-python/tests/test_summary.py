@@ -0,0 +1,46 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openai")
+
+import summary  # noqa: E402
+from disk_cache import DiskCache  # noqa: E402
+
+
+class FakeCompletions:
+    def __init__(self, replies):
+        self.replies = replies
+        self.prompts = []
+
+    async def create(self, model, messages):
+        self.prompts.append(messages[-1]["content"])
+        content = self.replies(messages[-1]["content"])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(summary, "DIGEST_CACHE", DiskCache("summary_digests", 1024 * 1024, directory=str(tmp_path)))
+    fake = SimpleNamespace(chat=SimpleNamespace(completions=None))
+    monkeypatch.setattr(summary, "get_client", lambda api_key: fake)
+    return fake
+
+
+def test_all_calls_ignored_raises_no_sales_calls(client):
+    client.chat.completions = FakeCompletions(lambda prompt: summary.IGNORE_MARKER)
+    with pytest.raises(summary.NoSalesCallsError):
+        asyncio.run(summary.generate_consolidated_summary("key", "Ana", ["oi", "alô"]))
+
+
+def test_digests_are_cached_between_summaries(client):
+    completions = client.chat.completions = FakeCompletions(lambda prompt: "RESUMO FINAL" if "sintetizar" in prompt else "digest")
+    assert asyncio.run(summary.generate_consolidated_summary("key", "Ana", ["ligação 1"])) == "RESUMO FINAL"
+    assert len(completions.prompts) == 2
+
+    completions.prompts.clear()
+    asyncio.run(summary.generate_consolidated_summary("key", "Ana", ["ligação 1", "ligação 2"]))
+    # Só a ligação nova é condensada, mais o reduce
+    assert len(completions.prompts) == 2
+    assert "ligação 2" in completions.prompts[0]
@@ -0,0 +1,50 @@
+from transcript_format import format_timestamp, result_to_vtt
+
+
+def _result():
+    return {
+        "language": "pt",
+        "segments": [
+            {
+                "start": 0.5, "end": 2.0, "text": " Olá, tudo bem?", "speaker": "SPEAKER_00",
+                "words": [
+                    {"word": "Olá,", "start": 0.5, "end": 0.9, "speaker": "SPEAKER_00"},
+                    {"word": "tudo", "start": 1.0, "end": 1.3, "speaker": "SPEAKER_00"},
+                    {"word": "bem?", "start": 1.4, "end": 2.0, "speaker": "SPEAKER_00"},
+                ],
+            },
+            {
+                "start": 3661.25, "end": 3662.0, "text": " Tudo 10.", "speaker": "SPEAKER_01",
+                "words": [
+                    {"word": "Tudo", "start": 3661.25, "end": 3661.6, "speaker": "SPEAKER_01"},
+                    {"word": "10."},
+                ],
+            },
+        ],
+    }
+
+
+def test_format_timestamp_matches_whisperx():
+    assert format_timestamp(0) == "00:00.000"
+    assert format_timestamp(61.5) == "01:01.500"
+    assert format_timestamp(3661.25) == "01:01:01.250"
+    assert format_timestamp(-1) == "00:00.000"
+
+
+def test_result_to_vtt_word_level():
+    assert result_to_vtt(_result()) == (
+        "WEBVTT\n\n"
+        "00:00.500 --> 00:02.000\n[SPEAKER_00]: Olá, tudo bem?\n\n"
+        "01:01:01.250 --> 01:01:02.000\n[SPEAKER_01]: Tudo 10.\n\n"
+    )
+
+
+def test_result_to_vtt_segment_level_without_words():
+    result = {"segments": [{"start": 1.0, "end": 2.0, "text": " a --> b "}]}
+    assert result_to_vtt(result) == "WEBVTT\n\n00:01.000 --> 00:02.000\na -> b\n\n"
+
+
+def test_result_to_vtt_languages_without_spaces():
+    result = {"language": "ja", "segments": [{"start": 0, "end": 1, "words": [{"word": "こん"}, {"word": "にちは"}]}]}
+    assert result_to_vtt(result).endswith("こんにちは\n\n")
+
@@ -0,0 +1,58 @@
+import os
+import time
+
+import pytest
+
+import transcript_store
+
+
+@pytest.fixture(autouse=True)
+def store_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(transcript_store, "TRANSCRIPT_STORE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def age(path, days):
+    old = time.time() - days * 86400
+    os.utime(path, (old, old))
+
+
+def test_store_is_content_addressed_and_round_trips():
+    ref = transcript_store.store_transcript("WEBVTT\n\nolá")
+    assert ref == transcript_store.transcript_ref("WEBVTT\n\nolá")
+    assert transcript_store.store_transcript("WEBVTT\n\nolá") == ref
+    assert transcript_store.has_transcript(ref)
+    assert transcript_store.load_transcript(ref) == "WEBVTT\n\nolá"
+
+
+def test_invalid_reference_is_rejected():
+    assert not transcript_store.has_transcript("../../etc/passwd")
+    with pytest.raises(ValueError):
+        transcript_store.load_transcript("../../etc/passwd")
+
+
+def test_prune_removes_transcripts_not_accessed_within_ttl(store_dir):
+    old_ref = transcript_store.store_transcript("antiga")
+    new_ref = transcript_store.store_transcript("recente")
+    age(store_dir / f"{old_ref}.vtt.gz", 40)
+
+    assert transcript_store.prune_transcripts(max_age_days=30, max_mb=0) == 1
+    assert not transcript_store.has_transcript(old_ref)
+    assert transcript_store.has_transcript(new_ref)
+
+
+def test_loading_a_transcript_renews_it(store_dir):
+    ref = transcript_store.store_transcript("lida")
+    age(store_dir / f"{ref}.vtt.gz", 40)
+    transcript_store.load_transcript(ref)
+    assert transcript_store.prune_transcripts(max_age_days=30, max_mb=0) == 0
+
+
+def test_prune_over_size_removes_least_recently_used_first(store_dir):
+    refs = [transcript_store.store_transcript(os.urandom(200_000).hex()) for _ in range(3)]
+    for days, ref in zip((3, 2, 1), refs):
+        age(store_dir / f"{ref}.vtt.gz", days)
+    sizes = [os.path.getsize(store_dir / f"{ref}.vtt.gz") for ref in refs]
+
+    transcript_store.prune_transcripts(max_age_days=0, max_mb=(sizes[1] + sizes[2]) / 1024 / 1024)
+    assert [transcript_store.has_transcript(ref) for ref in refs] == [False, True, True]
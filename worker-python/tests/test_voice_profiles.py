@@ -0,0 +1,88 @@
+import multiprocessing
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import voice_profiles  # noqa: E402
+
+
+def voice(seed, dim=16):
+    return np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+
+
+def near(vector, seed, noise=0.1):
+    return vector + noise * np.random.default_rng(seed).standard_normal(len(vector)).astype(np.float32)
+
+
+@pytest.fixture
+def profiles(tmp_path, monkeypatch):
+    monkeypatch.setattr(voice_profiles, "VOICE_BOOTSTRAP_CALLS", 3)
+    monkeypatch.setattr(voice_profiles, "VOICE_MATCH_THRESHOLD", 0.6)
+    store = voice_profiles.VoiceProfiles(str(tmp_path))
+    store.enabled = True
+    return store
+
+
+def test_recurring_voice_becomes_the_seller_after_bootstrap_calls(profiles):
+    seller = voice(1)
+    calls = [
+        {"SPEAKER_00": near(seller, 10), "SPEAKER_01": voice(20)},
+        {"SPEAKER_00": voice(21), "SPEAKER_01": near(seller, 11)},
+        {"SPEAKER_00": voice(22), "SPEAKER_01": near(seller, 12)},
+    ]
+    assert profiles.identify_seller("ana", calls[0]) is None
+    assert profiles.identify_seller("ana", calls[1]) is None
+    assert profiles.identify_seller("ana", calls[2]) == "SPEAKER_01"
+    assert profiles._load("ana")["profile"] is not None
+
+
+def test_existing_profile_matches_the_closest_voice(profiles):
+    seller = voice(1)
+    profiles._save("ana", {"profile": seller.tolist(), "count": 5, "candidates": []})
+    assert profiles.identify_seller("ana", {"SPEAKER_00": voice(30), "SPEAKER_01": near(seller, 13)}) == "SPEAKER_01"
+    assert profiles._load("ana")["count"] == 6
+
+
+def test_no_voice_above_threshold_leaves_speakers_unlabeled(profiles):
+    profiles._save("ana", {"profile": voice(1).tolist(), "count": 5, "candidates": []})
+    assert profiles.identify_seller("ana", {"SPEAKER_00": voice(40), "SPEAKER_01": voice(41)}) is None
+    assert profiles._load("ana")["count"] == 5
+
+
+def test_invalid_saleswoman_id_is_ignored(profiles, tmp_path):
+    assert profiles.identify_seller("../fora", {"SPEAKER_00": voice(1)}) is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def _match_repeatedly(directory, seller, calls):
+    store = voice_profiles.VoiceProfiles(directory)
+    store.enabled = True
+    for i in range(calls):
+        assert store.identify_seller("ana", {"SPEAKER_00": near(seller, 100 + i, noise=0.01)}) == "SPEAKER_00"
+
+
+def test_concurrent_processes_do_not_lose_profile_updates(profiles, tmp_path):
+    seller = voice(1)
+    profiles._save("ana", {"profile": seller.tolist(), "count": 1, "candidates": []})
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_match_repeatedly, args=(str(tmp_path), seller, 40)) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+    assert [worker.exitcode for worker in workers] == [0, 0]
+    assert profiles._load("ana")["count"] == 81
+
+
+def test_label_speakers_names_seller_and_clients_in_speaking_order():
+    pd = pytest.importorskip("pandas")
+    segments = pd.DataFrame({
+        "start": [0.0, 1.0, 2.0, 3.0],
+        "end": [1.0, 2.0, 3.0, 4.0],
+        "speaker": ["SPEAKER_02", "SPEAKER_00", "SPEAKER_01", "SPEAKER_00"],
+    })
+    labeled = voice_profiles.label_speakers(segments, "SPEAKER_00")
+    assert list(labeled["speaker"]) == ["CLIENTE_1", "VENDEDORA", "CLIENTE_2", "VENDEDORA"]
+    assert list(segments["speaker"])[0] == "SPEAKER_02"
+    assert voice_profiles.label_speakers(segments, None) is segments
@@ -0,0 +1,56 @@
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Mesmo conjunto usado pelo whisperx.utils: palavras juntadas sem espaço
+LANGUAGES_WITHOUT_SPACES = {"ja", "zh", "th", "lo", "km", "my", "yue"}
+# Equivalente ao max_line_width=None do WriteVTT (quebra de linha só acima disso)
+MAX_LINE_WIDTH = 1000
+
+
+# --- VTT em memória ---
+def format_timestamp(seconds: float) -> str:
+    """Timestamp do VTT no mesmo formato do WhisperX (horas só quando maiores que zero)."""
+    milliseconds = round(max(0.0, seconds) * 1000.0)
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    secs, milliseconds = divmod(milliseconds, 1_000)
+    hours_marker = f"{hours:02d}:" if hours > 0 else ""
+    return f"{hours_marker}{minutes:02d}:{secs:02d}.{milliseconds:03d}"
+
+
+def _word_cues(result: Dict[str, Any]) -> Iterator[Tuple[float, float, Optional[str], List[str]]]:
+    # Reproduz o SubtitlesWriter.iterate_result do WhisperX com max_line_width/max_line_count
+    # nulos: um cue por segmento, com quebra de linha apenas se a linha passar de MAX_LINE_WIDTH.
+    for segment in result["segments"]:
+        words: List[str] = []
+        line_len = 0
+        for word in segment.get("words") or []:
+            text = word["word"]
+            if line_len > 0 and line_len + len(text) <= MAX_LINE_WIDTH:
+                line_len += len(text)
+            else:
+                text = text.strip()
+                if line_len > 0:
+                    text = "\n" + text
+                line_len = len(text.strip())
+            words.append(text)
+        if words:
+            yield segment["start"], segment["end"], segment.get("speaker"), words
+
+
+def result_to_vtt(result: Dict[str, Any]) -> str:
+    """Serializa o resultado do WhisperX (com locutores) em VTT, sem passar pelo disco."""
+    parts = ["WEBVTT\n\n"]
+    segments = result.get("segments") or []
+    if segments and "words" in segments[0]:
+        joiner = "" if result.get("language") in LANGUAGES_WITHOUT_SPACES else " "
+        for start, end, speaker, words in _word_cues(result):
+            prefix = f"[{speaker}]: " if speaker is not None else ""
+            parts.append(f"{format_timestamp(start)} --> {format_timestamp(end)}\n{prefix}{joiner.join(words)}\n\n")
+    else:
+        for segment in segments:
+            text = segment["text"].strip().replace("-->", "->")
+            if "speaker" in segment:
+                text = f"[{segment['speaker']}]: {text}"
+            parts.append(f"{format_timestamp(segment['start'])} --> {format_timestamp(segment['end'])}\n{text}\n\n")
+    return "".join(parts)
+
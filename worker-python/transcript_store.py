@@ -0,0 +1,114 @@
+import gzip
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import time
+
+logger = logging.getLogger("ai_worker")
+
+# Diretório no volume de uploads compartilhado com o backend (montado em /app/uploads nos dois)
+TRANSCRIPT_STORE_DIR = os.getenv("TRANSCRIPT_STORE_DIR", "/app/uploads/transcripts")
+# Transcrições sem acesso há mais que isso são apagadas (0 = nunca); o backend volta a enviar o texto
+TRANSCRIPT_STORE_TTL_DAYS = float(os.getenv("TRANSCRIPT_STORE_TTL_DAYS", "30"))
+# Acima deste tamanho total, as menos acessadas recentemente são apagadas (0 = sem limite)
+TRANSCRIPT_STORE_MAX_MB = float(os.getenv("TRANSCRIPT_STORE_MAX_MB", "2048"))
+
+_REF_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+def transcript_ref(text: str) -> str:
+    """Referência de uma transcrição: o SHA-256 do texto em UTF-8."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _path(ref: str) -> str:
+    # Só aceita hashes, para que uma referência nunca aponte para fora do diretório
+    if not _REF_PATTERN.match(ref or ""):
+        raise ValueError(f"Referência de transcrição inválida: {ref!r}")
+    return os.path.join(TRANSCRIPT_STORE_DIR, f"{ref}.vtt.gz")
+
+
+def store_transcript(text: str) -> str:
+    """Grava a transcrição (gzip) endereçada pelo conteúdo e retorna a referência."""
+    ref = transcript_ref(text)
+    path = _path(ref)
+    if os.path.exists(path):
+        _touch(path)
+        return ref
+    os.makedirs(TRANSCRIPT_STORE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=TRANSCRIPT_STORE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as f:
+            f.write(text.encode("utf-8"))
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    prune_transcripts()
+    return ref
+
+
+def load_transcript(ref: str) -> str:
+    """Lê uma transcrição pela referência; FileNotFoundError se ela não estiver no volume."""
+    path = _path(ref)
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        text = f.read()
+    _touch(path)
+    return text
+
+
+def _touch(path: str) -> None:
+    # O mtime marca o último acesso, como no DiskCache
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+
+def prune_transcripts(max_age_days: float = TRANSCRIPT_STORE_TTL_DAYS, max_mb: float = TRANSCRIPT_STORE_MAX_MB) -> int:
+    """
+    Apaga as transcrições sem acesso há mais de `max_age_days` e, acima de `max_mb`, as menos
+    acessadas recentemente. Uma referência apagada não quebra nada: o backend só a usa quando
+    o arquivo existe e, do contrário, envia o texto no corpo. Retorna quantas foram apagadas.
+    """
+    try:
+        entries = []
+        with os.scandir(TRANSCRIPT_STORE_DIR) as it:
+            for entry in it:
+                if not entry.name.endswith(".vtt.gz"):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+    except OSError:
+        return 0
+    entries.sort()
+    cutoff = time.time() - max_age_days * 86400 if max_age_days > 0 else float("-inf")
+    total = sum(size for _, size, _ in entries)
+    max_bytes = max_mb * 1024 * 1024 if max_mb > 0 else float("inf")
+    removed = 0
+    for mtime, size, path in entries:
+        if mtime >= cutoff and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        total -= size
+    if removed:
+        logger.info(f"Transcrições por referência: {removed} arquivo(s) antigo(s) apagado(s).")
+    return removed
+
+
+def has_transcript(ref: str) -> bool:
+    try:
+        return os.path.exists(_path(ref))
+    except ValueError:
+        return False
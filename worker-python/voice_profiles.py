@@ -0,0 +1,171 @@
+import fcntl
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("ai_worker")
+
+# Perfis de voz por vendedora (embeddings médios do pyannote), um JSON por vendedora
+VOICE_PROFILE_DIR = os.getenv("VOICE_PROFILE_DIR", "/app/uploads/voice_profiles")
+VOICE_PROFILES_ENABLED = os.getenv("VOICE_PROFILES_ENABLED", "true").lower() in ("1", "true", "yes")
+# Similaridade de cosseno mínima para considerar que duas vozes são da mesma pessoa
+VOICE_MATCH_THRESHOLD = float(os.getenv("VOICE_MATCH_THRESHOLD", "0.6"))
+# Ligações sem perfil necessárias para eleger a voz recorrente como a da vendedora
+VOICE_BOOTSTRAP_CALLS = int(os.getenv("VOICE_BOOTSTRAP_CALLS", "3"))
+# Peso máximo do histórico na média do perfil, para que ele acompanhe mudanças de microfone/canal
+VOICE_PROFILE_MAX_WEIGHT = int(os.getenv("VOICE_PROFILE_MAX_WEIGHT", "20"))
+
+SELLER_LABEL = "VENDEDORA"
+CLIENT_LABEL = "CLIENTE"
+
+_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+
+def _unit(vector: Any) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(array))
+    return array / norm if norm > 0 else array
+
+
+def _similarity(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.dot(_unit(a), _unit(b)))
+
+
+def _closest(vector: Any, call: Dict[str, Any]) -> Tuple[float, Any]:
+    return max(((_similarity(vector, other), other) for other in call.values()), key=lambda item: item[0])
+
+
+class VoiceProfiles:
+    """
+    Reconhece a vendedora em cada ligação a partir dos embeddings de locutor que a diarização
+    já calcula. Sem perfil, guarda os embeddings das primeiras ligações e, a partir de
+    VOICE_BOOTSTRAP_CALLS, elege como vendedora a voz que se repete entre elas (o cliente muda
+    a cada ligação). Com perfil, a voz mais parecida acima de VOICE_MATCH_THRESHOLD é a
+    vendedora, e o perfil é atualizado com ela.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.enabled = VOICE_PROFILES_ENABLED
+        self._lock = threading.Lock()
+
+    def _path(self, saleswoman_id: str) -> str:
+        if not _ID_PATTERN.match(saleswoman_id or ""):
+            raise ValueError(f"Id de vendedora inválido: {saleswoman_id!r}")
+        return os.path.join(self.directory, f"{saleswoman_id}.json")
+
+    @contextmanager
+    def _locked(self, saleswoman_id: str) -> Iterator[None]:
+        """
+        Exclusão mútua do perfil entre threads e entre os processos do pool do Celery (flock num
+        arquivo .lock por vendedora), para que nenhuma atualização concorrente seja perdida.
+        """
+        path = self._path(saleswoman_id)[:-len(".json")] + ".lock"
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(fd)
+
+    def _load(self, saleswoman_id: str) -> Dict[str, Any]:
+        try:
+            with open(self._path(saleswoman_id), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"profile": None, "count": 0, "candidates": []}
+
+    def _save(self, saleswoman_id: str, entry: Dict[str, Any]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(saleswoman_id))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def identify_seller(self, saleswoman_id: Optional[str], embeddings: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Rótulo do diarizador (ex.: SPEAKER_01) que corresponde à vendedora, ou None."""
+        if not self.enabled or not saleswoman_id or not embeddings:
+            return None
+        try:
+            with self._locked(saleswoman_id):
+                entry = self._load(saleswoman_id)
+                if entry.get("profile") is not None:
+                    seller = self._match_profile(entry, embeddings)
+                else:
+                    seller = self._bootstrap(entry, embeddings)
+                self._save(saleswoman_id, entry)
+            return seller
+        except (OSError, ValueError) as e:
+            logger.warning(f"Perfil de voz da vendedora {saleswoman_id} indisponível: {e}")
+            return None
+
+    def _match_profile(self, entry: Dict[str, Any], embeddings: Dict[str, Any]) -> Optional[str]:
+        profile = np.asarray(entry["profile"], dtype=np.float32)
+        scores = {speaker: _similarity(profile, vector) for speaker, vector in embeddings.items()}
+        seller, score = max(scores.items(), key=lambda item: item[1])
+        if score < VOICE_MATCH_THRESHOLD:
+            logger.info(f"Nenhuma voz reconhecida como a da vendedora (melhor similaridade: {score:.2f}).")
+            return None
+        weight = min(entry["count"], VOICE_PROFILE_MAX_WEIGHT)
+        entry["profile"] = ((profile * weight + _unit(embeddings[seller])) / (weight + 1)).tolist()
+        entry["count"] += 1
+        logger.info(f"Vendedora reconhecida pela voz: {seller} (similaridade {score:.2f}).")
+        return seller
+
+    def _bootstrap(self, entry: Dict[str, Any], embeddings: Dict[str, Any]) -> Optional[str]:
+        previous: List[Dict[str, Any]] = entry.get("candidates", [])
+        current = {speaker: _unit(vector).tolist() for speaker, vector in embeddings.items()}
+        seller = None
+        if len(previous) + 1 >= VOICE_BOOTSTRAP_CALLS:
+            needed = max(1, VOICE_BOOTSTRAP_CALLS - 1)
+            best_score, best_matches = VOICE_MATCH_THRESHOLD, []
+            for speaker, vector in current.items():
+                # A voz mais parecida de cada ligação anterior; a vendedora precisa aparecer em
+                # pelo menos `needed` delas (uma ligação atípica não impede o perfil)
+                matches = sorted((_closest(vector, call) for call in previous), key=lambda item: item[0], reverse=True)[:needed]
+                score = matches[-1][0] if len(matches) == needed else 0.0
+                if score >= best_score:
+                    seller, best_score, best_matches = speaker, score, [other for _, other in matches]
+            if seller is not None:
+                voices = [np.asarray(current[seller])] + [np.asarray(vector) for vector in best_matches]
+                entry["profile"] = np.mean(voices, axis=0).tolist()
+                entry["count"] = len(voices)
+                entry["candidates"] = []
+                logger.info(f"Perfil de voz criado a partir de {len(voices)} ligações; vendedora: {seller} (similaridade mínima {best_score:.2f}).")
+                return seller
+        # Mantém só as ligações mais recentes enquanto nenhuma voz recorrente é encontrada
+        entry["candidates"] = (previous + [current])[-max(1, VOICE_BOOTSTRAP_CALLS * 2):]
+        return None
+
+
+def label_speakers(diarize_segments: Any, seller: Optional[str]) -> Any:
+    """
+    Renomeia os locutores do DataFrame da diarização: a vendedora vira VENDEDORA e os demais
+    CLIENTE (ou CLIENTE_1, CLIENTE_2... quando há mais de um), na ordem em que falam.
+    """
+    if seller is None or seller not in set(diarize_segments["speaker"]):
+        return diarize_segments
+    others = [s for s in dict.fromkeys(diarize_segments.sort_values("start")["speaker"]) if s != seller]
+    mapping = {seller: SELLER_LABEL}
+    for i, speaker in enumerate(others, start=1):
+        mapping[speaker] = CLIENT_LABEL if len(others) == 1 else f"{CLIENT_LABEL}_{i}"
+    labeled = diarize_segments.copy()
+    labeled["speaker"] = labeled["speaker"].map(mapping)
+    return labeled
+
+
+VOICE_PROFILES = VoiceProfiles(VOICE_PROFILE_DIR)
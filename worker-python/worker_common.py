@@ -0,0 +1,41 @@
+import os
+import logging
+import traceback
+from typing import Any, Dict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Importado após o load_dotenv, pois lê INTERNAL_API_KEY e os ajustes de webhook do ambiente
+from notifier import NOTIFIER
+
+# --- Logging ---
+logger = logging.getLogger("ai_worker")
+handler = logging.StreamHandler()
+formatter = logging.Formatter(
+    "%(asctime)s | %(levelname)s | %(name)s | %(message)s", "%Y-%m-%d %H:%M:%S"
+)
+handler.setFormatter(formatter)
+if not logger.handlers:
+    logger.addHandler(handler)
+logger.setLevel(logging.INFO)
+logger.propagate = False
+logger.info("Iniciando a configuração do Worker de IA...")
+
+# --- Constantes e Configurações Padrão ---
+NODE_BACKEND_URL = os.getenv("NODE_BACKEND_URL", "http://localhost:3001")
+
+# --- Utilitários ---
+def notify_backend(webhook_url: str, payload: Dict[str, Any]) -> None:
+    """Enfileira o webhook no notificador em segundo plano; não bloqueia o pipeline."""
+    NOTIFIER.notify(webhook_url, payload)
+
+def webhook_url_for(task_id: str) -> str:
+    return f"{NODE_BACKEND_URL}/api/v1/tasks/{task_id}/complete"
+
+def notify_failure(webhook_url: str, error_message: str) -> None:
+    full_traceback = traceback.format_exc()
+    logger.error(error_message)
+    logger.error("Stack Trace completo:\n" + full_traceback)
+    notify_backend(webhook_url, {"status": "FAILED", "analysis": {"error": error_message, "traceback": full_traceback}})